@@ -0,0 +1,29 @@
+"""
+ASGI application: the async dashboard routes (app/routes/async_routes.py)
+in front of the regular Flask app, which serves every other route from a
+thread pool. The async routes need the Supabase backend; with
+LIFEIO_STORAGE=sqlite everything is served by Flask.
+"""
+import os
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from app.repositories import STORAGE_BACKEND
+
+
+def create_asgi_app(flask_app, on_start=None):
+    """`on_start` runs once in each server process before it takes requests."""
+    @asynccontextmanager
+    async def lifespan(app):
+        if on_start is not None:
+            on_start()
+        yield
+
+    routes = []
+    if STORAGE_BACKEND == "supabase":
+        from app.routes.async_routes import async_routes
+        routes += async_routes(flask_app)
+    # Same thread budget as one gunicorn worker in the Dockerfile
+    routes.append(Mount("/", app=WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_WSGI_THREADS", 8)))))
+    return Starlette(routes=routes, lifespan=lifespan)
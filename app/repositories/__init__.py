@@ -0,0 +1,53 @@
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from app.repositories.sqlite_repo import SQLiteDatabase, sqlite_repositories
+
+# "supabase" (default) or "sqlite" for a self-hosted, single-user database file
+STORAGE_BACKEND = os.getenv("LIFEIO_STORAGE", "supabase").lower()
+SQLITE_PATH = os.getenv("LIFEIO_SQLITE_PATH", "lifeio.db")
+
+if STORAGE_BACKEND not in ("supabase", "sqlite"):
+    raise RuntimeError(f"Unknown LIFEIO_STORAGE backend: {STORAGE_BACKEND}")
+
+_local_repositories = None
+_local_lock = threading.Lock()
+
+
+def local_repositories():
+    global _local_repositories
+    with _local_lock:
+        if _local_repositories is None:
+            _local_repositories = sqlite_repositories(SQLiteDatabase(SQLITE_PATH))
+    return _local_repositories
+
+
+def get_repositories():
+    """Repositories for the current request: its Supabase client, or the local database."""
+    if STORAGE_BACKEND == "sqlite":
+        return local_repositories()
+    # Imported here so the SQLite backend works without Supabase settings
+    from app.repositories.supabase_repo import supabase_repositories
+    from app.utils.supabase_client import get_supabase_client
+    return supabase_repositories(get_supabase_client())
+
+
+@contextmanager
+def repositories_for(token=None):
+    """Repositories usable off the request thread (e.g. dashboard fan-out)."""
+    if STORAGE_BACKEND == "sqlite":
+        yield local_repositories()
+        return
+    from app.repositories.supabase_repo import supabase_repositories
+    from app.utils.supabase_client import pooled_client
+    with pooled_client(token) as client:
+        yield supabase_repositories(client)
+
+
+@asynccontextmanager
+async def async_repositories_for(token):
+    """Async Supabase repositories for one ASGI request or fan-out task."""
+    from app.repositories.async_supabase_repo import async_supabase_repositories
+    from app.utils.async_supabase_client import async_pooled_client
+    async with async_pooled_client(token) as client:
+        yield async_supabase_repositories(client)
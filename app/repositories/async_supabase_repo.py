@@ -0,0 +1,74 @@
+"""
+Async counterparts of the Supabase repositories for the read paths the ASGI
+routes serve (dashboard, summary, skills). Queries are the same as in
+supabase_repo; only execution is awaited.
+"""
+from app.repositories.base import ActivityRepository, SleepRepository, FinanceRepository, Repositories
+
+
+class AsyncSupabaseTable:
+    table = None
+    sort_column = None
+
+    def __init__(self, client):
+        self.client = client
+
+    async def iter_pages(self, user_id, columns, page_size=1000):
+        offset = 0
+        while True:
+            res = await self.client.table(self.table) \
+                .select(",".join(columns)) \
+                .eq("user_id", user_id) \
+                .order(self.sort_column) \
+                .order("id") \
+                .range(offset, offset + page_size - 1) \
+                .execute()
+            rows = res.data or []
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            offset += page_size
+
+    async def all(self, user_id, columns):
+        rows = []
+        async for page in self.iter_pages(user_id, columns):
+            rows.extend(page)
+        return rows
+
+
+class AsyncSupabaseActivities(AsyncSupabaseTable):
+    table = ActivityRepository.table
+    sort_column = ActivityRepository.sort_column
+
+    async def xp_totals(self, user_id, today):
+        res = await self.client.rpc("get_xp_summary", {"p_today": today.isoformat()}).execute()
+        return res.data or {}
+
+
+class AsyncSupabaseSleep(AsyncSupabaseTable):
+    table = SleepRepository.table
+    sort_column = SleepRepository.sort_column
+
+    async def recent(self, user_id, limit):
+        res = await self.client.table(self.table) \
+            .select("*") \
+            .eq("user_id", user_id) \
+            .order("sleep_time", desc=True) \
+            .limit(limit) \
+            .execute()
+        return res.data
+
+
+class AsyncSupabaseFinance(AsyncSupabaseTable):
+    table = FinanceRepository.table
+    sort_column = FinanceRepository.sort_column
+
+
+def async_supabase_repositories(client):
+    return Repositories(
+        activities=AsyncSupabaseActivities(client),
+        sleep=AsyncSupabaseSleep(client),
+        finance=AsyncSupabaseFinance(client),
+        categories=None
+    )
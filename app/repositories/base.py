@@ -0,0 +1,143 @@
+from abc import ABC, abstractmethod
+
+
+class TableRepository(ABC):
+    """Reads and deletes shared by every per-user table. Rows are plain dicts."""
+
+    table = None
+    sort_column = None
+
+    @abstractmethod
+    def list_page(self, user_id, params):
+        """Newest-first keyset page from pagination.parse_list_params (limit + 1 rows)."""
+
+    @abstractmethod
+    def iter_pages(self, user_id, columns, page_size=1000):
+        """Yields every row of the user, oldest first, one page at a time."""
+
+    def all(self, user_id, columns):
+        rows = []
+        for page in self.iter_pages(user_id, columns):
+            rows.extend(page)
+        return rows
+
+    @abstractmethod
+    def delete(self, user_id, row_id):
+        """Deletes one row; returns the deleted rows (empty if none matched)."""
+
+    @abstractmethod
+    def changed_since(self, user_id, after, limit):
+        """
+        Up to `limit` rows ordered by (updated_at, id), after the position
+        `after`: (updated_at, id) exclusive, (updated_at, None) inclusive of
+        that instant, or None for every row.
+        """
+
+
+class TombstoneRepository(ABC):
+    @abstractmethod
+    def deleted_since(self, user_id, after, limit):
+        """
+        Up to `limit` {table_name, row_id, deleted_at} ordered by (deleted_at,
+        row_id), after `after` as in TableRepository.changed_since.
+        """
+
+
+class CategoryRepository(ABC):
+    @abstractmethod
+    def multipliers(self, user_id):
+        """{category name: xp multiplier}"""
+
+    @abstractmethod
+    def add_missing(self, user_id, multipliers):
+        """Creates the given categories, leaving existing ones untouched."""
+
+
+class ActivityRepository(TableRepository):
+    table = "activities"
+    sort_column = "start_time"
+
+    @abstractmethod
+    def log(self, user_id, category, start_time, end_time, row_id=None):
+        """
+        Atomically resolves the category multiplier (creating the category if
+        needed), deletes overlapping activities and inserts the new one, with
+        `row_id` as its id if given. Replaying the same call is harmless: the
+        overlap delete removes the earlier copy.
+        """
+
+    @abstractmethod
+    def overlapping(self, user_id, start_time, end_time, columns):
+        """Activities with start_time < end_time and end_time > start_time."""
+
+    @abstractmethod
+    def started_between(self, user_id, start_time, end_time, columns):
+        """Activities with start_time in [start_time, end_time), oldest first."""
+
+    @abstractmethod
+    def import_many(self, user_id, spans, rows, dry_run=False):
+        """
+        In one transaction, deletes the activities overlapping any (start, end)
+        of `spans` and inserts rows (category, start_time, end_time, xp_earned);
+        returns the deleted ids. With dry_run, only returns the ids it would delete.
+        """
+
+    @abstractmethod
+    def xp_totals(self, user_id, today):
+        """{"total", "monthly", "today", "skills"} with UTC day boundaries."""
+
+    @abstractmethod
+    def check_rollup(self):
+        """Rollup buckets that disagree with raw activities (empty = consistent)."""
+
+    @abstractmethod
+    def backfill_rollup(self):
+        """Rebuilds the caller's rollup; returns the bucket count."""
+
+
+class SleepRepository(TableRepository):
+    table = "sleep_logs"
+    sort_column = "sleep_time"
+
+    @abstractmethod
+    def insert(self, user_id, row):
+        """Inserts one log (sleep_time, wake_time, quality); returns the stored row."""
+
+    @abstractmethod
+    def insert_many(self, user_id, rows):
+        """Inserts logs carrying their own ids, skipping ids that already exist; returns the new rows."""
+
+    @abstractmethod
+    def recent(self, user_id, limit):
+        """The latest `limit` logs, newest first."""
+
+
+class FinanceRepository(TableRepository):
+    table = "daily_finance"
+    sort_column = "date"
+
+    @abstractmethod
+    def upsert(self, user_id, row):
+        """Inserts or replaces the (user, date) record; returns the stored row."""
+
+    @abstractmethod
+    def upsert_many(self, user_id, rows):
+        """upsert() for several dates (at most one row per date); returns the stored rows."""
+
+
+class Repositories:
+    """The set of repositories one request works with."""
+
+    def __init__(self, activities, sleep, finance, categories, tombstones=None):
+        self.activities = activities
+        self.sleep = sleep
+        self.finance = finance
+        self.categories = categories
+        self.tombstones = tombstones
+
+    def for_table(self, table):
+        return {
+            "activities": self.activities,
+            "sleep_logs": self.sleep,
+            "daily_finance": self.finance,
+        }[table]
@@ -0,0 +1,444 @@
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import dateutil.parser
+from app.repositories.base import (
+    TableRepository, CategoryRepository, ActivityRepository, SleepRepository,
+    FinanceRepository, TombstoneRepository, Repositories
+)
+from app.utils.activity_utils import DEFAULT_MULTIPLIERS
+
+# Mirrors supabase/schema.sql. Timestamps are stored as UTC ISO-8601 text
+# ("YYYY-MM-DDTHH:MM:SS[.ffffff]+00:00", as PostgREST renders them), so text
+# order is time order and the indexes serve range scans directly.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    xp_multiplier REAL NOT NULL DEFAULT 1.0,
+    is_default INTEGER DEFAULT 0,
+    created_at TEXT,
+    UNIQUE(user_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS activities (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    duration_minutes INTEGER GENERATED ALWAYS AS (
+        CAST(ROUND((julianday(end_time) - julianday(start_time)) * 1440) AS INTEGER)
+    ) STORED,
+    xp_earned REAL,
+    created_at TEXT,
+    updated_at TEXT,
+    CONSTRAINT valid_time_range CHECK (end_time IS NULL OR julianday(end_time) > julianday(start_time))
+);
+CREATE INDEX IF NOT EXISTS activities_user_start ON activities (user_id, start_time, id);
+CREATE INDEX IF NOT EXISTS activities_user_end ON activities (user_id, end_time);
+
+CREATE TABLE IF NOT EXISTS sleep_logs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    sleep_time TEXT NOT NULL,
+    wake_time TEXT NOT NULL,
+    duration_minutes INTEGER GENERATED ALWAYS AS (
+        CAST(ROUND((julianday(wake_time) - julianday(sleep_time)) * 1440) AS INTEGER)
+    ) STORED,
+    quality INTEGER CHECK (quality >= 1 AND quality <= 5),
+    created_at TEXT,
+    updated_at TEXT,
+    CONSTRAINT valid_sleep_range CHECK (julianday(wake_time) > julianday(sleep_time))
+);
+CREATE INDEX IF NOT EXISTS sleep_logs_user_sleep ON sleep_logs (user_id, sleep_time, id);
+
+CREATE TABLE IF NOT EXISTS daily_finance (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    income REAL DEFAULT 0,
+    expense REAL DEFAULT 0,
+    net REAL GENERATED ALWAYS AS (ROUND(income - expense, 2)) STORED,
+    created_at TEXT,
+    updated_at TEXT,
+    UNIQUE(user_id, date)
+);
+"""
+
+# Delta sync (GET /api/sync), applied after migrate() has added updated_at to
+# older files. Postgres fills updated_at and the tombstones with triggers;
+# here the repository methods below do it, so every value is Python's
+# isoformat and text order stays time order.
+SYNC_TABLES = ("activities", "sleep_logs", "daily_finance")
+SYNC_SCHEMA = """
+CREATE INDEX IF NOT EXISTS activities_user_updated ON activities (user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS sleep_logs_user_updated ON sleep_logs (user_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS daily_finance_user_updated ON daily_finance (user_id, updated_at, id);
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    table_name TEXT NOT NULL,
+    row_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    deleted_at TEXT NOT NULL,
+    PRIMARY KEY (table_name, row_id)
+);
+CREATE INDEX IF NOT EXISTS sync_tombstones_user_deleted ON sync_tombstones (user_id, deleted_at, row_id);
+"""
+
+TIMESTAMP_COLUMNS = {"start_time", "end_time", "sleep_time", "wake_time", "created_at"}
+
+
+def utc_text(value):
+    """Any ISO-8601 string or datetime -> the canonical UTC text stored in the database."""
+    if value is None:
+        return None
+    dt = value if isinstance(value, datetime) else dateutil.parser.isoparse(str(value))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def now_text():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def bound(column, value):
+    return utc_text(value) if column in TIMESTAMP_COLUMNS else value
+
+
+def migrate(conn):
+    """Adds what later versions put in SCHEMA to a file created by an earlier one."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in SYNC_TABLES:
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "updated_at" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TEXT")
+                conn.execute(f"UPDATE {table} SET updated_at = COALESCE(created_at, ?)", (now_text(),))
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    conn.executescript(SYNC_SCHEMA)
+
+
+def after_clause(column, after, tiebreak="id"):
+    """SQL and parameters for rows past a changed_since()/deleted_since() position."""
+    if after is None:
+        return "", ()
+    value, row_id = after
+    if row_id is None:
+        return f" AND {column} >= ?", (value,)
+    # The plain lower bound is what the index seeks on; the OR alone is only a filter
+    return f" AND {column} >= ? AND ({column} > ? OR {tiebreak} > ?)", (value, value, row_id)
+
+
+def bury(conn, table, rows):
+    """Tombstones for deleted rows, as the schema.sql triggers write them."""
+    deleted_at = now_text()
+    conn.executemany(
+        "INSERT INTO sync_tombstones (table_name, row_id, user_id, deleted_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (table_name, row_id) DO UPDATE SET user_id = excluded.user_id, deleted_at = excluded.deleted_at",
+        [(table, row["id"], row["user_id"], deleted_at) for row in rows])
+
+
+def revive(conn, table, ids):
+    # An id written again (a replayed write-behind entry) is live, not deleted
+    conn.executemany("DELETE FROM sync_tombstones WHERE table_name = ? AND row_id = ?", [(table, i) for i in ids])
+
+
+class SQLiteDatabase:
+    """One connection per thread onto a WAL-mode database file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; writes open explicit transactions via transaction()
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    migrate(conn)
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def query(self, sql, params=()):
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock up front, so read-then-write sequences
+        # (log_activity) can't interleave with another writer
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def rows_of(cursor):
+    return [dict(row) for row in cursor]
+
+
+def write_returning(conn, table, sql, params):
+    """
+    Runs an INSERT/UPSERT ending in "RETURNING id" and reads the stored row back.
+    RETURNING reports values before column affinity is applied (72.0 comes
+    back as 72), so the re-read keeps REAL columns typed like PostgREST's.
+    """
+    row_id = conn.execute(sql, params).fetchone()[0]
+    return dict(conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone())
+
+
+class SQLiteTable(TableRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def list_page(self, user_id, params):
+        col = self.sort_column
+        sql = f"SELECT {params['fields']} FROM {self.table} WHERE user_id = ?"
+        args = [user_id]
+        if params["from"]:
+            sql += f" AND {col} >= ?"
+            args.append(bound(col, params["from"]))
+        if params["to"]:
+            sql += f" AND {col} <= ?"
+            args.append(bound(col, params["to"]))
+        if params["cursor"]:
+            value, row_id = params["cursor"]
+            sql += f" AND ({col} < ? OR ({col} = ? AND id < ?))"
+            args += [bound(col, value), bound(col, value), row_id]
+        sql += f" ORDER BY {col} DESC, id DESC LIMIT ?"
+        args.append(params["limit"] + 1)
+        return self.db.query(sql, args)
+
+    def iter_pages(self, user_id, columns, page_size=1000):
+        # Keyset rather than OFFSET so each page is an index seek
+        col = self.sort_column
+        select = ", ".join(dict.fromkeys([*columns, col, "id"]))
+        last = None
+        while True:
+            if last is None:
+                rows = self.db.query(
+                    f"SELECT {select} FROM {self.table} WHERE user_id = ? ORDER BY {col}, id LIMIT ?",
+                    (user_id, page_size))
+            else:
+                rows = self.db.query(
+                    f"SELECT {select} FROM {self.table} WHERE user_id = ? AND ({col} > ? OR ({col} = ? AND id > ?)) "
+                    f"ORDER BY {col}, id LIMIT ?",
+                    (user_id, last[col], last[col], last["id"], page_size))
+            if rows:
+                last = rows[-1]
+                yield [{c: row[c] for c in columns} for row in rows]
+            if len(rows) < page_size:
+                return
+
+    def delete(self, user_id, row_id):
+        with self.db.transaction() as conn:
+            deleted = rows_of(conn.execute(
+                f"DELETE FROM {self.table} WHERE id = ? AND user_id = ? RETURNING *", (row_id, user_id)))
+            bury(conn, self.table, deleted)
+            return deleted
+
+    def changed_since(self, user_id, after, limit):
+        where, args = after_clause("updated_at", after)
+        return self.db.query(
+            f"SELECT * FROM {self.table} WHERE user_id = ?{where} ORDER BY updated_at, id LIMIT ?",
+            (user_id, *args, limit))
+
+
+class SQLiteCategories(CategoryRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def multipliers(self, user_id):
+        rows = self.db.query("SELECT name, xp_multiplier FROM categories WHERE user_id = ?", (user_id,))
+        return {row["name"]: row["xp_multiplier"] for row in rows}
+
+    def add_missing(self, user_id, multipliers):
+        with self.db.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO categories (id, user_id, name, xp_multiplier, created_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, name) DO NOTHING",
+                [(str(uuid.uuid4()), user_id, name, m, now_text()) for name, m in multipliers.items()])
+
+
+class SQLiteActivities(SQLiteTable, ActivityRepository):
+    def log(self, user_id, category, start_time, end_time, row_id=None):
+        start, end = utc_text(start_time), utc_text(end_time)
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT xp_multiplier FROM categories WHERE user_id = ? AND name = ?", (user_id, category)
+            ).fetchone()
+            if row:
+                multiplier = row["xp_multiplier"]
+            else:
+                multiplier = DEFAULT_MULTIPLIERS.get(category, 1.0)
+                conn.execute(
+                    "INSERT INTO categories (id, user_id, name, xp_multiplier, created_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, name) DO NOTHING",
+                    (str(uuid.uuid4()), user_id, category, multiplier, now_text()))
+
+            bury(conn, "activities", rows_of(conn.execute(
+                "DELETE FROM activities WHERE user_id = ? AND start_time < ? AND end_time > ? RETURNING id, user_id",
+                (user_id, end, start))))
+            if row_id:
+                revive(conn, "activities", [row_id])
+
+            # 1 minute = 1 base XP, scaled by the category multiplier
+            minutes = (end_time - start_time).total_seconds() / 60
+            written = now_text()
+            return write_returning(conn, "activities",
+                "INSERT INTO activities (id, user_id, category, start_time, end_time, xp_earned, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                (row_id or str(uuid.uuid4()), user_id, category, start, end, round(minutes * multiplier, 2),
+                 written, written))
+
+    def overlapping(self, user_id, start_time, end_time, columns):
+        return self.db.query(
+            f"SELECT {', '.join(columns)} FROM activities "
+            "WHERE user_id = ? AND start_time < ? AND end_time > ? ORDER BY start_time, id",
+            (user_id, utc_text(end_time), utc_text(start_time)))
+
+    def started_between(self, user_id, start_time, end_time, columns):
+        return self.db.query(
+            f"SELECT {', '.join(columns)} FROM activities "
+            "WHERE user_id = ? AND start_time >= ? AND start_time < ? ORDER BY start_time, id",
+            (user_id, utc_text(start_time), utc_text(end_time)))
+
+    def import_many(self, user_id, spans, rows, dry_run=False):
+        spans = [(utc_text(start), utc_text(end)) for start, end in spans]
+        if dry_run:
+            ids = {}
+            for start, end in spans:
+                for row in self.db.query(
+                        "SELECT id FROM activities WHERE user_id = ? AND start_time < ? AND end_time > ?",
+                        (user_id, end, start)):
+                    ids[row["id"]] = None
+            return list(ids)
+
+        created = now_text()
+        with self.db.transaction() as conn:
+            replaced = []
+            for start, end in spans:
+                replaced += rows_of(conn.execute(
+                    "DELETE FROM activities WHERE user_id = ? AND start_time < ? AND end_time > ? RETURNING id, user_id",
+                    (user_id, end, start)))
+            bury(conn, "activities", replaced)
+            conn.executemany(
+                "INSERT INTO activities (id, user_id, category, start_time, end_time, xp_earned, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(str(uuid.uuid4()), user_id, row["category"], utc_text(row["start_time"]),
+                  utc_text(row.get("end_time")), row.get("xp_earned"), created, created) for row in rows])
+        return [row["id"] for row in replaced]
+
+    def xp_totals(self, user_id, today):
+        # No rollup table locally: an indexed aggregate over the user's rows is
+        # already sub-millisecond at personal-tracker sizes
+        day = "substr(start_time, 1, 10)"
+        totals = self.db.query(
+            f"SELECT COALESCE(SUM(xp_earned), 0) AS total, "
+            f"COALESCE(SUM(CASE WHEN {day} >= ? THEN xp_earned END), 0) AS monthly, "
+            f"COALESCE(SUM(CASE WHEN {day} = ? THEN xp_earned END), 0) AS today "
+            "FROM activities WHERE user_id = ?",
+            (today.replace(day=1).isoformat(), today.isoformat(), user_id))[0]
+        skills = self.db.query(
+            "SELECT category, SUM(xp_earned) AS xp FROM activities WHERE user_id = ? GROUP BY category",
+            (user_id,))
+        totals["skills"] = {row["category"]: row["xp"] or 0 for row in skills}
+        return totals
+
+    def check_rollup(self):
+        # Nothing to drift: totals are computed from the activities themselves
+        return []
+
+    def backfill_rollup(self):
+        return 0
+
+
+class SQLiteSleep(SQLiteTable, SleepRepository):
+    def insert(self, user_id, row):
+        with self.db.transaction() as conn:
+            written = now_text()
+            return write_returning(conn, "sleep_logs",
+                "INSERT INTO sleep_logs (id, user_id, sleep_time, wake_time, quality, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                (str(uuid.uuid4()), user_id, utc_text(row["sleep_time"]), utc_text(row["wake_time"]),
+                 row["quality"], written, written))
+
+    def insert_many(self, user_id, rows):
+        created = now_text()
+        inserted = []
+        with self.db.transaction() as conn:
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT INTO sleep_logs (id, user_id, sleep_time, wake_time, quality, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                    (row["id"], user_id, utc_text(row["sleep_time"]), utc_text(row["wake_time"]),
+                     row["quality"], created, created))
+                if cursor.rowcount:
+                    inserted.append(row["id"])
+            revive(conn, "sleep_logs", inserted)
+            return [dict(conn.execute("SELECT * FROM sleep_logs WHERE id = ?", (row_id,)).fetchone())
+                    for row_id in inserted]
+
+    def recent(self, user_id, limit):
+        return self.db.query(
+            "SELECT * FROM sleep_logs WHERE user_id = ? ORDER BY sleep_time DESC LIMIT ?", (user_id, limit))
+
+
+class SQLiteFinance(SQLiteTable, FinanceRepository):
+    def upsert(self, user_id, row):
+        with self.db.transaction() as conn:
+            written = now_text()
+            return write_returning(conn, "daily_finance",
+                "INSERT INTO daily_finance (id, user_id, date, income, expense, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, date) DO UPDATE SET income = excluded.income, expense = excluded.expense, "
+                "updated_at = excluded.updated_at "
+                "RETURNING id",
+                (str(uuid.uuid4()), user_id, row["date"], round(float(row.get("income") or 0), 2),
+                 round(float(row.get("expense") or 0), 2), written, written))
+
+    def upsert_many(self, user_id, rows):
+        return [self.upsert(user_id, row) for row in rows]
+
+
+class SQLiteTombstones(TombstoneRepository):
+    def __init__(self, db):
+        self.db = db
+
+    def deleted_since(self, user_id, after, limit):
+        where, args = after_clause("deleted_at", after, "row_id")
+        return self.db.query(
+            "SELECT table_name, row_id, deleted_at FROM sync_tombstones "
+            f"WHERE user_id = ?{where} ORDER BY deleted_at, row_id LIMIT ?",
+            (user_id, *args, limit))
+
+
+def sqlite_repositories(db):
+    return Repositories(
+        activities=SQLiteActivities(db),
+        sleep=SQLiteSleep(db),
+        finance=SQLiteFinance(db),
+        categories=SQLiteCategories(db),
+        tombstones=SQLiteTombstones(db)
+    )
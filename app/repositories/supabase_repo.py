@@ -0,0 +1,164 @@
+from app.repositories.base import (
+    TableRepository, CategoryRepository, ActivityRepository, SleepRepository,
+    FinanceRepository, TombstoneRepository, Repositories
+)
+from app.utils.pagination import keyset_query, iter_pages, fetch_all, after_position
+
+
+class SupabaseTable(TableRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def list_page(self, user_id, params):
+        return keyset_query(self.client, self.table, user_id, self.sort_column, params).execute().data
+
+    def iter_pages(self, user_id, columns, page_size=1000):
+        return iter_pages(lambda: self.client.table(self.table)
+            .select(",".join(columns))
+            .eq("user_id", user_id)
+            .order(self.sort_column)
+            .order("id"), page_size)
+
+    def delete(self, user_id, row_id):
+        return self.client.table(self.table) \
+            .delete() \
+            .eq("id", row_id) \
+            .eq("user_id", user_id) \
+            .execute().data or []
+
+    def changed_since(self, user_id, after, limit):
+        query = self.client.table(self.table).select("*").eq("user_id", user_id)
+        return after_position(query, "updated_at", after) \
+            .order("updated_at") \
+            .order("id") \
+            .limit(limit) \
+            .execute().data
+
+
+class SupabaseCategories(CategoryRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def multipliers(self, user_id):
+        res = self.client.table("categories") \
+            .select("name, xp_multiplier") \
+            .eq("user_id", user_id) \
+            .execute()
+        return {c['name']: c['xp_multiplier'] for c in res.data}
+
+    def add_missing(self, user_id, multipliers):
+        if not multipliers:
+            return
+        self.client.table("categories").upsert(
+            [{"user_id": user_id, "name": name, "xp_multiplier": m} for name, m in multipliers.items()],
+            on_conflict="user_id,name",
+            ignore_duplicates=True
+        ).execute()
+
+
+class SupabaseActivities(SupabaseTable, ActivityRepository):
+    def log(self, user_id, category, start_time, end_time, row_id=None):
+        # One transaction server-side (see log_activity in schema.sql)
+        params = {
+            "p_category": category,
+            "p_start_time": start_time.isoformat(),
+            "p_end_time": end_time.isoformat()
+        }
+        if row_id:
+            params["p_id"] = row_id
+        return self.client.rpc("log_activity", params).execute().data
+
+    def _window(self, columns):
+        return self.client.table(self.table).select(",".join(columns))
+
+    def overlapping(self, user_id, start_time, end_time, columns):
+        # `during` is the computed [start_time, end_time) range (schema.sql), so
+        # this is a probe of the activities_no_overlap GiST index
+        return fetch_all(lambda: self._window(columns)
+            .eq("user_id", user_id)
+            .filter("during", "ov", f"[{start_time},{end_time})")
+            .order("start_time")
+            .order("id"))
+
+    def started_between(self, user_id, start_time, end_time, columns):
+        return fetch_all(lambda: self._window(columns)
+            .eq("user_id", user_id)
+            .gte("start_time", start_time)
+            .lt("start_time", end_time)
+            .order("start_time")
+            .order("id"))
+
+    def import_many(self, user_id, spans, rows, dry_run=False):
+        # One transaction server-side (see import_activities in schema.sql)
+        return [row["id"] for row in self.client.rpc("import_activities", {
+            "p_spans": [{"start_time": start.isoformat(), "end_time": end.isoformat()} for start, end in spans],
+            "p_rows": rows,
+            "p_dry_run": dry_run
+        }).execute().data]
+
+    def xp_totals(self, user_id, today):
+        # Served by the user_xp_daily rollup (RLS scopes it to the caller)
+        return self.client.rpc("get_xp_summary", {"p_today": today.isoformat()}).execute().data or {}
+
+    def check_rollup(self):
+        return self.client.rpc("check_user_xp_daily", {}).execute().data
+
+    def backfill_rollup(self):
+        return self.client.rpc("backfill_user_xp_daily", {}).execute().data
+
+
+class SupabaseSleep(SupabaseTable, SleepRepository):
+    def insert(self, user_id, row):
+        return self.client.table(self.table).insert({"user_id": user_id, **row}).execute().data[0]
+
+    def insert_many(self, user_id, rows):
+        return self.client.table(self.table).upsert(
+            [{"user_id": user_id, **row} for row in rows],
+            on_conflict="id",
+            ignore_duplicates=True
+        ).execute().data or []
+
+    def recent(self, user_id, limit):
+        return self.client.table(self.table) \
+            .select("*") \
+            .eq("user_id", user_id) \
+            .order("sleep_time", desc=True) \
+            .limit(limit) \
+            .execute().data
+
+
+class SupabaseFinance(SupabaseTable, FinanceRepository):
+    def upsert(self, user_id, row):
+        return self.client.table(self.table).upsert(
+            {"user_id": user_id, **row},
+            on_conflict="user_id,date"
+        ).execute().data[0]
+
+    def upsert_many(self, user_id, rows):
+        return self.client.table(self.table).upsert(
+            [{"user_id": user_id, **row} for row in rows],
+            on_conflict="user_id,date"
+        ).execute().data
+
+
+class SupabaseTombstones(TombstoneRepository):
+    def __init__(self, client):
+        self.client = client
+
+    def deleted_since(self, user_id, after, limit):
+        query = self.client.table("sync_tombstones").select("table_name,row_id,deleted_at").eq("user_id", user_id)
+        return after_position(query, "deleted_at", after, "row_id") \
+            .order("deleted_at") \
+            .order("row_id") \
+            .limit(limit) \
+            .execute().data
+
+
+def supabase_repositories(client):
+    return Repositories(
+        activities=SupabaseActivities(client),
+        sleep=SupabaseSleep(client),
+        finance=SupabaseFinance(client),
+        categories=SupabaseCategories(client),
+        tombstones=SupabaseTombstones(client)
+    )
@@ -1,12 +1,35 @@
 from flask import Blueprint, request, jsonify
-from app.utils.supabase_client import get_supabase_client, get_supabase_admin
-from app.utils.middleware import login_required
-from app.utils.activity_utils import calculate_xp, truncate_to_midnight, get_midnight_of_day
-from datetime import datetime
+from app.repositories import get_repositories
+from app.utils.middleware import login_required, get_token
+from app.utils.cache_utils import conditional_get, bump_version, get_version
+from app.utils.pagination import parse_list_params, paginate, shape_rows
+from app.utils.write_behind import WRITE_BEHIND, enqueue, merge_pending, cancel, utc_iso, classify
+from app.utils.realtime import publish_changes
+from app.utils.activity_utils import (
+    calculate_xp, parse_activity_times, activity_segments, localize, local_midnight,
+    IntervalSet, DEFAULT_MULTIPLIERS
+)
+from app.utils.timeline import get_timeline, record_activities, forget_activity
+from app.utils.timeseries import resolve_timezone, DEFAULT_TIMEZONE
+from datetime import datetime, timedelta
 import dateutil.parser
+import csv
+import io
+import json
+import math
+import sqlite3
 
 activity_bp = Blueprint('activities', __name__)
 
+MAX_BULK_ACTIVITIES = 100000
+MAX_TIMELINE_DAYS = 366
+
+# Columns clients may request via ?fields=
+ACTIVITY_FIELDS = (
+    "id", "user_id", "category", "start_time", "end_time",
+    "duration_minutes", "xp_earned", "created_at"
+)
+
 @activity_bp.route('/api/activities', methods=['POST'])
 @login_required
 def add_activity():
@@ -18,97 +41,263 @@ def add_activity():
     if not category_name or not start_time_str:
         return jsonify({"error": "Category and start_time are required"}), 400
 
-    start_time = dateutil.parser.isoparse(start_time_str)
-    
-    # Auto-stop at midnight if end_time not provided
-    if not end_time_str:
-        end_time = get_midnight_of_day(start_time)
-    else:
-        end_time = dateutil.parser.isoparse(end_time_str)
-        # Requirement: activities auto-stop at midnight
-        end_time = truncate_to_midnight(start_time, end_time)
-
-    supabase = get_supabase_client()
-
-    # 1. Fetch category multiplier
-    cat_res = supabase.table("categories") \
-        .select("xp_multiplier") \
-        .eq("user_id", request.user.id) \
-        .eq("name", category_name) \
-        .execute()
-    
-    if not cat_res.data:
-        # Failsafe: Create default multipliers if category is missing
-        multipliers = {
-            "Work": 1.2,
-            "Study": 1.1,
-            "Workout": 1.3,
-            "Cooking": 1.0,
-            "Wasted Time": -1.0
-        }
-        multiplier = multipliers.get(category_name, 1.0)
-        admin_client = get_supabase_admin()
-        if admin_client:
-            admin_client.table("categories").insert({
-                "user_id": request.user.id,
-                "name": category_name,
-                "xp_multiplier": multiplier
-            }).execute()
-        else:
-            # Fallback to regular client if admin not configured
-            supabase.table("categories").insert({
-                "user_id": request.user.id,
-                "name": category_name,
-                "xp_multiplier": multiplier
-            }).execute()
+    # Activities stop at midnight in the user's timezone ("tz", else the
+    # timestamps' offset): without an end time they auto-stop there, and one
+    # that runs past it is stored as one activity per day
+    try:
+        start_time, end_time, tz = parse_activity_times(start_time_str, end_time_str, data.get('tz'))
+        segments = activity_segments(start_time, end_time, tz)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if WRITE_BEHIND:
+        rows = [
+            enqueue("activities", request.user.id, get_token(),
+                    {"category": category_name, "start_time": utc_iso(start), "end_time": utc_iso(end)})
+            for start, end in segments
+        ]
+        return jsonify(with_segments(rows)), 202
+
+    repos = get_repositories()
+
+    # Resolve multiplier, replace overlaps ("new one overrides"), compute XP
+    # and insert, one transaction per day
+    prev_version = get_version(request.user.id, "activities")
+    rows = [repos.activities.log(request.user.id, category_name, start, end) for start, end in segments]
+    version = bump_version(request.user.id, "activities")
+    record_activities(request.user.id, rows, prev_version, version)
+    publish_changes(repos, request.user.id, "activities")
+
+    return jsonify(with_segments(rows)), 201
+
+def with_segments(rows):
+    """The first day's activity, as before, plus every day's when it was split."""
+    if len(rows) == 1:
+        return rows[0]
+    return {**rows[0], "segments": rows}
+
+def read_bulk_entries():
+    """Parses a JSON array, NDJSON or CSV body (or a multipart `file` upload)."""
+    upload = request.files.get('file')
+    if upload:
+        raw = upload.read().decode('utf-8-sig')
+        name = (upload.filename or '').lower()
+        kind = 'csv' if name.endswith('.csv') else 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'json'
     else:
-        multiplier = cat_res.data[0]['xp_multiplier']
-
-    # 2. Handle overlaps (Replace/Override)
-    # Logic: Delete any activity that fully or partially overlaps with the new one
-    # This simplifies the "new one overrides" rule.
-    supabase.table("activities") \
-        .delete() \
-        .eq("user_id", request.user.id) \
-        .lt("start_time", end_time.isoformat()) \
-        .gt("end_time", start_time.isoformat()) \
-        .execute()
-
-    # 3. Calculate XP
-    duration_minutes = (end_time - start_time).total_seconds() / 60
-    xp_earned = calculate_xp(duration_minutes, multiplier)
-
-    # 4. Insert new activity
-    new_activity = {
-        "user_id": request.user.id,
+        raw = request.get_data(as_text=True)
+        mimetype = request.mimetype or ''
+        kind = 'csv' if 'csv' in mimetype else 'ndjson' if 'ndjson' in mimetype or 'jsonl' in mimetype else 'json'
+
+    if kind == 'csv':
+        return list(csv.DictReader(io.StringIO(raw)))
+    if kind == 'ndjson':
+        return [json.loads(line) for line in raw.splitlines() if line.strip()]
+    entries = json.loads(raw)
+    if not isinstance(entries, list):
+        raise ValueError("Expected a JSON array of activities")
+    return entries
+
+@activity_bp.route('/api/activities/bulk', methods=['POST'])
+@login_required
+def bulk_add_activities():
+    """
+    Imports many activities at once with the same rules as add_activity:
+    per-day splitting at local midnight (an entry's "tz", else ?tz=, else
+    its offset), and newer overrides older on overlap (later rows in
+    the upload beat earlier ones, and the upload beats existing activities).
+    Overlaps are resolved in memory; writes are a few batched calls.
+    ?dry_run=1 reports what would happen without writing.
+    """
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        entries = read_bulk_entries()
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Could not parse upload: {e}"}), 400
+
+    if len(entries) > MAX_BULK_ACTIVITIES:
+        return jsonify({"error": f"At most {MAX_BULK_ACTIVITIES} activities per import"}), 400
+
+    # 1. Validate, split at local midnights and resolve overlaps within the upload
+    accepted = IntervalSet()
+    valid = []
+    skipped = []
+    overridden = []
+    split = 0
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            skipped.append({"index": index, "error": "Entry must be an object"})
+            continue
+        category_name = entry.get('category')
+        start_time_str = entry.get('start_time')
+        end_time_str = entry.get('end_time')
+        if not category_name or not start_time_str:
+            skipped.append({"index": index, "error": "Category and start_time are required"})
+            continue
+        try:
+            start_time, end_time, tz = parse_activity_times(
+                start_time_str, end_time_str, entry.get('tz') or request.args.get('tz'))
+            segments = activity_segments(start_time, end_time, tz)
+        except ValueError as e:
+            skipped.append({"index": index, "error": str(e)})
+            continue
+
+        split += len(segments) > 1
+        replaced = set()
+        for start, end in segments:
+            valid.append((start, end))
+            for older in accepted.add(start, end, (index, category_name, start, end)):
+                if older[0] not in replaced:
+                    replaced.add(older[0])
+                    overridden.append({"index": older[0], "replaced_by": index})
+
+    repos = get_repositories()
+    user_id = request.user.id
+
+    # 2. Existing activities overlapping any valid upload row are replaced, even
+    # rows later overridden within the upload (same result as posting one by one).
+    # The database picks them inside the import's transaction, so an activity
+    # logged while the upload was parsed is replaced too rather than conflicting
+    covered = IntervalSet()
+    for start, end in sorted(valid):
+        if covered and start <= covered.ends[-1]:
+            start = covered.starts[-1]
+            end = max(end, covered.ends[-1])
+        covered.add(start, end, None)
+    spans = list(zip(covered.starts, covered.ends))
+
+    # 3. Multipliers for every category in one query; missing ones get defaults
+    multipliers = repos.categories.multipliers(user_id)
+    new_categories = sorted({item[1] for item in accepted.items} - set(multipliers))
+    for name in new_categories:
+        multipliers[name] = DEFAULT_MULTIPLIERS.get(name, 1.0)
+
+    rows = [{
         "category": category_name,
         "start_time": start_time.isoformat(),
         "end_time": end_time.isoformat(),
-        "xp_earned": xp_earned
+        "xp_earned": round(calculate_xp((end_time - start_time).total_seconds() / 60, multipliers[category_name]), 2)
+    } for _, category_name, start_time, end_time in accepted.items]
+
+    report = {
+        "dry_run": dry_run,
+        "received": len(entries),
+        "to_insert": len(accepted),
+        "split_at_midnight": split,
+        "skipped": skipped,
+        "overridden_in_upload": overridden,
+        "new_categories": new_categories
     }
+    if dry_run:
+        report["replaced_existing"] = repos.activities.import_many(user_id, spans, rows, dry_run=True)
+        return jsonify(report), 200
+
+    # 4. Categories, then overlap deletes and inserts in one transaction: a
+    # failed import changes nothing and can simply be sent again
+    if new_categories:
+        repos.categories.add_missing(user_id, {name: multipliers[name] for name in new_categories})
+    try:
+        report["replaced_existing"] = repos.activities.import_many(user_id, spans, rows)
+    except Exception as e:
+        failure = import_failure(e)
+        if failure is None:
+            raise
+        status, message, headers = failure
+        report["error"] = message
+        report["failed"] = sorted({item[0] for item in accepted.items})
+        return jsonify(report), status, headers
+
+    bump_version(user_id, "activities")
+    publish_changes(repos, user_id, "activities")
+
+    report["inserted"] = len(rows)
+    return jsonify(report), 201
 
-    res = supabase.table("activities").insert(new_activity).execute()
-    
-    return jsonify(res.data[0]), 201
+def import_failure(e):
+    """(status, error, headers) for an import the database refused as a whole; None for anything else."""
+    from postgrest.exceptions import APIError
+    if getattr(e, "code", None) == "23P01" or isinstance(e, sqlite3.IntegrityError):
+        return 409, "An activity overlapping the upload was logged meanwhile; nothing was imported", {}
+    if classify(e) == "transient" or isinstance(e, sqlite3.OperationalError):
+        retry_after = math.ceil(getattr(e, "retry_after", 1))
+        return 503, f"Import failed, nothing was imported; retry in {retry_after}s", {"Retry-After": str(retry_after)}
+    if isinstance(e, APIError):
+        return 422, f"Import rejected, nothing was imported: {e.message}", {}
+    return None
 
 @activity_bp.route('/api/activities', methods=['GET'])
 @login_required
+@conditional_get
 def get_activities():
-    supabase = get_supabase_client()
-    res = supabase.table("activities") \
-        .select("*") \
-        .eq("user_id", request.user.id) \
-        .order("start_time", desc=True) \
-        .execute()
-    return jsonify(res.data), 200
+    try:
+        params = parse_list_params(request.args, "start_time", ACTIVITY_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    repos = get_repositories()
+    rows = repos.activities.list_page(request.user.id, params)
+    rows = merge_pending("activities", request.user.id, rows, params)
+    rows, headers = paginate(rows, "start_time", params, request.base_url, request.args.to_dict())
+    return jsonify(shape_rows(rows, params)), 200, headers
 
 @activity_bp.route('/api/activities/<activity_id>', methods=['DELETE'])
 @login_required
 def delete_activity(activity_id):
-    supabase = get_supabase_client()
-    res = supabase.table("activities") \
-        .delete() \
-        .eq("id", activity_id) \
-        .eq("user_id", request.user.id) \
-        .execute()
+    cancel(request.user.id, activity_id)
+    repos = get_repositories()
+    prev_version = get_version(request.user.id, "activities")
+    deleted = repos.activities.delete(request.user.id, activity_id)
+    version = bump_version(request.user.id, "activities")
+    for row in deleted:
+        forget_activity(request.user.id, row["id"], prev_version, version)
+    publish_changes(repos, request.user.id, "activities")
     return jsonify({"message": "Activity deleted"}), 200
+
+def parse_instant(value, tz, end_of_day=False):
+    """An ISO-8601 timestamp, or a YYYY-MM-DD date in tz: its start, or its end for end_of_day."""
+    try:
+        if len(value) == 10:
+            day = datetime.strptime(value, "%Y-%m-%d").date()
+            return local_midnight(day + timedelta(days=1) if end_of_day else day, tz)
+        return localize(dateutil.parser.isoparse(value), tz)
+    except (ValueError, OverflowError):
+        raise ValueError("Invalid date format, use YYYY-MM-DD or an ISO-8601 timestamp")
+
+@activity_bp.route('/api/timeline', methods=['GET'])
+@login_required
+@conditional_get
+def get_timeline_window():
+    """
+    Activities overlapping ?from=&to=, the untracked gaps between them and,
+    with ?at=, the activity running at that moment. Dates are local to ?tz=
+    and `to` is inclusive; both default to today. ?min_gap= (minutes) leaves
+    out shorter gaps. Served from the user's in-memory timeline index.
+    """
+    try:
+        tz = resolve_timezone(request.args.get('tz', DEFAULT_TIMEZONE))
+        start = parse_instant(request.args.get('from') or datetime.now(tz).date().isoformat(), tz)
+        if request.args.get('to'):
+            end = parse_instant(request.args['to'], tz, end_of_day=True)
+        else:
+            end = local_midnight(start.astimezone(tz).date() + timedelta(days=1), tz)
+        at = parse_instant(request.args['at'], tz) if request.args.get('at') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        min_gap = float(request.args.get('min_gap', 0))
+    except ValueError:
+        return jsonify({"error": "min_gap must be a number of minutes"}), 400
+    if end <= start:
+        return jsonify({"error": "from must be before to"}), 400
+    if end - start > timedelta(days=MAX_TIMELINE_DAYS):
+        return jsonify({"error": f"Range may span at most {MAX_TIMELINE_DAYS} days"}), 400
+
+    repos = get_repositories()
+    timeline = get_timeline(repos.activities, request.user.id)
+    with timeline.lock:
+        result = timeline.window(start, end, min_gap)
+        current = timeline.at(at) if at else None
+
+    body = {"range": {"from": start.isoformat(), "to": end.isoformat(), "tz": tz.zone}, **result}
+    if at:
+        body["at"] = {"time": at.isoformat(), "activity": current}
+    return jsonify(body), 200
@@ -0,0 +1,194 @@
+"""
+Coroutine versions of the dashboard read routes for the ASGI entry point
+(asgi.py). Same responses, ETags and caches as the Flask views; auth checks
+and upstream queries are awaited, so a worker keeps serving other requests
+while PostgREST or GoTrue answer.
+"""
+import asyncio
+import math
+import time
+from datetime import timedelta
+from functools import wraps
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import parse_etags
+from app.repositories import async_repositories_for
+from app.utils.async_supabase_client import get_async_auth
+from app.utils.cache_utils import make_etag, memoize_for_user_async
+from app.utils.compression import compress_body
+from app.utils.finance_index import finance_summary_async
+from app.utils.metrics import begin_request, finish_request, end_request, timed_span
+from app.utils.realtime import hub, stream_deadline, HEARTBEAT_SECONDS, RETRY_MS
+from app.utils.stats_utils import utc_today, normalize_xp_totals, build_summary
+from app.utils.supabase_client import CircuitOpen, PoolExhausted
+from app.utils.timeseries import DEFAULT_TIMEZONE
+from app.utils.token_utils import verify_token_async
+from app.utils.write_behind import note_token
+
+
+def get_token(request):
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return request.cookies.get('sb-access-token')
+
+
+def async_view(flask_app, conditional=True):
+    """
+    login_required (+ conditional_get) for a coroutine view(request, user, token)
+    returning a JSON-able body (or a ready Response). Bodies go through the
+    Flask app's JSON provider so both serving modes answer byte-for-byte the same.
+    """
+    def json_response(request, body, status=200, headers=None):
+        # Compressed like init_compression does for the Flask views
+        headers = dict(headers or {})
+        data = flask_app.json.response(body).get_data()
+        headers["Vary"] = "Accept-Encoding"
+        data, encoding = compress_body(data, request.headers.get("Accept-Encoding"))
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            if "ETag" in headers:
+                headers["ETag"] = "W/" + headers["ETag"]
+        return Response(data, status, headers, media_type="application/json")
+
+    def decorator(view):
+        @wraps(view)
+        async def endpoint(request):
+            token = get_token(request)
+            if not token:
+                return json_response(request, {"error": "Unauthorized"}, 401)
+            try:
+                with timed_span("auth"):
+                    user = await verify_token_async(token, get_async_auth)
+                if not user:
+                    return json_response(request, {"error": "Invalid token"}, 401)
+                # As login_required does: queued writes are flushed with the user's latest token
+                note_token(user.id, token)
+            except Exception as e:
+                return json_response(request, {"error": str(e)}, 401)
+
+            headers = None
+            if conditional:
+                full_path = f"{request.url.path}?{request.url.query}"
+                etag = make_etag(user.id, full_path, request.query_params.get("tz", DEFAULT_TIMEZONE))
+                headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+                if parse_etags(request.headers.get("If-None-Match")).contains_weak(etag):
+                    return Response(status_code=304, headers=headers)
+            try:
+                body = await view(request, user, token)
+            except (PoolExhausted, CircuitOpen) as e:
+                # Same answer as init_upstream_errors gives the Flask views
+                retry_after = math.ceil(getattr(e, "retry_after", 1))
+                return json_response(request, {"error": str(e)}, 503, {"Retry-After": str(retry_after)})
+            return body if isinstance(body, Response) else json_response(request, body, headers=headers)
+        return endpoint
+    return decorator
+
+
+def instrumented(rule, endpoint):
+    """Records the route's latency like init_metrics does for Flask views."""
+    @wraps(endpoint)
+    async def timed_endpoint(request):
+        metrics_token = begin_request(rule)
+        try:
+            try:
+                response = await endpoint(request)
+            except Exception:
+                finish_request(request.method, 500)
+                raise
+            server_timing = finish_request(request.method, response.status_code)
+            if server_timing:
+                response.headers["Server-Timing"] = server_timing
+            return response
+        finally:
+            end_request(metrics_token)
+    return timed_endpoint
+
+
+async def cached_xp_totals(repos, user_id):
+    today = utc_today()
+    async def compute():
+        return normalize_xp_totals(await repos.activities.xp_totals(user_id, today))
+    return await memoize_for_user_async(user_id, "xp_totals", compute, today)
+
+
+async def last_30_days_finance(repos, user_id):
+    today = utc_today()
+    summary = await finance_summary_async(repos.finance, user_id, today - timedelta(days=30), today)
+    del summary["series"]
+    return {"period": "Last 30 days", **summary}
+
+
+async def cached_recent_sleep(repos, user_id):
+    return await memoize_for_user_async(user_id, "recent_sleep", lambda: repos.sleep.recent(user_id, 5))
+
+
+async def me(request, user, token):
+    return {"id": user.id, "email": user.email}
+
+
+async def summary(request, user, token):
+    async with async_repositories_for(token) as repos:
+        return build_summary(await cached_xp_totals(repos, user.id))
+
+
+async def skills(request, user, token):
+    async with async_repositories_for(token) as repos:
+        return (await cached_xp_totals(repos, user.id))["skills"]
+
+
+async def dashboard(request, user, token):
+    """Everything the dashboard renders, with the upstream queries awaited concurrently."""
+    async def run(fn):
+        async with async_repositories_for(token) as repos:
+            return await fn(repos, user.id)
+
+    xp, finance, sleep_logs = await asyncio.gather(
+        run(cached_xp_totals), run(last_30_days_finance), run(cached_recent_sleep)
+    )
+    return {
+        "summary": build_summary(xp),
+        "skills": xp["skills"],
+        "finance": finance,
+        "sleep_logs": sleep_logs
+    }
+
+
+async def events(request, user, token):
+    """/api/events as a coroutine per stream, so idle dashboards cost no worker thread."""
+    loop = asyncio.get_running_loop()
+    frames = asyncio.Queue()
+    deadline = stream_deadline(user)
+
+    def deliver(frame):
+        # Called from the hub thread
+        loop.call_soon_threadsafe(frames.put_nowait, frame)
+
+    async def stream():
+        hub.subscribe(user.id, deliver)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while time.time() < deadline:
+                try:
+                    yield await asyncio.wait_for(frames.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            hub.unsubscribe(user.id, deliver)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def async_routes(flask_app):
+    views = [
+        ('/api/auth/me', me, False),
+        ('/api/events', events, False),
+        ('/api/stats/summary', summary, True),
+        ('/api/stats/skills', skills, True),
+        ('/api/dashboard', dashboard, True),
+    ]
+    return [
+        Route(rule, instrumented(rule, async_view(flask_app, conditional)(view)), methods=["GET"])
+        for rule, view, conditional in views
+    ]
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, make_response
 from app.utils.supabase_client import get_supabase_client
 from app.utils.middleware import login_required, admin_only
+from app.utils.metrics import timed_upstream
 import os
 
 auth_bp = Blueprint('auth', __name__)
@@ -28,10 +29,11 @@ def login():
 
     supabase = get_supabase_client()
     try:
-        response = supabase.auth.sign_in_with_password({
-            "email": email,
-            "password": password
-        })
+        with timed_upstream("gotrue", "token", "sign_in"):
+            response = supabase.auth.sign_in_with_password({
+                "email": email,
+                "password": password
+            })
         
         if response.user:
             res = make_response(jsonify({
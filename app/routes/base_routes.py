@@ -1,4 +1,7 @@
-from flask import Blueprint, jsonify, render_template
+from flask import Blueprint, Response, jsonify, render_template, request
+from app.utils.metrics import registry
+import hmac
+import os
 
 base_bp = Blueprint('base', __name__)
 
@@ -10,6 +13,17 @@ def health_check():
         "version": "1.0.0"
     }), 200
 
+@base_bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    # Route names, traffic and upstream errors are not for the public: the
+    # scraper must send METRICS_TOKEN, and without one the endpoint is off
+    metrics_token = os.getenv('METRICS_TOKEN')
+    if not metrics_token:
+        return jsonify({"error": "Metrics are disabled; set METRICS_TOKEN to enable them"}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {metrics_token}'.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 @base_bp.route('/', methods=['GET'])
 def index():
     return render_template('login.html')
@@ -0,0 +1,95 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.repositories import get_repositories
+from app.utils.middleware import login_required
+from datetime import datetime, timezone
+import csv
+import io
+import json
+import zlib
+
+export_bp = Blueprint('export', __name__)
+
+# table -> exported columns
+EXPORT_TABLES = {
+    "activities": [
+        "id", "category", "start_time", "end_time", "duration_minutes", "xp_earned", "created_at"
+    ],
+    "sleep_logs": [
+        "id", "sleep_time", "wake_time", "duration_minutes", "quality", "created_at"
+    ],
+    "daily_finance": [
+        "id", "date", "income", "expense", "net", "created_at"
+    ],
+}
+EXPORT_PAGE_SIZE = 1000
+
+def iter_table_pages(repos, user_id, table):
+    return repos.for_table(table).iter_pages(user_id, EXPORT_TABLES[table], EXPORT_PAGE_SIZE)
+
+def ndjson_chunks(repos, user_id, tables):
+    for table in tables:
+        for page in iter_table_pages(repos, user_id, table):
+            yield "".join(
+                json.dumps({"table": table, **row}, separators=(",", ":")) + "\n" for row in page
+            )
+
+def csv_chunks(repos, user_id, tables):
+    # One section per table, each with its own header row, separated by a blank line
+    for position, table in enumerate(tables):
+        columns = EXPORT_TABLES[table]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if position:
+            buffer.write("\r\n")
+        writer.writerow(["table"] + columns)
+        yield buffer.getvalue()
+        for page in iter_table_pages(repos, user_id, table):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([table] + [row.get(c) for c in columns] for row in page)
+            yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+@export_bp.route('/api/export', methods=['GET'])
+@login_required
+def export_data():
+    """
+    Streams all of the user's rows as NDJSON or CSV, one page at a time, so
+    memory stays flat however long the history is.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    tables = [t.strip() for t in request.args.get('tables', ",".join(EXPORT_TABLES)).split(",") if t.strip()]
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown or not tables:
+        return jsonify({"error": f"tables must be a subset of {', '.join(EXPORT_TABLES)}"}), 400
+
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    repos = get_repositories()
+    user_id = request.user.id
+
+    chunks = ndjson_chunks(repos, user_id, tables) if fmt == 'ndjson' else csv_chunks(repos, user_id, tables)
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    filename = f"lifeio-export-{datetime.now(timezone.utc).date().isoformat()}.{fmt}"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store"
+        }
+    )
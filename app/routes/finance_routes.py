@@ -1,10 +1,20 @@
 from flask import Blueprint, request, jsonify
-from app.utils.supabase_client import get_supabase_client
-from app.utils.middleware import login_required
+from app.repositories import get_repositories
+from app.utils.middleware import login_required, get_token
+from app.utils.cache_utils import conditional_get, bump_version, get_version
+from app.utils.pagination import parse_list_params, paginate, shape_rows
+from app.utils.finance_index import record_finance_row, forget_finance_row
+from app.utils.write_behind import WRITE_BEHIND, enqueue, merge_pending, cancel
+from app.utils.realtime import publish_changes
 from datetime import datetime
 
 finance_bp = Blueprint('finance', __name__)
 
+# Columns clients may request via ?fields=
+FINANCE_FIELDS = (
+    "id", "user_id", "date", "income", "expense", "net", "created_at"
+)
+
 @finance_bp.route('/api/finance', methods=['POST'])
 @login_required
 def update_finance():
@@ -22,43 +32,52 @@ def update_finance():
     except ValueError:
         return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
 
-    supabase = get_supabase_client()
-
     new_record = {
-        "user_id": request.user.id,
         "date": date_str,
         "income": float(income),
         "expense": float(expense)
     }
 
+    if WRITE_BEHIND:
+        return jsonify(enqueue("finance", request.user.id, get_token(), new_record)), 202
+
+    repos = get_repositories()
+
     try:
         # Upsert logic based on user_id and date
-        res = supabase.table("daily_finance").upsert(
-            new_record, 
-            on_conflict="user_id,date"
-        ).execute()
-        return jsonify(res.data[0]), 201
+        prev_version = get_version(request.user.id, "finance")
+        record = repos.finance.upsert(request.user.id, new_record)
+        version = bump_version(request.user.id, "finance")
+        record_finance_row(request.user.id, record, prev_version, version)
+        publish_changes(repos, request.user.id, "finance")
+        return jsonify(record), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 @finance_bp.route('/api/finance', methods=['GET'])
 @login_required
+@conditional_get
 def get_finance_logs():
-    supabase = get_supabase_client()
-    res = supabase.table("daily_finance") \
-        .select("*") \
-        .eq("user_id", request.user.id) \
-        .order("date", desc=True) \
-        .execute()
-    return jsonify(res.data), 200
+    try:
+        params = parse_list_params(request.args, "date", FINANCE_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    repos = get_repositories()
+    rows = repos.finance.list_page(request.user.id, params)
+    rows = merge_pending("finance", request.user.id, rows, params)
+    rows, headers = paginate(rows, "date", params, request.base_url, request.args.to_dict())
+    return jsonify(shape_rows(rows, params)), 200, headers
 
 @finance_bp.route('/api/finance/<log_id>', methods=['DELETE'])
 @login_required
 def delete_finance_log(log_id):
-    supabase = get_supabase_client()
-    res = supabase.table("daily_finance") \
-        .delete() \
-        .eq("id", log_id) \
-        .eq("user_id", request.user.id) \
-        .execute()
+    cancel(request.user.id, log_id)
+    repos = get_repositories()
+    prev_version = get_version(request.user.id, "finance")
+    deleted = repos.finance.delete(request.user.id, log_id)
+    version = bump_version(request.user.id, "finance")
+    for row in deleted:
+        forget_finance_row(request.user.id, row["id"], prev_version, version)
+    publish_changes(repos, request.user.id, "finance")
     return jsonify({"message": "Finance record deleted"}), 200
@@ -0,0 +1,49 @@
+from flask import Blueprint, Response, request, jsonify
+from app.utils.middleware import login_required
+from app.utils.realtime import hub, stream_deadline, HEARTBEAT_SECONDS, RETRY_MS
+import os
+import queue
+import threading
+import time
+
+realtime_bp = Blueprint('realtime', __name__)
+
+# A stream holds a worker thread for as long as the dashboard is open, so only
+# a few run per process here; asgi.py serves them as coroutines without a cap
+MAX_STREAMS = int(os.getenv('REALTIME_WSGI_STREAMS', 2))
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+@realtime_bp.route('/api/events', methods=['GET'])
+@login_required
+def events():
+    """Server-sent dashboard updates for the current user (see app/utils/realtime.py)."""
+    if not _stream_slots.acquire(blocking=False):
+        # The dashboard falls back to refetching after its own writes
+        return jsonify({"error": "Too many open event streams"}), 503, {"Retry-After": "60"}
+
+    user_id = request.user.id
+    deadline = stream_deadline(request.user)
+    frames = queue.SimpleQueue()
+    hub.subscribe(user_id, frames.put)
+
+    def stream():
+        yield f"retry: {RETRY_MS}\n\n"
+        while time.time() < deadline:
+            try:
+                yield frames.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+
+    released = []
+
+    def close():
+        if not released:
+            released.append(True)
+            hub.unsubscribe(user_id, frames.put)
+            _stream_slots.release()
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Runs when the server closes the response, including after a client disconnect
+    response.call_on_close(close)
+    return response
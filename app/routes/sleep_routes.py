@@ -1,11 +1,22 @@
 from flask import Blueprint, request, jsonify
-from app.utils.supabase_client import get_supabase_client
-from app.utils.middleware import login_required
+from app.repositories import get_repositories
+from app.utils.middleware import login_required, get_token
+from app.utils.cache_utils import conditional_get, bump_version, get_version
+from app.utils.pagination import parse_list_params, paginate, shape_rows
+from app.utils.sleep_analytics import DEFAULT_TARGET_HOURS, get_sleep_analytics, record_sleep_log, forget_sleep_log
+from app.utils.timeseries import DEFAULT_TIMEZONE, resolve_timezone
+from app.utils.write_behind import WRITE_BEHIND, enqueue, merge_pending, cancel, utc_iso
+from app.utils.realtime import publish_changes
 from datetime import datetime
 import dateutil.parser
 
 sleep_bp = Blueprint('sleep', __name__)
 
+# Columns clients may request via ?fields=
+SLEEP_FIELDS = (
+    "id", "user_id", "sleep_time", "wake_time", "duration_minutes", "quality", "created_at"
+)
+
 @sleep_bp.route('/api/sleep', methods=['POST'])
 @login_required
 def add_sleep_log():
@@ -31,39 +42,74 @@ def add_sleep_log():
     if quality < 1 or quality > 5:
         return jsonify({"error": "Quality must be between 1 and 5"}), 400
 
-    supabase = get_supabase_client()
+    if WRITE_BEHIND:
+        row = {"sleep_time": utc_iso(sleep_time), "wake_time": utc_iso(wake_time), "quality": quality}
+        return jsonify(enqueue("sleep", request.user.id, get_token(), row)), 202
+
+    repos = get_repositories()
 
     new_log = {
-        "user_id": request.user.id,
         "sleep_time": sleep_time.isoformat(),
         "wake_time": wake_time.isoformat(),
         "quality": quality
     }
 
     try:
-        res = supabase.table("sleep_logs").insert(new_log).execute()
-        return jsonify(res.data[0]), 201
+        prev_version = get_version(request.user.id, "sleep")
+        log = repos.sleep.insert(request.user.id, new_log)
+        version = bump_version(request.user.id, "sleep")
+        record_sleep_log(request.user.id, log, prev_version, version)
+        publish_changes(repos, request.user.id, "sleep", row=log)
+        return jsonify(log), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 @sleep_bp.route('/api/sleep', methods=['GET'])
 @login_required
+@conditional_get
 def get_sleep_logs():
-    supabase = get_supabase_client()
-    res = supabase.table("sleep_logs") \
-        .select("*") \
-        .eq("user_id", request.user.id) \
-        .order("sleep_time", desc=True) \
-        .execute()
-    return jsonify(res.data), 200
+    try:
+        params = parse_list_params(request.args, "sleep_time", SLEEP_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    repos = get_repositories()
+    rows = repos.sleep.list_page(request.user.id, params)
+    rows = merge_pending("sleep", request.user.id, rows, params)
+    rows, headers = paginate(rows, "sleep_time", params, request.base_url, request.args.to_dict())
+    return jsonify(shape_rows(rows, params)), 200, headers
+
+@sleep_bp.route('/api/sleep/analytics', methods=['GET'])
+@login_required
+@conditional_get
+def get_sleep_analytics_route():
+    """
+    Rolling averages, sleep debt, bedtime/wake consistency and quality
+    correlations, served from an aggregate kept current by the write routes.
+    """
+    try:
+        tz = resolve_timezone(request.args.get('tz', DEFAULT_TIMEZONE))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        target_hours = float(request.args.get('target_hours', DEFAULT_TARGET_HOURS))
+    except ValueError:
+        return jsonify({"error": "target_hours must be a number"}), 400
+    if not 0 < target_hours <= 24:
+        return jsonify({"error": "target_hours must be between 0 and 24"}), 400
+
+    repos = get_repositories()
+    return jsonify(get_sleep_analytics(repos.sleep, request.user.id, tz, target_hours)), 200
 
 @sleep_bp.route('/api/sleep/<log_id>', methods=['DELETE'])
 @login_required
 def delete_sleep_log(log_id):
-    supabase = get_supabase_client()
-    res = supabase.table("sleep_logs") \
-        .delete() \
-        .eq("id", log_id) \
-        .eq("user_id", request.user.id) \
-        .execute()
+    cancel(request.user.id, log_id)
+    repos = get_repositories()
+    prev_version = get_version(request.user.id, "sleep")
+    deleted = repos.sleep.delete(request.user.id, log_id)
+    version = bump_version(request.user.id, "sleep")
+    for row in deleted:
+        forget_sleep_log(request.user.id, row["id"], prev_version, version)
+    publish_changes(repos, request.user.id, "sleep")
     return jsonify({"message": "Sleep log deleted"}), 200
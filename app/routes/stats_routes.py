@@ -1,99 +1,141 @@
 from flask import Blueprint, jsonify, request
-from app.utils.supabase_client import get_supabase_client
-from app.utils.middleware import login_required
-from app.utils.xp_utils import get_level_progress
-from datetime import datetime, timedelta
-import pytz
+from app.repositories import get_repositories, repositories_for
+from app.utils.middleware import login_required, admin_only, get_token
+from app.utils.cache_utils import conditional_get, memoize_for_user, bump_version
+from app.utils.stats_utils import (
+    utc_today, build_summary, check_xp_rollup, backfill_xp_rollup,
+    cached_xp_totals, last_30_days_finance, cached_recent_sleep
+)
+from app.utils.timeseries import (
+    compute_timeseries, parse_range, resolve_timezone, DEFAULT_TIMEZONE
+)
+from app.utils.finance_index import finance_summary, parse_finance_range
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import timedelta
+import os
 
 stats_bp = Blueprint('stats', __name__)
 
+# Shared pool for dashboard fan-out; each task checks out its own Supabase client
+fanout_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DASHBOARD_FANOUT_WORKERS', 8)),
+    thread_name_prefix='dashboard-fanout'
+)
+
 @stats_bp.route('/api/stats/summary', methods=['GET'])
 @login_required
+@conditional_get
 def get_summary():
-    supabase = get_supabase_client()
-    user_id = request.user.id
-    
-    # 1. Get Lifetime XP (Sum of all activities)
-    act_res = supabase.table("activities") \
-        .select("xp_earned") \
-        .eq("user_id", user_id) \
-        .execute()
-    
-    total_xp = sum(item['xp_earned'] for item in act_res.data) if act_res.data else 0
-    level_info = get_level_progress(total_xp)
-
-    # 2. Get Monthly XP
-    start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat()
-    month_res = supabase.table("activities") \
-        .select("xp_earned") \
-        .eq("user_id", user_id) \
-        .gte("start_time", start_of_month) \
-        .execute()
-    monthly_xp = sum(item['xp_earned'] for item in month_res.data) if month_res.data else 0
-
-    # 3. Get Today XP
-    start_of_today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-    today_res = supabase.table("activities") \
-        .select("xp_earned") \
-        .eq("user_id", user_id) \
-        .gte("start_time", start_of_today) \
-        .execute()
-    today_xp = sum(item['xp_earned'] for item in today_res.data) if today_res.data else 0
-
-    return jsonify({
-        "level": level_info['level'],
-        "xp_stats": {
-            "total": level_info['total_xp'],
-            "current_level_progress": level_info['xp_current'],
-            "needed_for_next": level_info['xp_needed'],
-            "monthly": round(monthly_xp, 2),
-            "today": round(today_xp, 2)
-        }
-    }), 200
+    repos = get_repositories()
+    return jsonify(build_summary(cached_xp_totals(repos, request.user.id))), 200
 
 @stats_bp.route('/api/stats/skills', methods=['GET'])
 @login_required
+@conditional_get
 def get_skills():
-    supabase = get_supabase_client()
-    user_id = request.user.id
-    
-    # Get XP grouped by category
-    res = supabase.table("activities") \
-        .select("category, xp_earned") \
-        .eq("user_id", user_id) \
-        .execute()
-    
-    skills = {}
-    if res.data:
-        for item in res.data:
-            cat = item['category']
-            skills[cat] = skills.get(cat, 0) + item['xp_earned']
-            
-    # Round values
-    formatted_skills = {k: round(v, 2) for k, v in skills.items()}
-    
-    return jsonify(formatted_skills), 200
+    repos = get_repositories()
+    return jsonify(cached_xp_totals(repos, request.user.id)["skills"]), 200
 
 @stats_bp.route('/api/stats/finance', methods=['GET'])
 @login_required
+@conditional_get
 def get_finance_summary():
-    supabase = get_supabase_client()
+    """
+    Income/expense totals and a bucketed series for ?from=&to= (default: the
+    last 30 days) at ?granularity=day|week|month|year.
+    """
+    try:
+        date_from, date_to, granularity = parse_finance_range(request.args, utc_today())
+        repos = get_repositories()
+        summary = finance_summary(repos.finance, request.user.id, date_from, date_to, granularity)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    period = "Last 30 days" if not request.args.get('from') and not request.args.get('to') \
+        else f"{date_from.isoformat()} to {date_to.isoformat()}"
+    return jsonify({
+        "period": period,
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "granularity": granularity,
+        **summary
+    }), 200
+
+@stats_bp.route('/api/dashboard', methods=['GET'])
+@login_required
+@conditional_get
+def get_dashboard():
+    """Everything the dashboard renders, with the upstream queries run concurrently."""
+    token = get_token()
+    user_id = request.user.id
+
+    def run(fn):
+        # A pooled client only connects if fn misses the stats cache
+        with repositories_for(token) as repos:
+            return fn(repos, user_id)
+
+    # Each task runs in a copy of this request's context so its upstream calls are attributed to it
+    futures = {
+        "xp": fanout_executor.submit(copy_context().run, run, cached_xp_totals),
+        "finance": fanout_executor.submit(copy_context().run, run, last_30_days_finance),
+        "sleep_logs": fanout_executor.submit(copy_context().run, run, cached_recent_sleep),
+    }
+    results = {name: future.result() for name, future in futures.items()}
+
+    return jsonify({
+        "summary": build_summary(results["xp"]),
+        "skills": results["xp"]["skills"],
+        "finance": results["finance"],
+        "sleep_logs": results["sleep_logs"]
+    }), 200
+
+@stats_bp.route('/api/stats/timeseries', methods=['GET'])
+@login_required
+@conditional_get
+def get_timeseries():
+    """
+    Daily/weekly XP per category, rolling 7/30-day averages, productive streaks
+    and an hour-of-day heatmap for ?from=&to= (local dates in ?tz=).
+    """
+    try:
+        tz = resolve_timezone(request.args.get('tz', DEFAULT_TIMEZONE))
+        date_from, date_to = parse_range(request.args, tz)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    repos = get_repositories()
     user_id = request.user.id
-    
-    # Get last 30 days of finance
-    thirty_days_ago = (datetime.now() - timedelta(days=30)).date().isoformat()
-    res = supabase.table("daily_finance") \
-        .select("income, expense") \
-        .eq("user_id", user_id) \
-        .gte("date", thirty_days_ago) \
-        .execute()
-    
-    total_income = sum(item['income'] for item in res.data) if res.data else 0
-    total_expense = sum(item['expense'] for item in res.data) if res.data else 0
-    
+
+    def compute():
+        # Widen by the rolling-average warm-up plus a day either side for tz offsets
+        window_start = (date_from - timedelta(days=31)).isoformat()
+        window_end = (date_to + timedelta(days=2)).isoformat()
+        rows = repos.activities.started_between(
+            user_id, window_start, window_end, ["start_time", "end_time", "category", "xp_earned"]
+        )
+        return compute_timeseries(rows, date_from, date_to, tz)
+
+    result = memoize_for_user(user_id, "timeseries", compute, date_from, date_to, tz.zone)
+    return jsonify({
+        "range": {"from": date_from.isoformat(), "to": date_to.isoformat(), "tz": tz.zone},
+        **result
+    }), 200
+
+@stats_bp.route('/api/stats/rollup/check', methods=['GET'])
+@admin_only
+def check_rollup():
+    repos = get_repositories()
+    mismatches = check_xp_rollup(repos)
     return jsonify({
-        "period": "Last 30 days",
-        "total_income": float(total_income),
-        "total_expense": float(total_expense),
-        "net": float(total_income - total_expense)
+        "consistent": not mismatches,
+        "mismatches": mismatches
     }), 200
+
+@stats_bp.route('/api/stats/rollup/backfill', methods=['POST'])
+@admin_only
+def backfill_rollup():
+    repos = get_repositories()
+    buckets = backfill_xp_rollup(repos)
+    bump_version(request.user.id, "activities")
+    return jsonify({"message": "XP rollup rebuilt", "buckets": buckets}), 200
@@ -0,0 +1,26 @@
+from flask import Blueprint, request, jsonify
+from app.repositories import get_repositories
+from app.utils.middleware import login_required
+from app.utils.sync import parse_sync_params, changes_since
+from app.utils.write_behind import flush_pending
+
+sync_bp = Blueprint('sync', __name__)
+
+@sync_bp.route('/api/sync', methods=['GET'])
+@login_required
+def sync():
+    """
+    Rows changed and deleted since ?since= (the cursor from the previous
+    response; omit it for everything). Call again with the new cursor while
+    "more" is true; "reset" means the client must drop its copy first.
+    No ETag: the answer depends on the cursor, and the queued-write flush
+    below has to run on every call.
+    """
+    try:
+        params = parse_sync_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Queued writes go out first so the delta includes them
+    pending = flush_pending(request.user.id)
+    return jsonify(changes_since(get_repositories(), request.user.id, params, pending=pending)), 200
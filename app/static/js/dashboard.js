@@ -1,5 +1,13 @@
+// True while the server pushes dashboard changes; forms then skip the refetch
+let liveUpdates = false;
+// True when the dashboard renders from the IndexedDB replica (replica.js)
+let useReplica = false;
+let replicaShown = false;
+let sleepLogs = [];
+
 document.addEventListener('DOMContentLoaded', () => {
-    fetchDashboardData();
+    loadDashboard();
+    connectLiveUpdates();
 
     // Modal Handling
     const modal = document.getElementById('add-entry-modal');
@@ -47,6 +55,8 @@ function setupForm(formId, endpoint) {
         // Simple validation or defaults
         if (data.income === "") data.income = 0;
         if (data.expense === "") data.expense = 0;
+        // datetime-local values are wall-clock times; activities split at this zone's midnight
+        if (endpoint === '/api/activities') data.tz = Intl.DateTimeFormat().resolvedOptions().timeZone;
 
         const response = await fetch(endpoint, {
             method: 'POST',
@@ -57,7 +67,8 @@ function setupForm(formId, endpoint) {
         if (response.ok) {
             document.getElementById('add-entry-modal').classList.add('hidden');
             form.reset();
-            fetchDashboardData();
+            // A replica sync is a small delta, so it runs even when the change is also pushed
+            if (useReplica || !liveUpdates) refreshDashboard();
         } else {
             const err = await response.json();
             alert(`Error: ${err.error || 'Submission failed'}`);
@@ -65,73 +76,134 @@ function setupForm(formId, endpoint) {
     };
 }
 
-async function fetchDashboardData() {
-    try {
-        // Fetch Summary Stats
-        const summaryRes = await fetch('/api/stats/summary');
-        const summary = await summaryRes.json();
-
-        if (summaryRes.ok) {
-            document.getElementById('level-val').textContent = summary.level;
-            document.getElementById('total-xp-val').textContent = summary.xp_stats.total;
-            document.getElementById('today-xp-val').textContent = summary.xp_stats.today;
-
-            const progress = (summary.xp_stats.current_level_progress / summary.xp_stats.needed_for_next) * 100;
-            document.getElementById('xp-progress-bar').style.width = `${progress}%`;
-        } else if (summaryRes.status === 401) {
-            window.location.href = '/';
-        }
+function connectLiveUpdates() {
+    if (!window.EventSource) return;
+    const source = new EventSource('/api/events');
+    let connectedBefore = false;
 
-        // Fetch Skill Stats
-        const skillsRes = await fetch('/api/stats/skills');
-        const skills = await skillsRes.json();
+    source.onopen = () => {
+        liveUpdates = true;
+        // Catch up on anything written while the stream was down
+        if (connectedBefore) refreshDashboard();
+        connectedBefore = true;
+    };
+    // The browser reconnects by itself; until then (or if the server refused), refetch after submits
+    source.onerror = () => { liveUpdates = false; };
 
-        if (skillsRes.ok) {
-            updateSkillBar('Work', skills.Work || 0);
-            updateSkillBar('Study', skills.Study || 0);
-            updateSkillBar('Workout', skills.Workout || 0);
-            updateSkillBar('Cooking', skills.Cooking || 0);
-            updateSkillBar('Wasted Time', skills['Wasted Time'] || 0, true);
-        }
+    // Pushed sections render at once; the replica catches up behind them
+    const pushed = (render) => (e) => {
+        render(JSON.parse(e.data));
+        if (useReplica) refreshDashboard();
+    };
+    source.addEventListener('xp', pushed(data => {
+        renderSummary(data.summary);
+        renderSkills(data.skills);
+    }));
+    source.addEventListener('finance', pushed(renderFinance));
+    source.addEventListener('sleep_log', pushed(addSleepLog));
+    source.addEventListener('sleep_logs', pushed(renderSleepLogs));
+}
 
-        // Fetch Finance Stats
-        const financeRes = await fetch('/api/stats/finance');
-        const fin = await financeRes.json();
-        if (financeRes.ok) {
-            document.getElementById('finance-income-val').textContent = `$${fin.total_income}`;
-            document.getElementById('finance-expense-val').textContent = `$${fin.total_expense}`;
-            document.getElementById('finance-net-val').textContent = `$${fin.net}`;
-
-            const maxVal = Math.max(fin.total_income, fin.total_expense, 100);
-            document.getElementById('finance-income-bar').style.width = `${(fin.total_income / maxVal) * 100}%`;
-            document.getElementById('finance-expense-bar').style.width = `${(fin.total_expense / maxVal) * 100}%`;
+async function loadDashboard() {
+    useReplica = await Replica.open();
+    // Last visit's copy renders before any request returns, if it is this user's
+    if (useReplica && Replica.owner() && Replica.owner() === localStorage.getItem('lifeio-user')) {
+        renderDashboard(Replica.dashboard());
+        replicaShown = true;
+    }
+    refreshDashboard();
+}
+
+async function refreshDashboard() {
+    if (!useReplica) return fetchDashboardData();
+    try {
+        // Only rows changed since the last sync cross the network
+        if (await Replica.sync() || !replicaShown) {
+            renderDashboard(Replica.dashboard());
+            replicaShown = true;
         }
+    } catch (err) {
+        console.error('Error syncing dashboard data:', err);
+        fetchDashboardData();
+    }
+}
 
-        // Fetch Sleep Logs
-        const sleepRes = await fetch('/api/sleep');
-        const logs = await sleepRes.json();
-        if (sleepRes.ok) {
-            const container = document.getElementById('sleep-logs-container');
-            container.innerHTML = logs.slice(0, 5).map(log => `
-                <div class="flex justify-between items-center text-xs border-b border-slate-700 pb-1">
-                    <span>${new Date(log.sleep_time).toLocaleDateString()}</span>
-                    <span>${Math.round(log.duration_minutes / 60)}h</span>
-                    <span class="text-yellow-400">${'★'.repeat(log.quality)}</span>
-                </div>
-            `).join('') || '<p class="text-xs text-slate-500">No logs yet.</p>';
+function renderDashboard(data) {
+    renderSummary(data.summary);
+    renderSkills(data.skills);
+    renderFinance(data.finance);
+    renderSleepLogs(data.sleep_logs);
+}
+
+async function fetchDashboardData() {
+    try {
+        // One request: the server fans out the underlying queries concurrently
+        const res = await fetch('/api/dashboard');
+        if (res.status === 401) {
+            window.location.href = '/';
+            return;
         }
+        if (!res.ok) return;
 
+        renderDashboard(await res.json());
     } catch (err) {
         console.error('Error fetching dashboard data:', err);
     }
 }
 
+function renderSummary(summary) {
+    document.getElementById('level-val').textContent = summary.level;
+    document.getElementById('total-xp-val').textContent = summary.xp_stats.total;
+    document.getElementById('today-xp-val').textContent = summary.xp_stats.today;
+
+    const progress = (summary.xp_stats.current_level_progress / summary.xp_stats.needed_for_next) * 100;
+    document.getElementById('xp-progress-bar').style.width = `${progress}%`;
+}
+
+function renderSkills(skills) {
+    updateSkillBar('Work', skills.Work || 0);
+    updateSkillBar('Study', skills.Study || 0);
+    updateSkillBar('Workout', skills.Workout || 0);
+    updateSkillBar('Cooking', skills.Cooking || 0);
+    updateSkillBar('Wasted Time', skills['Wasted Time'] || 0, true);
+}
+
+function renderFinance(fin) {
+    document.getElementById('finance-income-val').textContent = `$${fin.total_income}`;
+    document.getElementById('finance-expense-val').textContent = `$${fin.total_expense}`;
+    document.getElementById('finance-net-val').textContent = `$${fin.net}`;
+
+    const maxVal = Math.max(fin.total_income, fin.total_expense, 100);
+    document.getElementById('finance-income-bar').style.width = `${(fin.total_income / maxVal) * 100}%`;
+    document.getElementById('finance-expense-bar').style.width = `${(fin.total_expense / maxVal) * 100}%`;
+}
+
+function addSleepLog(log) {
+    const logs = sleepLogs.filter(existing => existing.id !== log.id);
+    logs.push(log);
+    logs.sort((a, b) => new Date(b.sleep_time) - new Date(a.sleep_time));
+    renderSleepLogs(logs);
+}
+
+function renderSleepLogs(logs) {
+    sleepLogs = logs.slice(0, 5);
+    const container = document.getElementById('sleep-logs-container');
+    container.innerHTML = sleepLogs.map(log => `
+        <div class="flex justify-between items-center text-xs border-b border-slate-700 pb-1">
+            <span>${new Date(log.sleep_time).toLocaleDateString()}</span>
+            <span>${Math.round(log.duration_minutes / 60)}h</span>
+            <span class="text-yellow-400">${'★'.repeat(log.quality)}</span>
+        </div>
+    `).join('') || '<p class="text-xs text-slate-500">No logs yet.</p>';
+}
+
 function updateSkillBar(name, xp, isNegative = false) {
     const id = name.toLowerCase().replace(' ', '-');
     const bar = document.getElementById(`skill-bar-${id}`);
     const text = document.getElementById(`skill-text-${id}`);
 
-    if (bar && text) {
+    // Pushed updates carry every skill; only the ones that changed are touched
+    if (bar && text && text.textContent !== `${xp} XP`) {
         const progress = Math.min((Math.abs(xp) / 1000) * 100, 100);
         bar.style.width = `${progress}%`;
         text.textContent = `${xp} XP`;
@@ -0,0 +1,191 @@
+// Offline-first copy of the user's activities, sleep logs and finance rows in
+// IndexedDB, kept current through GET /api/sync. The dashboard renders from it
+// before any request returns; after that only changed rows cross the network.
+const Replica = (() => {
+    const TABLES = ['activities', 'sleep_logs', 'daily_finance'];
+    const supported = !!window.indexedDB;
+    let db = null;
+    let meta = {};
+    let rows = null;
+    let running = null;
+    let again = false;
+
+    function done(req) {
+        return new Promise((resolve, reject) => {
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+    }
+
+    function committed(tx) {
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = resolve;
+            tx.onerror = tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    async function open() {
+        if (!supported) return false;
+        if (db) return true;
+        try {
+            const req = indexedDB.open('lifeio', 1);
+            req.onupgradeneeded = () => {
+                TABLES.forEach(table => req.result.createObjectStore(table, { keyPath: 'id' }));
+                req.result.createObjectStore('meta');
+            };
+            db = await done(req);
+        } catch (err) {
+            // Private windows may refuse storage; the dashboard falls back to /api/dashboard
+            console.error('IndexedDB unavailable:', err);
+            return false;
+        }
+        // Every request is issued before the first await, while the transaction is active
+        const tx = db.transaction([...TABLES, 'meta'], 'readonly');
+        const reads = TABLES.map(table => done(tx.objectStore(table).getAll()));
+        const saved = done(tx.objectStore('meta').get('sync'));
+        rows = {};
+        (await Promise.all(reads)).forEach((stored, i) => {
+            rows[TABLES[i]] = new Map(stored.map(row => [row.id, row]));
+        });
+        meta = (await saved) || {};
+        return true;
+    }
+
+    function owner() {
+        return meta.user_id;
+    }
+
+    function decode(body) {
+        // ?shape=columns sends the keys once per table
+        if (Array.isArray(body)) return body;
+        return body.rows.map(values => Object.fromEntries(body.columns.map((c, i) => [c, values[i]])));
+    }
+
+    async function apply(body) {
+        const tx = db.transaction([...TABLES, 'meta'], 'readwrite');
+        const wrote = committed(tx);
+        const reset = body.reset || body.user_id !== meta.user_id;
+        let changed = reset;
+        for (const table of TABLES) {
+            const store = tx.objectStore(table);
+            if (reset) {
+                store.clear();
+                rows[table].clear();
+            }
+            // Deletions first: a row deleted and written again is in both lists
+            for (const id of body.deleted[table] || []) {
+                if (rows[table].delete(id)) changed = true;
+                store.delete(id);
+            }
+            for (const row of decode(body.changes[table])) {
+                const old = rows[table].get(row.id);
+                if (!old || old.updated_at !== row.updated_at) changed = true;
+                rows[table].set(row.id, row);
+                store.put(row);
+            }
+        }
+        meta = { user_id: body.user_id, cursor: body.cursor };
+        tx.objectStore('meta').put(meta, 'sync');
+        await wrote;
+        return changed;
+    }
+
+    async function pull() {
+        let changed = false;
+        while (true) {
+            const query = meta.cursor ? `since=${encodeURIComponent(meta.cursor)}&` : '';
+            const res = await fetch(`/api/sync?${query}shape=columns`);
+            if (res.status === 401) {
+                window.location.href = '/';
+                return false;
+            }
+            if (!res.ok) throw new Error(`sync failed: ${res.status}`);
+            const body = await res.json();
+            changed = (await apply(body)) || changed;
+            if (!body.more) return changed;
+        }
+    }
+
+    // Catches up with the server; resolves to true when the replica changed.
+    // Calls made while a sync runs are folded into one more round after it.
+    async function sync() {
+        if (running) {
+            again = true;
+            return running;
+        }
+        running = (async () => {
+            let changed = false;
+            try {
+                do {
+                    again = false;
+                    changed = (await pull()) || changed;
+                } while (again);
+            } finally {
+                running = null;
+            }
+            return changed;
+        })();
+        return running;
+    }
+
+    function round2(value) {
+        return Math.round(value * 100) / 100;
+    }
+
+    function utcDay(value) {
+        return new Date(value).toISOString().slice(0, 10);
+    }
+
+    // The /api/dashboard body, computed from the replica the way the server does
+    function dashboard() {
+        const today = new Date().toISOString().slice(0, 10);
+        const monthStart = `${today.slice(0, 8)}01`;
+        let total = 0, monthly = 0, todayXp = 0;
+        const skills = {};
+        for (const a of rows.activities.values()) {
+            const xp = Number(a.xp_earned) || 0;
+            const day = utcDay(a.start_time);
+            total += xp;
+            if (day >= monthStart) monthly += xp;
+            if (day === today) todayXp += xp;
+            skills[a.category] = (skills[a.category] || 0) + xp;
+        }
+        Object.keys(skills).forEach(name => { skills[name] = round2(skills[name]); });
+
+        // Whole cents, like the server's finance index
+        const from = new Date(Date.now() - 30 * 86400000).toISOString().slice(0, 10);
+        let income = 0, expense = 0;
+        for (const f of rows.daily_finance.values()) {
+            if (f.date < from || f.date > today) continue;
+            income += Math.round(Number(f.income || 0) * 100);
+            expense += Math.round(Number(f.expense || 0) * 100);
+        }
+
+        const sleepLogs = [...rows.sleep_logs.values()]
+            .sort((a, b) => new Date(b.sleep_time) - new Date(a.sleep_time))
+            .slice(0, 5);
+
+        return {
+            summary: {
+                level: total < 0 ? 0 : Math.floor(total / 500),
+                xp_stats: {
+                    total: round2(total),
+                    current_level_progress: round2(((total % 500) + 500) % 500),
+                    needed_for_next: 500,
+                    monthly: round2(monthly),
+                    today: round2(todayXp)
+                }
+            },
+            skills,
+            finance: {
+                period: 'Last 30 days',
+                total_income: income / 100,
+                total_expense: expense / 100,
+                net: (income - expense) / 100
+            },
+            sleep_logs: sleepLogs
+        };
+    }
+
+    return { supported, open, owner, sync, dashboard };
+})();
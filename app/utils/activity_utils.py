@@ -1,9 +1,11 @@
+from bisect import bisect_left, bisect_right
 from datetime import datetime, time, timedelta
+import dateutil.parser
 import pytz
+from app.utils.timeseries import resolve_timezone, DEFAULT_TIMEZONE
 
-def get_midnight_of_day(dt):
-    """Returns the midnight (end of day) for a given datetime."""
-    return datetime.combine(dt.date(), time.max).replace(tzinfo=dt.tzinfo)
+# Longest span one submission may cover before it is split into days
+MAX_ACTIVITY_DAYS = 31
 
 def calculate_xp(duration_minutes, multiplier):
     """
@@ -12,25 +14,130 @@ def calculate_xp(duration_minutes, multiplier):
     """
     return float(duration_minutes) * float(multiplier)
 
-def truncate_to_midnight(start_time, end_time):
-    """If end_time cross midnight, truncate it to midnight of the start day."""
-    midnight = get_midnight_of_day(start_time)
-    if end_time > midnight:
-        return midnight
-    return end_time
-
-def check_overlap(supabase, user_id, start_time, end_time):
-    """
-    Checks for overlapping activities and returns them.
-    Logic: (StartA < EndB) AND (EndA > StartB)
-    """
-    # If end_time is None, we assume it's "now" or "ongoing"
-    # But for life tracking, we'll usually provide an end time or auto-stop.
-    query = supabase.table("activities") \
-        .select("*") \
-        .eq("user_id", user_id) \
-        .lt("start_time", end_time.isoformat()) \
-        .gt("end_time", start_time.isoformat())
-    
-    result = query.execute()
-    return result.data
+def localize(dt, tz):
+    """Reads a naive datetime as wall-clock time in tz; aware ones are returned as is."""
+    if dt.tzinfo is not None:
+        return dt
+    return tz.localize(dt) if hasattr(tz, "localize") else dt.replace(tzinfo=tz)
+
+def local_midnight(day, tz):
+    """The instant `day` starts in tz."""
+    midnight = datetime.combine(day, time.min)
+    if hasattr(tz, "localize"):
+        return tz.normalize(tz.localize(midnight))
+    return midnight.replace(tzinfo=tz)
+
+def parse_activity_times(start_time_str, end_time_str, tz_name=None):
+    """
+    Aware (start, end or None, tz) for a submitted activity. Midnight is
+    taken in tz_name when given, else in the timestamps' own offset; naive
+    timestamps are read in that zone (LIFEIO_TIMEZONE if there is none).
+    """
+    try:
+        start_time = dateutil.parser.isoparse(start_time_str)
+        end_time = dateutil.parser.isoparse(end_time_str) if end_time_str else None
+    except (ValueError, TypeError, OverflowError):
+        raise ValueError("Invalid date format")
+    if tz_name:
+        tz = resolve_timezone(tz_name)
+    elif start_time.tzinfo is not None:
+        tz = start_time.tzinfo
+    else:
+        tz = resolve_timezone(DEFAULT_TIMEZONE)
+    return localize(start_time, tz), localize(end_time, tz) if end_time else None, tz
+
+def split_at_midnight(start_time, end_time, tz):
+    """[start_time, end_time) as consecutive (start, end) pieces, cut at each local midnight in tz."""
+    segments = []
+    day = start_time.astimezone(tz).date()
+    while True:
+        day += timedelta(days=1)
+        midnight = local_midnight(day, tz)
+        if end_time <= midnight:
+            segments.append((start_time, end_time))
+            return segments
+        segments.append((start_time, midnight))
+        start_time = midnight
+
+def activity_segments(start_time, end_time, tz):
+    """
+    The per-day activities a submission is stored as. Without an end time
+    the activity auto-stops at the next local midnight.
+    """
+    if end_time is None:
+        end_time = local_midnight(start_time.astimezone(tz).date() + timedelta(days=1), tz)
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time")
+    if end_time - start_time > timedelta(days=MAX_ACTIVITY_DAYS):
+        raise ValueError(f"An activity may span at most {MAX_ACTIVITY_DAYS} days")
+    return split_at_midnight(start_time, end_time, tz)
+
+# Multipliers used when an activity references a category the user doesn't have yet
+DEFAULT_MULTIPLIERS = {
+    "Work": 1.2,
+    "Study": 1.1,
+    "Workout": 1.3,
+    "Cooking": 1.0,
+    "Wasted Time": -1.0
+}
+
+class IntervalSet:
+    """
+    Non-overlapping [start, end) intervals kept sorted by start.
+    Because intervals never overlap, ends are sorted too, so the intervals
+    overlapping a range are one contiguous slice found with two bisects.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def _overlap_slice(self, start, end):
+        # first interval ending after `start` .. last interval starting before `end`
+        return bisect_right(self.ends, start), bisect_left(self.starts, end)
+
+    def overlapping(self, start, end):
+        lo, hi = self._overlap_slice(start, end)
+        return self.items[lo:hi]
+
+    def at(self, point):
+        """The item whose interval contains `point`, or None."""
+        i = bisect_right(self.starts, point) - 1
+        if i >= 0 and self.ends[i] > point:
+            return self.items[i]
+        return None
+
+    def gaps(self, start, end):
+        """The (gap_start, gap_end) pieces of [start, end) no interval covers."""
+        gaps = []
+        cursor = start
+        lo, hi = self._overlap_slice(start, end)
+        for i in range(lo, hi):
+            if self.starts[i] > cursor:
+                gaps.append((cursor, self.starts[i]))
+            cursor = max(cursor, self.ends[i])
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def discard(self, start):
+        """Removes the interval starting at `start`; returns its item, or None if there is none."""
+        i = bisect_left(self.starts, start)
+        if i == len(self.starts) or self.starts[i] != start:
+            return None
+        del self.starts[i]
+        del self.ends[i]
+        return self.items.pop(i)
+
+    def add(self, start, end, item):
+        """Inserts the interval, evicting (and returning) any it overlaps: newer overrides."""
+        lo, hi = self._overlap_slice(start, end)
+        displaced = self.items[lo:hi]
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+        self.items[lo:hi] = [item]
+        return displaced
@@ -0,0 +1,128 @@
+"""
+Fingerprinted, precompressed static assets. `python -m app.utils.assets`
+copies every file under app/static into static/dist with a content hash in
+its name, writes brotli and gzip variants of the compressible ones and
+records the mapping in dist/manifest.json. When the manifest exists,
+url_for('static', filename=...) resolves to the hashed copy, which is served
+with a one-year immutable Cache-Control in the best encoding the browser
+accepts, so repeat page loads fetch no assets at all. Without a build (local
+development) static files are served as before.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+
+from flask import current_app, request, send_from_directory
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+DIST = "dist"
+MANIFEST = os.path.join(DIST, "manifest.json")
+ONE_YEAR = 365 * 24 * 3600
+
+# Preferred first; images and fonts are already compressed
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE = {".css", ".js", ".json", ".svg", ".html", ".txt", ".map"}
+MIN_COMPRESS_BYTES = 256
+
+
+def compress(encoding, data):
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so the build, reproducible
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build(static_dir=STATIC_DIR):
+    """
+    Returns the manifest. Earlier builds are left in place so pages rendered
+    by workers that have not restarted yet can still load their assets.
+    """
+    dist_dir = os.path.join(static_dir, DIST)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist_dir)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            filename = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(filename)
+            hashed = f"{DIST}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            write_file(os.path.join(static_dir, hashed), data)
+            if ext in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+                for encoding, suffix in ENCODINGS:
+                    compressed = compress(encoding, data)
+                    if compressed is not None and len(compressed) < len(data):
+                        write_file(os.path.join(static_dir, hashed + suffix), compressed)
+            manifest[filename] = hashed
+    write_file(os.path.join(static_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_dir):
+    try:
+        with open(os.path.join(static_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_assets(app):
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        return
+    # hashed name -> encodings with a precompressed variant on disk
+    variants = {
+        hashed: [
+            (encoding, suffix) for encoding, suffix in ENCODINGS
+            if os.path.exists(os.path.join(app.static_folder, hashed + suffix))
+        ]
+        for hashed in manifest.values()
+    }
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == "static" and values.get("filename") in manifest:
+            values["filename"] = manifest[values["filename"]]
+
+    def static(filename):
+        if filename not in variants:
+            return current_app.send_static_file(filename)
+        path, encoding = filename, None
+        for candidate, suffix in variants[filename]:
+            if request.accept_encodings[candidate]:
+                path, encoding = filename + suffix, candidate
+                break
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(app.static_folder, path, mimetype=mimetype, max_age=ONE_YEAR)
+        response.cache_control.immutable = True
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if variants[filename]:
+            response.vary.add("Accept-Encoding")
+        return response
+
+    app.view_functions["static"] = static
+
+
+if __name__ == "__main__":
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        print("brotli is not installed; writing gzip variants only", file=sys.stderr)
+    built = build(sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR)
+    for filename, hashed in sorted(built.items()):
+        print(f"{filename} -> {hashed}")
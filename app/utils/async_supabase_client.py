@@ -0,0 +1,83 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from app.utils.metrics import instrument_async_postgrest
+from app.utils.supabase_client import PoolExhausted, url, key
+
+
+class AsyncPostgrestPool:
+    """
+    PostgrestPool for the ASGI routes. Clients are still checked out one
+    request (or fan-out task) at a time because the Authorization header
+    lives on the session, but a checked-out client only costs a coroutine
+    while it waits on PostgREST, so the pool can be much larger.
+    """
+
+    def __init__(self, rest_url, api_key, size=100, checkout_timeout=10, http_timeout=30):
+        self.rest_url = rest_url
+        self.api_key = api_key
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.http_timeout = http_timeout
+        self._idle = []
+        self._created = 0
+        self._available = None
+
+    def _new_client(self):
+        from postgrest import AsyncPostgrestClient
+        from app.utils.resilience import async_resilient
+        return instrument_async_postgrest(async_resilient(AsyncPostgrestClient(
+            self.rest_url,
+            headers={"apiKey": self.api_key, "Authorization": f"Bearer {self.api_key}"},
+            timeout=self.http_timeout,
+        )))
+
+    async def acquire(self):
+        # Created lazily so it binds to the server's event loop
+        if self._available is None:
+            self._available = asyncio.Semaphore(self.size)
+        try:
+            await asyncio.wait_for(self._available.acquire(), self.checkout_timeout)
+        except asyncio.TimeoutError:
+            raise PoolExhausted(f"No Supabase connection available after {self.checkout_timeout}s")
+        if self._idle:
+            return self._idle.pop()
+        self._created += 1
+        return self._new_client()
+
+    def release(self, client):
+        client.auth(self.api_key)
+        self._idle.append(client)
+        self._available.release()
+
+
+pool = AsyncPostgrestPool(
+    f"{url}/rest/v1",
+    key,
+    size=int(os.getenv("SUPABASE_ASYNC_POOL_SIZE", 100)),
+    checkout_timeout=float(os.getenv("SUPABASE_POOL_TIMEOUT", 10)),
+    http_timeout=float(os.getenv("SUPABASE_HTTP_TIMEOUT", 30)),
+)
+
+_auth_client = None
+
+
+async def get_async_auth():
+    """Async GoTrue client (token fallback), created on first use."""
+    global _auth_client
+    if _auth_client is None:
+        from supabase import acreate_client
+        _auth_client = (await acreate_client(url, key)).auth
+    return _auth_client
+
+
+@asynccontextmanager
+async def async_pooled_client(token=None):
+    """A PostgREST client authorised as the caller, for one request or fan-out task."""
+    client = await pool.acquire()
+    try:
+        if token:
+            client.auth(token)
+        yield client
+    finally:
+        pool.release(client)
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, make_response
+import pytz
+from app.utils.timeseries import DEFAULT_TIMEZONE
+
+# Per-user data versions live in small files so every worker process on the
+# host sees a bump immediately (an in-process counter would let one worker
+# answer 304 for data another worker just changed).
+STATE_DIR = os.getenv("LIFEIO_STATE_DIR", os.path.join(tempfile.gettempdir(), "lifeio"))
+VERSION_DIR = os.path.join(STATE_DIR, "versions")
+
+
+def _version_path(user_id, scope=None):
+    key = f"{user_id}:{scope}" if scope else str(user_id)
+    return os.path.join(VERSION_DIR, hashlib.sha256(key.encode()).hexdigest())
+
+
+def get_version(user_id, scope=None):
+    """The user's overall data version, or that of one scope ("activities", "sleep", "finance")."""
+    try:
+        with open(_version_path(user_id, scope)) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def _write_version(path, version):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+
+
+def bump_version(user_id, scope=None):
+    """
+    Called by every write route once the write has committed. Bumps the
+    overall version and, if given, the scope's; returns the new version.
+    """
+    os.makedirs(VERSION_DIR, exist_ok=True)
+    version = f"{time.time_ns():x}.{os.getpid():x}"
+    if scope:
+        _write_version(_version_path(user_id, scope), version)
+    _write_version(_version_path(user_id), version)
+    return version
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+stats_cache = LRUCache(maxsize=int(os.getenv("STATS_CACHE_SIZE", 1024)))
+_MISSING = object()
+
+
+def memoize_for_user(user_id, name, compute, *key_parts):
+    """
+    Returns compute() cached under (user, data version, name, key_parts).
+    A write bumps the version, so stale entries are never read again and
+    simply age out of the LRU.
+    """
+    key = (str(user_id), get_version(user_id), name, key_parts)
+    value = stats_cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        stats_cache.set(key, value)
+    return value
+
+
+async def memoize_for_user_async(user_id, name, compute, *key_parts):
+    """memoize_for_user for coroutine functions; shares the same cache."""
+    key = (str(user_id), get_version(user_id), name, key_parts)
+    value = stats_cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = await compute()
+        stats_cache.set(key, value)
+    return value
+
+
+def make_etag(user_id, full_path, tz_name=None):
+    # The UTC date is part of the tag because "today"/"last 30 days" figures
+    # change at midnight without any write. Routes taking ?tz= roll over at
+    # that zone's midnight instead, so its date is added when it differs
+    version = get_version(user_id)
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+    if tz_name:
+        try:
+            local_today = now.astimezone(pytz.timezone(tz_name)).date().isoformat()
+        except pytz.UnknownTimeZoneError:
+            local_today = today  # the view answers 400
+        if local_today != today:
+            today = f"{today}.{local_today}"
+    resource = hashlib.sha256(full_path.encode()).hexdigest()[:12]
+    return f"{version}-{today}-{resource}"
+
+
+def etag_for(user_id):
+    return make_etag(user_id, request.full_path, request.args.get("tz", DEFAULT_TIMEZONE))
+
+
+def conditional_get(f):
+    """
+    Adds an ETag derived from the user's data version and answers 304 when
+    the client's copy is current, without running the view. Use below
+    @login_required.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        etag = etag_for(request.user.id)
+        # Weak comparison: compression (compression.py) weakens the tag it was sent with
+        if request.if_none_match.contains_weak(etag):
+            response = make_response("", 304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Always revalidate; the ETag makes that a cheap 304
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return decorated_function
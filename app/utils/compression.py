@@ -0,0 +1,82 @@
+"""
+Accept-Encoding negotiated compression of API responses. JSON, NDJSON and
+text bodies of at least COMPRESS_MIN_BYTES are sent as zstd, brotli or gzip,
+whichever the client accepts with the highest q (ties go to that order).
+zstd and brotli are used only when their modules are installed. Streamed
+bodies (exports, event streams) and static files (precompressed at build
+time, see assets.py) are left alone.
+"""
+import gzip
+import os
+
+from flask import request
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# Levels chosen for per-request work: most of the ratio at a few ms per MB
+LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+
+_codecs = None
+
+
+def codecs():
+    """encoding -> compress(bytes), in server preference order."""
+    global _codecs
+    if _codecs is None:
+        found = {}
+        try:
+            import zstandard
+            # A compressor is not thread-safe; making one per body is cheap next to the work
+            found["zstd"] = lambda data: zstandard.ZstdCompressor(level=LEVELS["zstd"]).compress(data)
+        except ImportError:
+            pass
+        try:
+            import brotli
+            found["br"] = lambda data: brotli.compress(data, quality=LEVELS["br"])
+        except ImportError:
+            pass
+        found["gzip"] = lambda data: gzip.compress(data, compresslevel=LEVELS["gzip"], mtime=0)
+        _codecs = found
+    return _codecs
+
+
+def negotiate(accept_encoding):
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding, Accept).best_match(list(codecs()))
+
+
+def compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_body(data, accept_encoding):
+    """Returns (body, encoding); encoding is None when the body is sent as is."""
+    if len(data) < COMPRESS_MIN_BYTES:
+        return data, None
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return data, None
+    return codecs()[encoding](data), encoding
+
+
+def init_compression(app):
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or not compressible(response.mimetype)
+                or "Content-Encoding" in response.headers or response.status_code in (204, 206, 304)):
+            return response
+        response.vary.add("Accept-Encoding")
+        body, encoding = compress_body(response.get_data(), request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        # The compressed bytes differ from the identity ones; conditional_get compares weakly
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,201 @@
+import os
+import threading
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+import numpy as np
+from app.utils.cache_utils import LRUCache, get_version
+
+GRANULARITIES = ("day", "week", "month", "year")
+MAX_BUCKETS = 3660
+
+
+def to_cents(value):
+    # Stored as DECIMAL(12, 2); integer cents keep the sums exact
+    return int(round(float(value or 0) * 100))
+
+
+def bucket_start(d, granularity):
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "year":
+        return d.replace(month=1, day=1)
+    return d
+
+
+def next_bucket(d, granularity):
+    if granularity == "week":
+        return d + timedelta(weeks=1)
+    if granularity == "month":
+        return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if granularity == "year":
+        return d.replace(year=d.year + 1)
+    return d + timedelta(days=1)
+
+
+def bucket_bounds(date_from, date_to, granularity):
+    """Inclusive (start, end) pairs covering [date_from, date_to], clipped at both ends."""
+    bounds = []
+    start = bucket_start(date_from, granularity)
+    while start <= date_to:
+        end = next_bucket(start, granularity)
+        bounds.append((max(start, date_from), min(end - timedelta(days=1), date_to)))
+        if len(bounds) > MAX_BUCKETS:
+            raise ValueError(f"Too many buckets; at most {MAX_BUCKETS} are allowed")
+        start = end
+    return bounds
+
+
+class FinanceIndex:
+    """
+    Cumulative income/expense sums over one user's daily_finance rows, keyed
+    by date ordinal. Any range total is two bisects and a subtraction.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.days = []      # sorted date ordinals
+        self.rows = {}      # ordinal -> (id, income cents, expense cents)
+        self.ids = {}       # id -> ordinal
+        self.lock = threading.Lock()
+        self._prefix = None
+
+    def upsert(self, row):
+        day = date.fromisoformat(str(row["date"])[:10]).toordinal()
+        if day not in self.rows:
+            insort(self.days, day)
+        self.rows[day] = (str(row["id"]), to_cents(row.get("income")), to_cents(row.get("expense")))
+        self.ids[str(row["id"])] = day
+        self._prefix = None
+
+    def remove(self, row_id):
+        day = self.ids.pop(str(row_id), None)
+        if day is None:
+            return
+        del self.rows[day]
+        del self.days[bisect_left(self.days, day)]
+        self._prefix = None
+
+    def load(self, rows):
+        for row in rows:
+            self.upsert(row)
+
+    def prefix(self):
+        # Rebuilt lazily after a write: one cumsum, then reads are O(log n)
+        if self._prefix is None:
+            days = np.array(self.days, dtype=np.int64)
+            income = np.fromiter((self.rows[d][1] for d in self.days), dtype=np.int64, count=len(self.days))
+            expense = np.fromiter((self.rows[d][2] for d in self.days), dtype=np.int64, count=len(self.days))
+            self._prefix = (
+                days,
+                np.concatenate(([0], np.cumsum(income))),
+                np.concatenate(([0], np.cumsum(expense)))
+            )
+        return self._prefix
+
+    def totals(self, starts, ends):
+        """Income/expense cents for each inclusive [start, end] ordinal pair, vectorized."""
+        days, income, expense = self.prefix()
+        lo = np.searchsorted(days, starts, side="left")
+        hi = np.searchsorted(days, ends, side="right")
+        return income[hi] - income[lo], expense[hi] - expense[lo]
+
+    def summary(self, date_from, date_to, granularity):
+        bounds = bucket_bounds(date_from, date_to, granularity)
+        starts = np.array([s.toordinal() for s, _ in bounds], dtype=np.int64)
+        ends = np.array([e.toordinal() for _, e in bounds], dtype=np.int64)
+        income, expense = self.totals(starts, ends)
+        total_income = int(income.sum())
+        total_expense = int(expense.sum())
+        return {
+            "total_income": total_income / 100,
+            "total_expense": total_expense / 100,
+            "net": (total_income - total_expense) / 100,
+            "series": [{
+                "start": s.isoformat(),
+                "end": e.isoformat(),
+                "income": int(i) / 100,
+                "expense": int(x) / 100,
+                "net": int(i - x) / 100
+            } for (s, e), i, x in zip(bounds, income, expense)]
+        }
+
+
+# Least recently used users' indexes are dropped and reloaded on their next read
+_indexes = LRUCache(maxsize=int(os.getenv("FINANCE_CACHE_SIZE", 256)))
+_registry_lock = threading.Lock()
+
+
+def get_finance_index(finance_repo, user_id):
+    """The user's index, loaded on first use or when another process has written since."""
+    version = get_version(user_id, "finance")
+    with _registry_lock:
+        index = _indexes.get(str(user_id))
+    if index is None or index.version != version:
+        index = FinanceIndex(version)
+        index.load(finance_repo.all(user_id, ["id", "date", "income", "expense"]))
+        with _registry_lock:
+            _indexes.set(str(user_id), index)
+    return index
+
+
+def finance_summary(finance_repo, user_id, date_from, date_to, granularity="day"):
+    index = get_finance_index(finance_repo, user_id)
+    with index.lock:
+        return index.summary(date_from, date_to, granularity)
+
+
+async def finance_summary_async(finance_repo, user_id, date_from, date_to, granularity="day"):
+    """finance_summary over an async repository (ASGI mode); shares the same indexes."""
+    version = get_version(user_id, "finance")
+    with _registry_lock:
+        index = _indexes.get(str(user_id))
+    if index is None or index.version != version:
+        index = FinanceIndex(version)
+        index.load(await finance_repo.all(user_id, ["id", "date", "income", "expense"]))
+        with _registry_lock:
+            _indexes.set(str(user_id), index)
+    with index.lock:
+        return index.summary(date_from, date_to, granularity)
+
+
+def _apply(user_id, prev_version, new_version, change):
+    # Same rule as the sleep aggregates: only patch an index that saw every earlier write
+    with _registry_lock:
+        index = _indexes.get(str(user_id))
+        if index is None:
+            return
+        with index.lock:
+            if index.version == prev_version:
+                change(index)
+                index.version = new_version
+            else:
+                _indexes.pop(str(user_id))
+
+
+def record_finance_row(user_id, row, prev_version, new_version):
+    _apply(user_id, prev_version, new_version, lambda index: index.upsert(row))
+
+
+def forget_finance_row(user_id, row_id, prev_version, new_version):
+    _apply(user_id, prev_version, new_version, lambda index: index.remove(row_id))
+
+
+def parse_finance_range(args, today, default_days=30):
+    """
+    Reads ?from=/?to= (YYYY-MM-DD) and ?granularity=. Defaults to the last
+    `default_days` days, matching the original summary.
+    """
+    granularity = args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    try:
+        date_to = datetime.strptime(args["to"], "%Y-%m-%d").date() if args.get("to") else today
+        date_from = datetime.strptime(args["from"], "%Y-%m-%d").date() if args.get("from") \
+            else today - timedelta(days=default_days)
+    except ValueError:
+        raise ValueError("Invalid date format, use YYYY-MM-DD")
+    if date_from > date_to:
+        raise ValueError("from must not be after to")
+    return date_from, date_to, granularity
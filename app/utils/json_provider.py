@@ -0,0 +1,62 @@
+"""
+orjson-backed JSON for the Flask app. The async routes encode through
+app.json as well, so both serving modes stay byte-for-byte identical.
+Output matches Flask's default provider (sorted keys, compact, trailing
+newline) except that dates are ISO 8601 instead of HTTP dates and non-ASCII
+text is sent as UTF-8 rather than \\u escapes. JSON_PROVIDER=stdlib, or orjson
+not being installed, keeps Flask's encoder.
+"""
+import decimal
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson").lower()
+
+
+def _default(o):
+    # Same as Flask's provider: exact decimal text rather than a float
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+        self.orjson = orjson
+
+    def options(self, indent=False):
+        orjson = self.orjson
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def encode(self, obj, indent=False):
+        return self.orjson.dumps(obj, default=_default, option=self.options(indent))
+
+    def dumps(self, obj, **kwargs):
+        return self.encode(obj, indent=bool(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        return self.orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def init_json(app):
+    if JSON_PROVIDER != "orjson":
+        return
+    try:
+        app.json = OrjsonProvider(app)
+    except ImportError:
+        app.logger.warning("JSON_PROVIDER=orjson but orjson is not installed; using the stdlib encoder")
@@ -0,0 +1,284 @@
+"""
+Request and upstream-call metrics. Route latency histograms, plus PostgREST
+and GoTrue calls timed per table/operation and attributed to the route that
+made them. Exposed in Prometheus text format at /api/metrics. Values are per
+worker process, like any in-process Prometheus client.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+
+# Upper bounds in seconds (Prometheus `le`); +Inf is implicit
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Opt-in Server-Timing header so browser devtools show where a request spent its time
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+OPERATIONS = {"GET": "select", "HEAD": "select", "PATCH": "update", "DELETE": "delete"}
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class RequestTimings:
+    """Time spent by one request, per component (auth, postgrest, gotrue)."""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans = {}  # name -> [calls, seconds]
+        self.lock = threading.Lock()  # dashboard fan-out records from several threads
+
+    def add(self, name, seconds):
+        with self.lock:
+            span = self.spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def server_timing(self):
+        total = time.perf_counter() - self.started
+        parts = [
+            f'{name};dur={seconds * 1000:.1f};desc="{name} ({calls} call{"s" if calls != 1 else ""})"'
+            for name, (calls, seconds) in sorted(self.spans.items())
+        ]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = ContextVar("lifeio_request_timings", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}    # (method, route, status) -> Histogram
+        self.upstream = {}    # (service, table, operation) -> Histogram
+        self.errors = {}      # (service, table, operation) -> failed calls
+        self.attributed = {}  # (route, service, table, operation) -> [calls, seconds]
+        self.events = {}      # (route, event) -> count, from resilience.py
+
+    def observe_request(self, method, route, status, seconds):
+        with self.lock:
+            self.requests.setdefault((method, route, str(status)), Histogram()).observe(seconds)
+
+    def observe_upstream(self, route, service, table, operation, seconds, failed=False):
+        key = (service, table, operation)
+        with self.lock:
+            self.upstream.setdefault(key, Histogram()).observe(seconds)
+            if failed:
+                self.errors[key] = self.errors.get(key, 0) + 1
+            total = self.attributed.setdefault((route, *key), [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+
+    def observe_event(self, route, event):
+        with self.lock:
+            self.events[(route, event)] = self.events.get((route, event), 0) + 1
+
+    def render(self):
+        with self.lock:
+            requests = {k: (list(h.counts), h.sum, h.count) for k, h in self.requests.items()}
+            upstream = {k: (list(h.counts), h.sum, h.count) for k, h in self.upstream.items()}
+            errors = dict(self.errors)
+            attributed = {k: tuple(v) for k, v in self.attributed.items()}
+            events = dict(self.events)
+
+        lines = []
+        render_histogram(lines, "lifeio_request_duration_seconds",
+                         "Request latency by route", ("method", "route", "status"), requests)
+        render_histogram(lines, "lifeio_upstream_duration_seconds",
+                         "Upstream call latency by table and operation", ("service", "table", "operation"), upstream)
+        lines += ["# HELP lifeio_upstream_errors_total Upstream calls that failed or returned an error status",
+                  "# TYPE lifeio_upstream_errors_total counter"]
+        for key, count in sorted(errors.items()):
+            lines.append(f"lifeio_upstream_errors_total{{{labels(('service', 'table', 'operation'), key)}}} {count}")
+        route_labels = ("route", "service", "table", "operation")
+        lines += ["# HELP lifeio_route_upstream_calls_total Upstream calls made on behalf of each route",
+                  "# TYPE lifeio_route_upstream_calls_total counter"]
+        for key, (calls, _) in sorted(attributed.items()):
+            lines.append(f"lifeio_route_upstream_calls_total{{{labels(route_labels, key)}}} {calls}")
+        lines += ["# HELP lifeio_route_upstream_seconds_total Upstream time spent on behalf of each route",
+                  "# TYPE lifeio_route_upstream_seconds_total counter"]
+        for key, (_, seconds) in sorted(attributed.items()):
+            lines.append(f"lifeio_route_upstream_seconds_total{{{labels(route_labels, key)}}} {seconds:.6f}")
+        lines += ["# HELP lifeio_upstream_events_total Coalesced reads, retries, hedges and circuit breaker activity",
+                  "# TYPE lifeio_upstream_events_total counter"]
+        for key, count in sorted(events.items()):
+            lines.append(f"lifeio_upstream_events_total{{{labels(('route', 'event'), key)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(names, values):
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+def render_histogram(lines, name, help_text, label_names, series):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, (counts, total, count) in sorted(series.items()):
+        base = labels(label_names, key)
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{base}}} {total:.6f}")
+        lines.append(f"{name}_count{{{base}}} {count}")
+
+
+registry = MetricsRegistry()
+
+
+def current_route():
+    timings = _current.get()
+    return timings.route if timings is not None else "background"
+
+
+def record_upstream(service, table, operation, seconds, failed=False):
+    registry.observe_upstream(current_route(), service, table, operation, seconds, failed)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(service, seconds)
+
+
+def record_event(event):
+    registry.observe_event(current_route(), event)
+
+
+@contextmanager
+def timed_upstream(service, table, operation):
+    """Times an upstream call made through a client we do not instrument (e.g. GoTrue)."""
+    started = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        record_upstream(service, table, operation, time.perf_counter() - started, failed)
+
+
+@contextmanager
+def timed_span(name):
+    """Adds local work (e.g. token verification) to the request's Server-Timing breakdown."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, time.perf_counter() - started)
+
+
+def classify_postgrest(http_request):
+    """(table, operation) for a PostgREST request; RPCs report the function name as table."""
+    path = http_request.url.path.partition("/rest/v1/")[2]
+    if path.startswith("rpc/"):
+        return path[4:], "rpc"
+    table = path.split("/")[0] or "unknown"
+    if http_request.method == "POST":
+        prefer = http_request.headers.get("prefer", "")
+        return table, "upsert" if "resolution=" in prefer else "insert"
+    return table, OPERATIONS.get(http_request.method, http_request.method.lower())
+
+
+def _start_upstream(http_request):
+    http_request.extensions["lifeio_started"] = time.perf_counter()
+
+
+def _record_postgrest(http_response):
+    http_request = http_response.request
+    started = http_request.extensions.get("lifeio_started")
+    if started is None:
+        return
+    if http_response.extensions.get("lifeio_coalesced"):
+        # Answered by another request's identical call: waiting time, but no call of its own
+        record_event("coalesced")
+        timed = _current.get()
+        if timed is not None:
+            timed.add("postgrest", time.perf_counter() - started)
+        return
+    table, operation = classify_postgrest(http_request)
+    record_upstream("postgrest", table, operation, time.perf_counter() - started,
+                    failed=http_response.status_code >= 400)
+
+
+def _finish_upstream(http_response):
+    # Read the body here so the timing covers the whole transfer
+    http_response.read()
+    _record_postgrest(http_response)
+
+
+async def _start_upstream_async(http_request):
+    _start_upstream(http_request)
+
+
+async def _finish_upstream_async(http_response):
+    await http_response.aread()
+    _record_postgrest(http_response)
+
+
+def instrument_postgrest(client):
+    """Hooks a PostgREST client's HTTP session so every call is timed."""
+    client.session.event_hooks = {"request": [_start_upstream], "response": [_finish_upstream]}
+    return client
+
+
+def instrument_async_postgrest(client):
+    client.session.event_hooks = {"request": [_start_upstream_async], "response": [_finish_upstream_async]}
+    return client
+
+
+def begin_request(route):
+    """Starts timing a request; returns the token for end_request()."""
+    return _current.set(RequestTimings(route))
+
+
+def finish_request(method, status):
+    """Records the current request's latency; returns its Server-Timing value if enabled."""
+    timings = _current.get()
+    if timings is None:
+        return None
+    registry.observe_request(method, timings.route, status, time.perf_counter() - timings.started)
+    return timings.server_timing() if SERVER_TIMING else None
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def init_metrics(app):
+    @app.before_request
+    def start_request_timer():
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        g.metrics_token = begin_request(route)
+
+    @app.after_request
+    def record_request(response):
+        # Streamed bodies (exports) are measured up to the first byte
+        server_timing = finish_request(request.method, response.status_code)
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing
+        return response
+
+    @app.teardown_request
+    def clear_request_timer(exc=None):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            end_request(token)
@@ -1,6 +1,9 @@
 from functools import wraps
 from flask import request, jsonify, session, current_app
 from app.utils.supabase_client import get_supabase_client
+from app.utils.token_utils import verify_token
+from app.utils.metrics import timed_span
+from app.utils.write_behind import note_token
 import os
 
 def get_token():
@@ -19,16 +22,19 @@ def login_required(f):
         
         supabase = get_supabase_client()
         try:
-            # Set the session token so RLS works
-            supabase.postgrest.auth(token)
+            # Bind the token to this request's pooled client so RLS works
+            supabase.set_auth(token)
             
-            # Validate token with Supabase
-            user_response = supabase.auth.get_user(token)
-            if not user_response.user:
+            # Validate token locally (cached); GoTrue is only a fallback
+            with timed_span("auth"):
+                user = verify_token(token, remote_client=supabase)
+            if not user:
                 return jsonify({"error": "Invalid token"}), 401
             
             # Attach user to request context for easy access
-            request.user = user_response.user
+            request.user = user
+            # Queued writes are flushed with the user's latest token
+            note_token(user.id, token)
         except Exception as e:
             return jsonify({"error": str(e)}), 401
             
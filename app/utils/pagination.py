@@ -0,0 +1,171 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+SHAPES = ("rows", "columns")
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for the last row of a page: base64 of [sort value, id]."""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(sort value, id) of a cursor from encode_cursor(); ValueError unless an ISO date/timestamp and a UUID."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        # Both end up inside a PostgREST filter string, so nothing else gets through
+        datetime.fromisoformat(sort_value.replace("Z", "+00:00"))
+        row_id = str(uuid.UUID(row_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
+
+
+def parse_bound(args, name):
+    """?from= or ?to= as given, once it parses as an ISO date/timestamp."""
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or timestamp")
+    return value
+
+
+def parse_list_params(args, sort_column, allowed_fields):
+    """
+    Reads ?limit=, ?cursor=, ?fields=, ?from=, ?to= (inclusive bounds on
+    the sort column) and ?shape=. Raises ValueError with a client-facing message.
+    """
+    try:
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+
+    fields = "*"
+    if args.get("fields"):
+        requested = [f.strip() for f in args["fields"].split(",") if f.strip()]
+        unknown = [f for f in requested if f not in allowed_fields]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # The cursor is built from (sort column, id), so always fetch them
+        for required in ("id", sort_column):
+            if required not in requested:
+                requested.append(required)
+        fields = ",".join(requested)
+
+    shape = args.get("shape", "rows")
+    if shape not in SHAPES:
+        raise ValueError(f"shape must be one of: {', '.join(SHAPES)}")
+
+    return {
+        "limit": limit,
+        "cursor": cursor,
+        "fields": fields,
+        "from": parse_bound(args, "from"),
+        "to": parse_bound(args, "to"),
+        "shape": shape,
+    }
+
+
+def keyset_query(supabase, table, user_id, sort_column, params):
+    """Newest-first page of `table` after the cursor, ordered by (sort_column, id)."""
+    query = supabase.table(table) \
+        .select(params["fields"]) \
+        .eq("user_id", user_id)
+
+    if params["from"]:
+        query = query.gte(sort_column, params["from"])
+    if params["to"]:
+        query = query.lte(sort_column, params["to"])
+    if params["cursor"]:
+        value, row_id = params["cursor"]
+        query = query.or_(
+            f'{sort_column}.lt."{value}",and({sort_column}.eq."{value}",id.lt."{row_id}")'
+        )
+
+    # Fetch one extra row to know whether another page exists
+    return query \
+        .order(sort_column, desc=True) \
+        .order("id", desc=True) \
+        .limit(params["limit"] + 1)
+
+
+def after_position(query, column, after, tiebreak="id"):
+    """
+    Oldest-first keyset filter for changed_since()/deleted_since(): rows
+    after (value, id), or from `value` on when the id is None.
+    """
+    if after is None:
+        return query
+    value, row_id = after
+    # The plain lower bound is what the (user_id, column, id) index seeks on; the OR alone is only a filter
+    query = query.gte(column, value)
+    if row_id is None:
+        return query
+    return query.or_(f'{column}.gt."{value}",{tiebreak}.gt."{row_id}"')
+
+
+def paginate(rows, sort_column, params, base_url, args):
+    """
+    Trims the look-ahead row and returns (rows, headers). The next cursor is
+    sent in X-Next-Cursor and a Link header so the body stays a plain list.
+    """
+    headers = {}
+    if len(rows) > params["limit"]:
+        rows = rows[:params["limit"]]
+        last = rows[-1]
+        cursor = encode_cursor(str(last[sort_column]), str(last["id"]))
+        next_args = {k: v for k, v in args.items() if k != "cursor"}
+        next_args["cursor"] = cursor
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{base_url}?{urlencode(next_args)}>; rel="next"'
+    return rows, headers
+
+
+def shape_rows(rows, params):
+    """
+    The list body for ?shape=: a plain list of objects, or with "columns" the
+    keys once plus one array per row, which drops the repeated key names from
+    long histories ({"columns": [...], "rows": [[...], ...]}).
+    """
+    if params["shape"] != "columns":
+        return rows
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return {"columns": columns, "rows": [[row.get(c) for c in columns] for row in rows]}
+
+
+def iter_pages(build_query, page_size=1000):
+    """
+    Yields successive range() windows of a query until a short page comes back.
+    `build_query` must return a fresh, deterministically ordered query each call
+    (PostgREST caps rows per response, so large reads have to be windowed).
+    """
+    offset = 0
+    while True:
+        res = build_query().range(offset, offset + page_size - 1).execute()
+        rows = res.data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        offset += page_size
+
+
+def fetch_all(build_query, page_size=1000):
+    rows = []
+    for page in iter_pages(build_query, page_size):
+        rows.extend(page)
+    return rows
@@ -0,0 +1,194 @@
+"""
+Server-sent events for open dashboards. Write routes publish the dashboard
+sections a committed write changed (new XP totals and skills, the finance
+summary, the new sleep row) to a shared event log under LIFEIO_STATE_DIR;
+every worker process tails that log and forwards each event to the streams
+its users hold open, so tabs and devices served by different workers stay
+in sync.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from app.utils.cache_utils import STATE_DIR
+from app.utils.stats_utils import build_summary, cached_xp_totals, last_30_days_finance, cached_recent_sleep
+
+EVENT_DIR = os.path.join(STATE_DIR, "events")
+EVENT_LOG = os.path.join(EVENT_DIR, "log.ndjson")
+LIVE_DIR = os.path.join(EVENT_DIR, "live")
+MAX_LOG_BYTES = 1024 * 1024
+
+POLL_INTERVAL = float(os.getenv("REALTIME_POLL_INTERVAL", 0.2))
+HEARTBEAT_SECONDS = 15
+MAX_STREAM_SECONDS = 300
+RETRY_MS = 3000
+# A user counts as listening while some worker refreshed their marker this recently
+LIVE_TTL = 30
+
+log = logging.getLogger(__name__)
+
+
+def _live_path(user_id):
+    return os.path.join(LIVE_DIR, hashlib.sha256(str(user_id).encode()).hexdigest())
+
+
+def listening(user_id):
+    """True if any worker holds an event stream for the user."""
+    try:
+        return os.stat(_live_path(user_id)).st_mtime > time.time() - LIVE_TTL
+    except FileNotFoundError:
+        return False
+
+
+def publish(user_id, event, data):
+    os.makedirs(EVENT_DIR, exist_ok=True)
+    record = {"id": f"{time.time_ns():x}", "user_id": str(user_id), "event": event, "data": data}
+    line = (json.dumps(record, separators=(",", ":"), default=str) + "\n").encode()
+    fd = os.open(EVENT_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        # One write() per event, so concurrent publishers never interleave lines
+        os.write(fd, line)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size > MAX_LOG_BYTES:
+        _rotate()
+
+
+def _rotate():
+    with open(os.path.join(EVENT_DIR, "rotate.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another publisher may have rotated while we waited
+        if os.path.getsize(EVENT_LOG) > MAX_LOG_BYTES:
+            os.replace(EVENT_LOG, EVENT_LOG + ".1")
+
+
+def publish_changes(repos, user_id, scope, row=None):
+    """
+    Called by write routes once a write to `scope` has committed (and its
+    version was bumped). Recomputes only the dashboard section that changed,
+    and only if the user has a dashboard open somewhere.
+    """
+    if not listening(user_id):
+        return
+    try:
+        if scope == "activities":
+            xp = cached_xp_totals(repos, user_id)
+            publish(user_id, "xp", {"summary": build_summary(xp), "skills": xp["skills"]})
+        elif scope == "finance":
+            publish(user_id, "finance", last_30_days_finance(repos, user_id))
+        elif scope == "sleep" and row is not None:
+            publish(user_id, "sleep_log", row)
+        elif scope == "sleep":
+            publish(user_id, "sleep_logs", cached_recent_sleep(repos, user_id))
+    except Exception:
+        # The write itself succeeded; open dashboards resync when they reconnect
+        log.exception("realtime: could not publish %s change", scope)
+
+
+def stream_deadline(user):
+    """
+    Streams end when the access token expires, and at least every few
+    minutes, so the browser reconnects and its token is checked again.
+    """
+    deadline = time.time() + MAX_STREAM_SECONDS
+    exp = getattr(user, "claims", {}).get("exp")
+    return min(deadline, exp) if exp else deadline
+
+
+def sse_frame(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, separators=(',', ':'), default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+class Hub:
+    """Tails the event log and hands each user's events to their open streams."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = {}  # user_id -> set of deliver(frame) callbacks
+        self.thread = None
+
+    def subscribe(self, user_id, deliver):
+        user_id = str(user_id)
+        with self.lock:
+            self.streams.setdefault(user_id, set()).add(deliver)
+            if self.thread is None:
+                # Opened here so events published right after this call are not missed
+                log_file = self._open_log(at_end=True)
+                self.thread = threading.Thread(target=self.run, args=(log_file,), name="realtime-hub", daemon=True)
+                self.thread.start()
+        self._mark_live([user_id])
+
+    def unsubscribe(self, user_id, deliver):
+        user_id = str(user_id)
+        with self.lock:
+            streams = self.streams.get(user_id)
+            if streams is not None:
+                streams.discard(deliver)
+                if not streams:
+                    del self.streams[user_id]
+
+    def _mark_live(self, user_ids):
+        os.makedirs(LIVE_DIR, exist_ok=True)
+        for user_id in user_ids:
+            with open(_live_path(user_id), "a"):
+                pass
+            os.utime(_live_path(user_id))
+
+    def _open_log(self, at_end):
+        os.makedirs(EVENT_DIR, exist_ok=True)
+        f = os.fdopen(os.open(EVENT_LOG, os.O_RDONLY | os.O_CREAT, 0o600), "rb")
+        if at_end:
+            f.seek(0, os.SEEK_END)
+        return f
+
+    def run(self, f):
+        buffered = b""
+        marked_at = time.monotonic()
+        while True:
+            time.sleep(POLL_INTERVAL)
+            try:
+                chunk = f.read()
+                try:
+                    rotated = os.stat(EVENT_LOG).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    rotated = True
+                if rotated:
+                    # Drain the old file first; the new one is read from its start
+                    chunk += f.read()
+                    f.close()
+                    f = self._open_log(at_end=False)
+                buffered += chunk
+                *lines, buffered = buffered.split(b"\n")
+                for line in lines:
+                    self.dispatch(line)
+
+                with self.lock:
+                    users = list(self.streams)
+                if users and time.monotonic() - marked_at > LIVE_TTL / 3:
+                    self._mark_live(users)
+                    marked_at = time.monotonic()
+            except Exception:
+                log.exception("realtime: event log read failed")
+
+    def dispatch(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        with self.lock:
+            streams = list(self.streams.get(record.get("user_id"), ()))
+        if not streams:
+            return
+        frame = sse_frame(record["event"], record["data"], record["id"])
+        for deliver in streams:
+            deliver(frame)
+
+
+hub = Hub()
@@ -0,0 +1,410 @@
+"""
+Coalescing and failure handling for PostgREST calls, as an httpx transport
+under every pooled client (sync and async), so every `.execute()` gets it:
+
+- single-flight: identical reads in flight for the same user (same URL,
+  headers, body and data version) share one upstream call
+- bounded timeouts: a connect limit for every call, a per-attempt limit for reads
+- retries with full-jitter backoff for idempotent reads (GET and the
+  read-only RPCs) on timeouts, dropped connections and 429/502/503/504;
+  writes are retried only when the connection was never made
+- optional hedging: a second copy of a read still unanswered after
+  SUPABASE_HEDGE_MS, first good answer wins
+- a circuit breaker per upstream host: after SUPABASE_BREAKER_FAILURES
+  consecutive failures calls fail fast with CircuitOpen (a 503 to the
+  client) until one probe gets through after SUPABASE_BREAKER_COOLDOWN
+"""
+import asyncio
+import hashlib
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+
+import httpx
+import jwt
+
+from app.utils.cache_utils import get_version
+from app.utils.metrics import record_event
+from app.utils.supabase_client import CircuitOpen
+
+CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", 10))
+RETRIES = int(os.getenv("SUPABASE_RETRIES", 2))
+RETRY_BUDGET = float(os.getenv("SUPABASE_RETRY_BUDGET", 15))
+RETRY_BASE = 0.05
+RETRY_MAX_DELAY = 1.0
+HEDGE_AFTER = float(os.getenv("SUPABASE_HEDGE_MS", 0)) / 1000
+SINGLE_FLIGHT = os.getenv("SUPABASE_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+BREAKER_FAILURES = int(os.getenv("SUPABASE_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.getenv("SUPABASE_BREAKER_COOLDOWN", 10))
+
+# RPCs that only read (schema.sql), so they can be shared and retried like a GET
+READ_ONLY_RPCS = {"get_xp_summary", "check_user_xp_daily"}
+RETRY_STATUSES = {429, 502, 503, 504}
+# Answers that mean PostgREST or its database is down, rather than a bad request
+OUTAGE_STATUSES = {502, 503, 504}
+# Errors after which a write may not have reached PostgREST
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitBreaker:
+    """Closed until `failures` consecutive failures, then open; one probe per `cooldown`."""
+
+    def __init__(self, host, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._opened_at = None
+        self._probing = False
+
+    def allow(self):
+        if self.failures <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            wait_for = self._opened_at + self.cooldown - time.monotonic()
+            if wait_for > 0 or self._probing:
+                record_event("breaker_rejected")
+                raise CircuitOpen(self.host, max(wait_for, 1))
+            self._probing = True
+
+    def record(self, ok):
+        """ok: True (answered), False (outage) or None (no verdict, e.g. cancelled)."""
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._failed = 0
+                self._opened_at = None
+            elif ok is False:
+                self._failed += 1
+                if self.failures > 0 and (self._failed >= self.failures or self._opened_at is not None):
+                    if self._opened_at is None:
+                        record_event("breaker_opened")
+                    self._opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url):
+    host = f"{url.scheme}://{url.netloc.decode()}"
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+class Buffered:
+    """A fully read response that can be handed to several callers."""
+
+    def __init__(self, response, body):
+        self.status_code = response.status_code
+        self.headers = response.headers.raw
+        self.body = body
+        # network_stream and the like belong to the connection, not the answer
+        self.extensions = {k: v for k, v in response.extensions.items() if k in ("http_version", "reason_phrase")}
+
+    @property
+    def retry_after(self):
+        return httpx.Headers(self.headers).get("retry-after")
+
+    def response(self, coalesced=False):
+        extensions = dict(self.extensions, lifeio_coalesced=True) if coalesced else self.extensions
+        return httpx.Response(self.status_code, headers=self.headers, stream=httpx.ByteStream(self.body),
+                              extensions=extensions)
+
+
+def is_idempotent(request):
+    if request.method in ("GET", "HEAD"):
+        return True
+    _, rpc, name = request.url.path.rpartition("/rpc/")
+    return request.method == "POST" and bool(rpc) and name in READ_ONLY_RPCS
+
+
+def bound_timeouts(request, idempotent):
+    timeout = dict(request.extensions.get("timeout") or {})
+    limits = {"connect": CONNECT_TIMEOUT, "pool": CONNECT_TIMEOUT}
+    if idempotent:
+        limits.update(read=READ_TIMEOUT, write=READ_TIMEOUT)
+    for name, limit in limits.items():
+        current = timeout.get(name)
+        timeout[name] = limit if current is None else min(current, limit)
+    request.extensions["timeout"] = timeout
+
+
+def bearer_subject(request):
+    """The user id in the (already verified) access token; None for the anon key."""
+    auth = request.headers.get("authorization", "")
+    try:
+        return jwt.decode(auth[7:], options={"verify_signature": False}).get("sub")
+    except jwt.InvalidTokenError:
+        return None
+
+
+def flight_key(request):
+    # The data version is part of the key, so a read issued after a write
+    # never joins one that started before it
+    user = bearer_subject(request)
+    digest = hashlib.sha256()
+    for part in (request.method, str(request.url), get_version(user) if user else ""):
+        digest.update(part.encode() + b"\0")
+    for name, value in sorted(request.headers.raw):
+        digest.update(name.lower() + b":" + value + b"\0")
+    digest.update(request.content)
+    return digest.hexdigest()
+
+
+def retryable(exc, idempotent):
+    if idempotent:
+        return isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+    return isinstance(exc, UNSENT_ERRORS)
+
+
+def retry_delay(attempt, started, retry_after=None):
+    """Seconds to wait before the next attempt, or None to give up."""
+    if attempt >= RETRIES:
+        return None
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    if time.monotonic() - started + delay > RETRY_BUDGET:
+        return None
+    return delay
+
+
+def good(buffered):
+    return buffered.status_code not in RETRY_STATUSES
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """(result, shared): fn() runs once for all concurrent callers with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = {"done": threading.Event()}
+        if shared:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = fn()
+            except BaseException as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call["done"].set()
+        if "error" in call:
+            raise call["error"]
+        return call["result"], shared
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        # The call runs as its own task, so a caller that goes away (client
+        # disconnect) does not cancel it for the others
+        key = (id(asyncio.get_running_loop()), key)
+        task = self._calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: (self._calls.pop(key, None), t.cancelled() or t.exception()))
+        return await asyncio.shield(task), shared
+
+
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def hedge_executor():
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="postgrest-hedge")
+    return _hedge_executor
+
+
+class ResilientTransport(httpx.BaseTransport):
+    def __init__(self, transport):
+        self._transport = transport
+
+    def handle_request(self, request):
+        idempotent = is_idempotent(request)
+        bound_timeouts(request, idempotent)
+        if idempotent and SINGLE_FLIGHT:
+            buffered, shared = _flights.do(flight_key(request), lambda: self._call(request, idempotent))
+        else:
+            buffered, shared = self._call(request, idempotent), False
+        return buffered.response(coalesced=shared)
+
+    def _call(self, request, idempotent):
+        breaker = breaker_for(request.url)
+        started = time.monotonic()
+        for attempt in itertools.count():
+            breaker.allow()
+            try:
+                if idempotent and HEDGE_AFTER:
+                    buffered = self._hedged(request, breaker)
+                else:
+                    buffered = self._attempt(request, breaker)
+            except httpx.TransportError as e:
+                delay = retry_delay(attempt, started) if retryable(e, idempotent) else None
+                if delay is None:
+                    raise
+            else:
+                if good(buffered) or not idempotent:
+                    return buffered
+                delay = retry_delay(attempt, started, buffered.retry_after)
+                if delay is None:
+                    return buffered
+            record_event("retry")
+            time.sleep(delay)
+
+    def _attempt(self, request, breaker):
+        try:
+            response = self._transport.handle_request(request)
+            try:
+                body = b"".join(response.stream)
+            finally:
+                response.close()
+        except BaseException as e:
+            breaker.record(False if isinstance(e, httpx.TransportError) else None)
+            raise
+        breaker.record(response.status_code not in OUTAGE_STATUSES)
+        return Buffered(response, body)
+
+    def _hedged(self, request, breaker):
+        first = hedge_executor().submit(self._attempt, request, breaker)
+        try:
+            return first.result(timeout=HEDGE_AFTER)
+        except FutureTimeout:
+            pass
+        record_event("hedge")
+        pending = {first, hedge_executor().submit(self._attempt, request, breaker)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and good(future.result()):
+                    return future.result()
+            if not pending:
+                # Both failed; report the first one's outcome
+                return first.result()
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncResilientTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport):
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        idempotent = is_idempotent(request)
+        bound_timeouts(request, idempotent)
+        if idempotent and SINGLE_FLIGHT:
+            buffered, shared = await _async_flights.do(flight_key(request), lambda: self._call(request, idempotent))
+        else:
+            buffered, shared = await self._call(request, idempotent), False
+        return buffered.response(coalesced=shared)
+
+    async def _call(self, request, idempotent):
+        breaker = breaker_for(request.url)
+        started = time.monotonic()
+        for attempt in itertools.count():
+            breaker.allow()
+            try:
+                if idempotent and HEDGE_AFTER:
+                    buffered = await self._hedged(request, breaker)
+                else:
+                    buffered = await self._attempt(request, breaker)
+            except httpx.TransportError as e:
+                delay = retry_delay(attempt, started) if retryable(e, idempotent) else None
+                if delay is None:
+                    raise
+            else:
+                if good(buffered) or not idempotent:
+                    return buffered
+                delay = retry_delay(attempt, started, buffered.retry_after)
+                if delay is None:
+                    return buffered
+            record_event("retry")
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, request, breaker):
+        try:
+            response = await self._transport.handle_async_request(request)
+            try:
+                body = b"".join([chunk async for chunk in response.stream])
+            finally:
+                await response.aclose()
+        except BaseException as e:
+            breaker.record(False if isinstance(e, httpx.TransportError) else None)
+            raise
+        breaker.record(response.status_code not in OUTAGE_STATUSES)
+        return Buffered(response, body)
+
+    async def _hedged(self, request, breaker):
+        first = asyncio.ensure_future(self._attempt(request, breaker))
+        done, _ = await asyncio.wait({first}, timeout=HEDGE_AFTER)
+        if done:
+            return first.result()
+        record_event("hedge")
+        pending = {first, asyncio.ensure_future(self._attempt(request, breaker))}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and good(task.result()):
+                        return task.result()
+                if not pending:
+                    return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def resilient(client):
+    """Puts a PostgREST client's HTTP session behind ResilientTransport."""
+    # httpx has no public setter for a built client's transport
+    client.session._transport = ResilientTransport(client.session._transport)
+    return client
+
+
+def async_resilient(client):
+    client.session._transport = AsyncResilientTransport(client.session._transport)
+    return client
+
+
+def _reset_after_fork():
+    global _breakers_lock, _flights, _hedge_executor, _hedge_lock
+    _breakers.clear()
+    _breakers_lock = threading.Lock()
+    _flights = SingleFlight()
+    _hedge_executor = None
+    _hedge_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
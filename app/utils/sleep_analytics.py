@@ -0,0 +1,230 @@
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+import numpy as np
+from app.utils.cache_utils import LRUCache, get_version
+from app.utils.timeseries import parse_timestamps, to_epoch, trailing_mean, utc_offsets
+
+DEFAULT_TARGET_HOURS = float(os.getenv("SLEEP_TARGET_HOURS", 8))
+SECONDS_PER_DAY = 86400
+MINUTES_PER_DAY = 1440
+SERIES_NIGHTS = 30
+
+
+class RunningMoments:
+    """Sums needed for mean, variance and Pearson correlation, updatable in O(1)."""
+
+    def __init__(self):
+        self.n = 0
+        self.sums = {}
+
+    def update(self, values, sign=1):
+        self.n += sign
+        for key, value in values.items():
+            self.sums[key] = self.sums.get(key, 0.0) + sign * value
+
+    def mean(self, key):
+        return self.sums.get(key, 0.0) / self.n if self.n else None
+
+    def correlation(self, x, y):
+        if self.n < 3:
+            return None
+        n, s = self.n, self.sums
+        cov = s[f"{x}*{y}"] - s[x] * s[y] / n
+        var_x = s[f"{x}^2"] - s[x] ** 2 / n
+        var_y = s[f"{y}^2"] - s[y] ** 2 / n
+        if var_x <= 1e-9 or var_y <= 1e-9:
+            return None
+        return cov / math.sqrt(var_x * var_y)
+
+
+def clock_minutes(epoch, tz):
+    """Local minutes past midnight, DST-aware."""
+    local = epoch + int(utc_offsets(np.array([epoch]), tz)[0])
+    return (local % SECONDS_PER_DAY) / 60
+
+
+def circular_summary(sin_sum, cos_sum, n):
+    """Mean clock time and spread of clock times treated as angles on a 24h circle."""
+    if not n:
+        return None
+    resultant = min(math.hypot(sin_sum, cos_sum) / n, 1.0)
+    angle = math.atan2(sin_sum, cos_sum) % (2 * math.pi)
+    mean_minutes = angle / (2 * math.pi) * MINUTES_PER_DAY
+    std_radians = math.sqrt(-2 * math.log(resultant)) if resultant > 0 else math.inf
+    return {
+        "mean": f"{int(mean_minutes // 60):02d}:{int(mean_minutes % 60):02d}",
+        "circular_variance": round(1 - resultant, 4),
+        "std_minutes": round(std_radians / (2 * math.pi) * MINUTES_PER_DAY, 1) if std_radians != math.inf else None
+    }
+
+
+class SleepAggregate:
+    """
+    One user's sleep logs in one timezone: sorted per-night arrays for windowed
+    metrics plus running moments for all-time metrics. add()/remove() keep both
+    current without re-reading the history.
+    """
+
+    def __init__(self, tz, version):
+        self.tz = tz
+        self.version = version
+        self.keys = []      # (sleep_epoch, id), sorted
+        self.nights = {}    # id -> per-night features
+        self.moments = RunningMoments()
+        self.lock = threading.Lock()
+
+    def _features(self, sleep_epoch, wake_epoch, bed, wake, quality):
+        # Bedtime measured from noon, so 23:00 and 01:00 are 2h apart, not 22h
+        bed_from_noon = (bed - 720) % MINUTES_PER_DAY
+        hours = (wake_epoch - sleep_epoch) / 3600
+        return {
+            "sleep_epoch": sleep_epoch,
+            "moments": {
+                "hours": hours, "hours^2": hours ** 2,
+                "quality": quality, "quality^2": quality ** 2,
+                "bed": bed_from_noon, "bed^2": bed_from_noon ** 2,
+                "hours*quality": hours * quality, "bed*quality": bed_from_noon * quality,
+                "bed_sin": math.sin(bed / MINUTES_PER_DAY * 2 * math.pi),
+                "bed_cos": math.cos(bed / MINUTES_PER_DAY * 2 * math.pi),
+                "wake_sin": math.sin(wake / MINUTES_PER_DAY * 2 * math.pi),
+                "wake_cos": math.cos(wake / MINUTES_PER_DAY * 2 * math.pi),
+            }
+        }
+
+    def _insert(self, log_id, features):
+        if log_id in self.nights:
+            self.remove(log_id)
+        self.nights[log_id] = features
+        insort(self.keys, (features["sleep_epoch"], log_id))
+        self.moments.update(features["moments"])
+
+    def add(self, log):
+        sleep_epoch = to_epoch(log["sleep_time"])
+        wake_epoch = to_epoch(log["wake_time"])
+        self._insert(str(log["id"]), self._features(
+            sleep_epoch, wake_epoch,
+            clock_minutes(sleep_epoch, self.tz), clock_minutes(wake_epoch, self.tz),
+            float(log["quality"])
+        ))
+
+    def remove(self, log_id):
+        features = self.nights.pop(str(log_id), None)
+        if features is None:
+            return
+        key = (features["sleep_epoch"], str(log_id))
+        del self.keys[bisect_left(self.keys, key)]
+        self.moments.update(features["moments"], sign=-1)
+
+    def load(self, logs):
+        """Bulk path: timestamps and local clock times are computed in one vectorized pass."""
+        if not logs:
+            return
+        sleeps = parse_timestamps([log["sleep_time"] for log in logs])
+        wakes = parse_timestamps([log["wake_time"] for log in logs])
+        beds = ((sleeps + utc_offsets(sleeps, self.tz)) % SECONDS_PER_DAY) / 60
+        wake_clock = ((wakes + utc_offsets(wakes, self.tz)) % SECONDS_PER_DAY) / 60
+        for i in np.argsort(sleeps, kind="stable"):
+            self._insert(str(logs[i]["id"]), self._features(
+                int(sleeps[i]), int(wakes[i]), float(beds[i]), float(wake_clock[i]),
+                float(logs[i]["quality"])
+            ))
+
+    def _window(self, since_epoch):
+        start = bisect_left(self.keys, (since_epoch, ""))
+        return np.array([self.nights[i]["moments"]["hours"] for _, i in self.keys[start:]], dtype=np.float64)
+
+    def summary(self, target_hours, now_epoch):
+        m = self.moments
+        week = self._window(now_epoch - 7 * SECONDS_PER_DAY)
+        month = self._window(now_epoch - 30 * SECONDS_PER_DAY)
+
+        recent_ids = [log_id for _, log_id in self.keys[-SERIES_NIGHTS:]]
+        recent_hours = np.array([self.nights[i]["moments"]["hours"] for i in recent_ids], dtype=np.float64)
+        rolling_7 = trailing_mean(recent_hours, 7)
+
+        def debt(hours):
+            return round(float(max(np.sum(target_hours - hours), 0.0)), 2)
+
+        return {
+            "nights": m.n,
+            "target_hours": target_hours,
+            "average_hours": round(m.mean("hours"), 2) if m.n else None,
+            "rolling": {
+                "avg_7d": round(float(week.mean()), 2) if len(week) else None,
+                "avg_30d": round(float(month.mean()), 2) if len(month) else None,
+                "series": [{
+                    "sleep_time": datetime.fromtimestamp(self.nights[i]["sleep_epoch"], timezone.utc).isoformat(),
+                    "hours": round(float(h), 2),
+                    "avg_7": round(float(r), 2)
+                } for i, h, r in zip(recent_ids, recent_hours, rolling_7)]
+            },
+            "sleep_debt_hours": {
+                "7d": debt(week),
+                "30d": debt(month)
+            },
+            "consistency": {
+                "bedtime": circular_summary(m.sums.get("bed_sin", 0), m.sums.get("bed_cos", 0), m.n),
+                "wake_time": circular_summary(m.sums.get("wake_sin", 0), m.sums.get("wake_cos", 0), m.n)
+            },
+            "quality": {
+                "average": round(m.mean("quality"), 2) if m.n else None,
+                "correlation_with_duration": _rounded(m.correlation("hours", "quality")),
+                "correlation_with_bedtime": _rounded(m.correlation("bed", "quality"))
+            }
+        }
+
+
+def _rounded(value):
+    return round(value, 3) if value is not None else None
+
+
+# One aggregate per user, in the timezone last asked for; least recently used
+# users' are dropped and reloaded on their next read
+_aggregates = LRUCache(maxsize=int(os.getenv("SLEEP_CACHE_SIZE", 256)))
+_registry_lock = threading.Lock()
+
+
+def get_sleep_analytics(sleep_repo, user_id, tz, target_hours=DEFAULT_TARGET_HOURS):
+    """Loads the user's logs once, then serves from the live aggregate while the tz stays the same."""
+    version = get_version(user_id, "sleep")
+    with _registry_lock:
+        aggregate = _aggregates.get(str(user_id))
+
+    if aggregate is None or aggregate.version != version or aggregate.tz.zone != tz.zone:
+        # Written by another process, asked in another tz, or never loaded: rebuild from the table
+        aggregate = SleepAggregate(tz, version)
+        aggregate.load(sleep_repo.all(user_id, ["id", "sleep_time", "wake_time", "quality"]))
+        with _registry_lock:
+            _aggregates.set(str(user_id), aggregate)
+
+    with aggregate.lock:
+        return aggregate.summary(target_hours, time.time())
+
+
+def _apply(user_id, prev_version, new_version, change):
+    """
+    Applies a committed write to the user's cached aggregate if it was current
+    just before it; otherwise drops it, to be reloaded on next read.
+    """
+    with _registry_lock:
+        aggregate = _aggregates.get(str(user_id))
+        if aggregate is None:
+            return
+        with aggregate.lock:
+            if aggregate.version == prev_version:
+                change(aggregate)
+                aggregate.version = new_version
+            else:
+                _aggregates.pop(str(user_id))
+
+
+def record_sleep_log(user_id, log, prev_version, new_version):
+    _apply(user_id, prev_version, new_version, lambda aggregate: aggregate.add(log))
+
+
+def forget_sleep_log(user_id, log_id, prev_version, new_version):
+    _apply(user_id, prev_version, new_version, lambda aggregate: aggregate.remove(log_id))
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from app.utils.cache_utils import memoize_for_user
+from app.utils.finance_index import finance_summary
+from app.utils.xp_utils import get_level_progress
+
+
+def utc_today():
+    # Matches the UTC day buckets of the user_xp_daily rollup
+    return datetime.now(timezone.utc).date()
+
+
+def get_xp_totals(repos, user_id):
+    """Lifetime, monthly, today and per-category XP in one call."""
+    return normalize_xp_totals(repos.activities.xp_totals(user_id, utc_today()))
+
+
+def normalize_xp_totals(totals):
+    return {
+        "total": float(totals.get("total", 0)),
+        "monthly": float(totals.get("monthly", 0)),
+        "today": float(totals.get("today", 0)),
+        "skills": {k: round(float(v), 2) for k, v in (totals.get("skills") or {}).items()}
+    }
+
+
+def build_summary(totals):
+    level_info = get_level_progress(totals["total"])
+    return {
+        "level": level_info['level'],
+        "xp_stats": {
+            "total": level_info['total_xp'],
+            "current_level_progress": level_info['xp_current'],
+            "needed_for_next": level_info['xp_needed'],
+            "monthly": round(totals["monthly"], 2),
+            "today": round(totals["today"], 2)
+        }
+    }
+
+
+def check_xp_rollup(repos):
+    """Rollup buckets that disagree with raw activity sums (empty list = consistent)."""
+    return repos.activities.check_rollup()
+
+
+def backfill_xp_rollup(repos):
+    """Rebuilds the caller's rollup from raw activities; returns the bucket count."""
+    return repos.activities.backfill_rollup()
+
+
+def get_recent_sleep_logs(repos, user_id, limit=5):
+    return repos.sleep.recent(user_id, limit)
+
+
+# Dashboard sections, shared by /api/dashboard and the realtime publisher
+
+def cached_xp_totals(repos, user_id):
+    return memoize_for_user(user_id, "xp_totals", lambda: get_xp_totals(repos, user_id), utc_today())
+
+
+def last_30_days_finance(repos, user_id):
+    today = utc_today()
+    summary = finance_summary(repos.finance, user_id, today - timedelta(days=30), today)
+    del summary["series"]
+    return {"period": "Last 30 days", **summary}
+
+
+def cached_recent_sleep(repos, user_id):
+    return memoize_for_user(user_id, "recent_sleep", lambda: get_recent_sleep_logs(repos, user_id))
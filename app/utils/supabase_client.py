@@ -1,6 +1,11 @@
+import math
 import os
-from supabase import create_client, Client
+import queue
+import threading
+from contextlib import contextmanager
+from flask import g, has_app_context, jsonify
 from dotenv import load_dotenv
+from app.utils.metrics import instrument_postgrest
 
 load_dotenv()
 
@@ -8,22 +13,215 @@ url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 service_role_key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
-if not url or not key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+# Clients, and the supabase/gotrue/httpx imports behind them, are created on
+# first use: importing this module is cheap, and a --preload master never
+# opens connections that its forked workers would then share.
+_clients = {}
+_clients_lock = threading.Lock()
 
-# Anon client for RLS-based client-side or authenticated backend calls
-supabase: Client = create_client(url, key)
 
-# Admin client for bypassing RLS (use sparingly)
-supabase_admin: Client = None
-if service_role_key and not service_role_key.startswith("your_"):
-    try:
-        supabase_admin = create_client(url, service_role_key)
-    except Exception as e:
-        print(f"Warning: Could not initialize Supabase Admin client: {e}")
+def check_settings():
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+
+
+def import_client_libraries():
+    """Imports the client libraries without connecting (see gunicorn.conf.py)."""
+    import supabase
+    import postgrest
+    return supabase, postgrest
+
+
+def get_anon_client():
+    """
+    Anon client for auth calls (sign-in, token fallback). Its PostgREST session
+    is shared, so data queries go through the pool below instead.
+    """
+    with _clients_lock:
+        if "anon" not in _clients:
+            check_settings()
+            from supabase import create_client
+            _clients["anon"] = create_client(url, key)
+    return _clients["anon"]
 
-def get_supabase_client():
-    return supabase
 
 def get_supabase_admin():
-    return supabase_admin
+    """Admin client for bypassing RLS (use sparingly); None without a service role key."""
+    with _clients_lock:
+        if "admin" not in _clients:
+            _clients["admin"] = None
+            if service_role_key and not service_role_key.startswith("your_"):
+                try:
+                    from supabase import create_client
+                    _clients["admin"] = create_client(url, service_role_key)
+                except Exception as e:
+                    print(f"Warning: Could not initialize Supabase Admin client: {e}")
+    return _clients["admin"]
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    """PostgREST keeps failing; calls are refused until a probe succeeds (see resilience.py)."""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"Supabase is unavailable, retry in {math.ceil(retry_after)}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def init_upstream_errors(app):
+    """503 with Retry-After instead of a 500 page when Supabase cannot be reached."""
+    @app.errorhandler(PoolExhausted)
+    @app.errorhandler(CircuitOpen)
+    def upstream_unavailable(e):
+        retry_after = math.ceil(getattr(e, "retry_after", 1))
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(retry_after)}
+
+
+class PostgrestPool:
+    """
+    Fixed-size pool of PostgREST clients, each owning a keep-alive HTTP session.
+    A client is checked out by exactly one request at a time, so setting its
+    Authorization header can never leak into a concurrent request.
+    """
+
+    def __init__(self, rest_url, api_key, size=10, checkout_timeout=10, http_timeout=30):
+        self.rest_url = rest_url
+        self.api_key = api_key
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.http_timeout = http_timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_client(self):
+        from postgrest import SyncPostgrestClient
+        from app.utils.resilience import resilient
+        return instrument_postgrest(resilient(SyncPostgrestClient(
+            self.rest_url,
+            headers={"apiKey": self.api_key, "Authorization": f"Bearer {self.api_key}"},
+            timeout=self.http_timeout,
+        )))
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._new_client()
+
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"No Supabase connection available after {self.checkout_timeout}s")
+
+    def release(self, client):
+        # Drop the user's token before the client goes back to the pool
+        client.auth(self.api_key)
+        self._idle.put(client)
+
+    def reset(self):
+        """Forgets every client without closing it (after fork(), they belong to the parent)."""
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+
+class SupabaseHandle:
+    """
+    Request-scoped Supabase handle. Checks a PostgREST client out of the pool on
+    first query and returns it on release(); auth calls go to the shared client.
+    """
+
+    def __init__(self, pool, token=None):
+        self._pool = pool
+        self._token = token
+        self._client = None
+
+    def set_auth(self, token):
+        self._token = token
+        if self._client is not None:
+            self._client.auth(token)
+
+    @property
+    def postgrest(self):
+        if self._client is None:
+            self._client = self._pool.acquire()
+            if self._token:
+                self._client.auth(self._token)
+        return self._client
+
+    @property
+    def auth(self):
+        return get_anon_client().auth
+
+    def table(self, table_name):
+        return self.postgrest.from_(table_name)
+
+    def from_(self, table_name):
+        return self.postgrest.from_(table_name)
+
+    def rpc(self, fn, params=None):
+        return self.postgrest.rpc(fn, params or {})
+
+    def release(self):
+        if self._client is not None:
+            self._pool.release(self._client)
+            self._client = None
+
+
+pool = PostgrestPool(
+    f"{url}/rest/v1",
+    key,
+    size=int(os.getenv("SUPABASE_POOL_SIZE", 10)),
+    checkout_timeout=float(os.getenv("SUPABASE_POOL_TIMEOUT", 10)),
+    http_timeout=float(os.getenv("SUPABASE_HTTP_TIMEOUT", 30)),
+)
+
+
+def get_supabase_client():
+    """
+    Returns the handle bound to the current request (created on first use).
+    Outside an app context a fresh handle is returned and the caller must
+    release() it; prefer pooled_client() there.
+    """
+    if not has_app_context():
+        return SupabaseHandle(pool)
+    if "supabase_handle" not in g:
+        g.supabase_handle = SupabaseHandle(pool)
+    return g.supabase_handle
+
+
+def release_supabase_client(exc=None):
+    handle = g.pop("supabase_handle", None)
+    if handle is not None:
+        handle.release()
+
+
+@contextmanager
+def pooled_client(token=None):
+    """Handle for work outside the request thread (e.g. background tasks)."""
+    handle = SupabaseHandle(pool, token)
+    try:
+        yield handle
+    finally:
+        handle.release()
+
+
+def _reset_after_fork():
+    # A child must never reuse its parent's HTTP connections
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+    pool.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,136 @@
+"""
+Delta sync (GET /api/sync): the activities, sleep logs and finance rows a
+user inserted, updated or deleted since a cursor, so a client that keeps a
+replica (static/js/replica.js) transfers only what changed.
+
+Rows are read in (updated_at, id) order and deletions in (deleted_at, row_id)
+order from sync_tombstones (schema.sql); the cursor records how far each of
+those four reads got. Once all of them have caught up the cursor is pulled
+back SYNC_OVERLAP_SECONDS, so a transaction that committed late with an
+earlier timestamp (or a database clock behind ours) is still picked up; rows
+that come twice are plain upserts on the client.
+"""
+import base64
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.utils.pagination import shape_rows
+
+SYNC_TABLES = ("activities", "sleep_logs", "daily_finance")
+SOURCES = SYNC_TABLES + ("tombstones",)
+# Rows per table per response; PostgREST caps responses at 1000 rows by default
+SYNC_PAGE_SIZE = int(os.getenv("LIFEIO_SYNC_PAGE_SIZE", 1000))
+SYNC_OVERLAP_SECONDS = float(os.getenv("LIFEIO_SYNC_OVERLAP", 60))
+# Keep in step with purge_sync_tombstones(); an older cursor starts over
+SYNC_TOMBSTONE_DAYS = float(os.getenv("LIFEIO_SYNC_TOMBSTONE_DAYS", 90))
+
+
+def encode_cursor(user_id, positions):
+    raw = json.dumps({"user": str(user_id), "at": positions}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(user id, {source: [timestamp, id or None] or None}); ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        user, positions = data["user"], data["at"]
+        for source in SOURCES:
+            position = positions.get(source)
+            if position is not None:
+                ts, row_id = position
+                parse_ts(ts)
+                if row_id is not None:
+                    uuid.UUID(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return user, {source: positions.get(source) for source in SOURCES}
+
+
+def parse_ts(value):
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def parse_sync_params(args):
+    """Reads ?since=, ?limit= and ?shape=. Raises ValueError with a client-facing message."""
+    try:
+        limit = int(args.get("limit", SYNC_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > SYNC_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {SYNC_PAGE_SIZE}")
+
+    shape = args.get("shape", "rows")
+    if shape not in ("rows", "columns"):
+        raise ValueError("shape must be one of: rows, columns")
+
+    since = decode_cursor(args["since"]) if args.get("since") else None
+    return {"limit": limit, "shape": shape, "since": since}
+
+
+def advance(rows, position, limit, column, id_column):
+    """(position after `rows`, whether the page was full and more may follow)."""
+    if not rows:
+        return position, False
+    return [str(rows[-1][column]), str(rows[-1][id_column])], len(rows) >= limit
+
+
+def changes_since(repos, user_id, params, now=None, pending=None):
+    """
+    The /api/sync body for `params` from parse_sync_params(). `pending` adds
+    queued write-behind rows ({table: rows}); they carry "pending": true and
+    come again on every call until they reach the database.
+    """
+    now = now or datetime.now(timezone.utc)
+    caught_up = [(now - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat(), None]
+    limit = params["limit"]
+
+    positions = None
+    if params["since"] is not None:
+        user, positions = params["since"]
+        buried = positions["tombstones"]
+        # Another user's replica, or deletions may have been purged since: start over
+        if user != str(user_id) or buried is None \
+                or parse_ts(buried[0]) < now - timedelta(days=SYNC_TOMBSTONE_DAYS):
+            positions = None
+    reset = positions is None
+    if reset:
+        # A fresh replica has nothing to delete
+        positions = {**{table: None for table in SYNC_TABLES}, "tombstones": caught_up}
+
+    # Deletions are read first and applied first: a row deleted between the two
+    # reads is then missing from the rows too, and one deleted and written again
+    # (a replayed write) comes back in them
+    after = {}
+    buried = repos.tombstones.deleted_since(user_id, tuple(positions["tombstones"]), limit)
+    after["tombstones"], more = advance(buried, positions["tombstones"], limit, "deleted_at", "row_id")
+    body = {
+        "user_id": str(user_id),
+        "reset": reset,
+        "deleted": {table: [str(t["row_id"]) for t in buried if t["table_name"] == table] for table in SYNC_TABLES},
+        "changes": {}
+    }
+    for table in SYNC_TABLES:
+        position = positions[table]
+        rows = repos.for_table(table).changed_since(user_id, tuple(position) if position else None, limit)
+        after[table], full = advance(rows, position, limit, "updated_at", "id")
+        more = more or full
+        queued = (pending or {}).get(table, [])
+        if queued:
+            keys = {row["id"] for row in queued}
+            rows = [row for row in rows if str(row["id"]) not in keys] + queued
+        # The response already says whose rows these are
+        rows = [{k: v for k, v in row.items() if k != "user_id"} for row in rows]
+        body["changes"][table] = shape_rows(rows, params)
+
+    if not more:
+        # Only once every read has caught up: pulling one back while another is
+        # still paging would have it re-read the overlap on every page
+        after = {source: caught_up for source in SOURCES}
+    body["cursor"] = encode_cursor(user_id, after)
+    body["more"] = more
+    return body
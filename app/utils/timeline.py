@@ -0,0 +1,149 @@
+import os
+import threading
+from datetime import datetime, timezone
+from app.utils.activity_utils import IntervalSet
+from app.utils.cache_utils import LRUCache, get_version
+
+TIMELINE_COLUMNS = ["id", "category", "start_time", "end_time", "xp_earned"]
+
+
+def as_utc(value):
+    dt = datetime.fromisoformat(value) if isinstance(value, str) else value
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def utc_text(value, dt):
+    # PostgREST and SQLite already render UTC; re-rendering dominated load time
+    return value if isinstance(value, str) and value.endswith("+00:00") else dt.isoformat()
+
+
+def minutes(start, end):
+    return round((end - start).total_seconds() / 60, 2)
+
+
+class Timeline:
+    """
+    One user's activities as an IntervalSet of UTC instants. Activities never
+    overlap (activities_no_overlap), so "what covers T", "what overlaps
+    [from, to)" and "what is untracked in it" are bisects plus the slice.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.intervals = IntervalSet()
+        self.starts = {}    # id -> start, to find a row again on delete
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, row):
+        """Inserts a stored activity; like log_activity, it replaces any it overlaps."""
+        if not row.get("end_time"):
+            return
+        start, end = as_utc(row["start_time"]), as_utc(row["end_time"])
+        if end <= start:
+            return
+        item = self.item(row, start, end)
+        self.remove(item["id"])
+        for older in self.intervals.add(start, end, item):
+            del self.starts[older["id"]]
+        self.starts[item["id"]] = start
+
+    @staticmethod
+    def item(row, start, end):
+        return {
+            "id": str(row["id"]),
+            "category": row.get("category"),
+            "start_time": utc_text(row["start_time"], start),
+            "end_time": utc_text(row["end_time"], end),
+            "xp_earned": row.get("xp_earned")
+        }
+
+    def remove(self, row_id):
+        start = self.starts.pop(str(row_id), None)
+        if start is not None:
+            self.intervals.discard(start)
+
+    def load(self, pages):
+        # Pages come oldest first and the table has no overlaps, so almost every
+        # row just appends; anything out of order goes through add()
+        intervals = self.intervals
+        for page in pages:
+            for row in page:
+                if not row.get("end_time"):
+                    continue
+                start, end = as_utc(row["start_time"]), as_utc(row["end_time"])
+                if end <= start or str(row["id"]) in self.starts or (intervals.ends and start < intervals.ends[-1]):
+                    self.add(row)
+                    continue
+                item = self.item(row, start, end)
+                intervals.starts.append(start)
+                intervals.ends.append(end)
+                intervals.items.append(item)
+                self.starts[item["id"]] = start
+
+    def overlapping(self, start, end):
+        return self.intervals.overlapping(as_utc(start), as_utc(end))
+
+    def at(self, point):
+        return self.intervals.at(as_utc(point))
+
+    def window(self, start, end, min_gap_minutes=0):
+        """Activities overlapping [start, end), its untracked gaps and the tracked/untracked minutes."""
+        start, end = as_utc(start), as_utc(end)
+        activities = self.intervals.overlapping(start, end)
+        gaps = [
+            {"start": s.isoformat(), "end": e.isoformat(), "minutes": minutes(s, e)}
+            for s, e in self.intervals.gaps(start, end)
+        ]
+        untracked = sum(gap["minutes"] for gap in gaps)
+        return {
+            "activities": activities,
+            "gaps": [gap for gap in gaps if gap["minutes"] >= min_gap_minutes],
+            "tracked_minutes": round(minutes(start, end) - untracked, 2),
+            "untracked_minutes": round(untracked, 2)
+        }
+
+
+# Least recently used users' timelines are dropped and reloaded on their next read
+_timelines = LRUCache(maxsize=int(os.getenv("TIMELINE_CACHE_SIZE", 256)))
+_registry_lock = threading.Lock()
+
+
+def get_timeline(activity_repo, user_id):
+    """The user's timeline, loaded on first use or when another process has written since."""
+    version = get_version(user_id, "activities")
+    with _registry_lock:
+        timeline = _timelines.get(str(user_id))
+    if timeline is None or timeline.version != version:
+        timeline = Timeline(version)
+        timeline.load(activity_repo.iter_pages(user_id, TIMELINE_COLUMNS))
+        with _registry_lock:
+            _timelines.set(str(user_id), timeline)
+    return timeline
+
+
+def _apply(user_id, prev_version, new_version, change):
+    # Same rule as the finance index: only patch a timeline that saw every earlier write
+    with _registry_lock:
+        timeline = _timelines.get(str(user_id))
+        if timeline is None:
+            return
+        with timeline.lock:
+            if timeline.version == prev_version:
+                change(timeline)
+                timeline.version = new_version
+            else:
+                _timelines.pop(str(user_id))
+
+
+def record_activities(user_id, rows, prev_version, new_version):
+    def change(timeline):
+        for row in rows:
+            timeline.add(row)
+    _apply(user_id, prev_version, new_version, change)
+
+
+def forget_activity(user_id, row_id, prev_version, new_version):
+    _apply(user_id, prev_version, new_version, lambda timeline: timeline.remove(row_id))
@@ -0,0 +1,238 @@
+from datetime import datetime, timedelta, timezone
+import dateutil.parser
+import numpy as np
+import os
+import pytz
+
+DEFAULT_TIMEZONE = os.getenv("LIFEIO_TIMEZONE", "UTC")
+MAX_RANGE_DAYS = 3660
+SECONDS_PER_DAY = 86400
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+EPOCH_DATE = datetime(1970, 1, 1).date()
+
+
+def parse_timestamps(values):
+    """
+    ISO-8601 strings -> int64 UTC epoch seconds, vectorized.
+    PostgREST renders timestamptz in UTC ("...+00:00"), which takes the fast
+    path of decoding the digits directly; anything else falls back to dateutil.
+    """
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    # "+" and "Z" only ever appear in the offset, so the counts add up to
+    # len(values) exactly when every value is UTC
+    joined = "".join(values)
+    if joined.count("+00:00") + joined.count("Z") != len(values):
+        return np.array([to_epoch(v) for v in values], dtype=np.int64)
+
+    digits = np.frombuffer(np.array(values, dtype="S19").tobytes(), dtype=np.uint8) \
+        .reshape(-1, 19).astype(np.int64) - ord("0")
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 5] * 10 + digits[:, 6]
+    day = digits[:, 8] * 10 + digits[:, 9]
+    seconds = (digits[:, 11] * 10 + digits[:, 12]) * 3600 \
+        + (digits[:, 14] * 10 + digits[:, 15]) * 60 \
+        + digits[:, 17] * 10 + digits[:, 18]
+    return days_from_civil(year, month, day) * SECONDS_PER_DAY + seconds
+
+
+def days_from_civil(year, month, day):
+    """Proleptic Gregorian date -> days since 1970-01-01 (H. Hinnant's algorithm)."""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def to_epoch(value):
+    dt = dateutil.parser.isoparse(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def utc_offsets(epochs, tz):
+    """
+    UTC offset in seconds for each epoch in `tz`, DST-aware, vectorized with a
+    searchsorted over the zone's transition table.
+    """
+    transitions = getattr(tz, "_utc_transition_times", None)
+    if not transitions:
+        offset = tz.utcoffset(datetime(2000, 1, 1)) or timedelta(0)
+        return np.full(len(epochs), int(offset.total_seconds()), dtype=np.int64)
+
+    # The first entry is datetime.min, which numpy can't represent; clamp it
+    trans = np.array(
+        [max(t, datetime(1900, 1, 1)) for t in transitions], dtype="datetime64[s]"
+    ).astype(np.int64)
+    offsets = np.array([int(info[0].total_seconds()) for info in tz._transition_info], dtype=np.int64)
+    idx = np.clip(np.searchsorted(trans, epochs, side="right") - 1, 0, len(offsets) - 1)
+    return offsets[idx]
+
+
+def day_number(d):
+    return (d - EPOCH_DATE).days
+
+
+def run_lengths(mask):
+    """(starts, lengths) of the runs of True in a boolean array."""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+
+def trailing_mean(values, window):
+    """Mean over the trailing `window` entries (fewer at the start)."""
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (csum[idx] - csum[lo]) / np.minimum(idx, window)
+
+
+def hourly_minutes(local_starts, local_ends, base, n_hours):
+    """
+    Minutes of activity in each hour bucket [base + h*3600, ...), spreading
+    activities across every hour they cover (difference-array, no loops).
+    """
+    s = np.clip((local_starts - base) / 3600.0, 0, n_hours)
+    e = np.clip((local_ends - base) / 3600.0, 0, n_hours)
+    keep = e > s
+    s, e = s[keep], e[keep]
+    fs = np.floor(s).astype(np.int64)
+    fe = np.floor(e).astype(np.int64)
+
+    minutes = np.zeros(n_hours + 1)
+    same = fs == fe
+    np.add.at(minutes, fs[same], (e[same] - s[same]) * 60)
+
+    span = ~same
+    np.add.at(minutes, fs[span], (fs[span] + 1 - s[span]) * 60)
+    np.add.at(minutes, fe[span], (e[span] - fe[span]) * 60)
+
+    # Whole hours strictly between the first and last partial hour
+    diff = np.zeros(n_hours + 2)
+    np.add.at(diff, fs[span] + 1, 1)
+    np.add.at(diff, fe[span], -1)
+    minutes += np.cumsum(diff)[:n_hours + 1] * 60
+    return minutes[:n_hours]
+
+
+def compute_timeseries(rows, date_from, date_to, tz):
+    """
+    Daily/weekly XP per category, rolling 7/30-day averages, streaks and an
+    hour-of-day heatmap for [date_from, date_to] (local dates in `tz`).
+    `rows` need start_time, end_time, category and xp_earned; rows starting
+    up to 29 days before date_from are used to warm up the rolling averages.
+    """
+    n_days = (date_to - date_from).days + 1
+    warmup = 29
+    first_day = day_number(date_from) - warmup
+    total_days = n_days + warmup
+
+    # Columnar arrays, built once
+    starts = parse_timestamps([r["start_time"] for r in rows])
+    ends = parse_timestamps([r["end_time"] or r["start_time"] for r in rows])
+    xp = np.fromiter((r["xp_earned"] or 0 for r in rows), dtype=np.float64, count=len(rows))
+    lookup = {}
+    cat_idx = np.fromiter(
+        (lookup.setdefault(r["category"], len(lookup)) for r in rows), dtype=np.int64, count=len(rows)
+    )
+    categories = list(lookup)
+    n_cats = len(categories)
+
+    start_offsets = utc_offsets(starts, tz)
+    local_starts = starts + start_offsets
+    local_ends = ends + utc_offsets(ends, tz)
+    day_idx = local_starts // SECONDS_PER_DAY - first_day
+    in_range = (day_idx >= 0) & (day_idx < total_days)
+
+    # Daily XP per category: one bincount over (day, category) cells
+    flat = day_idx[in_range] * n_cats + cat_idx[in_range]
+    daily = np.bincount(flat, weights=xp[in_range], minlength=total_days * n_cats) \
+        .reshape(total_days, n_cats)
+    daily_total = daily.sum(axis=1)
+
+    avg_7 = trailing_mean(daily_total, 7)[warmup:]
+    avg_30 = trailing_mean(daily_total, 30)[warmup:]
+    daily, daily_total = daily[warmup:], daily_total[warmup:]
+
+    # Weeks start on Monday; the first bucket may be partial
+    week_of_day = (np.arange(n_days) + date_from.weekday()) // 7
+    n_weeks = int(week_of_day[-1]) + 1
+    weekly = np.zeros((n_weeks, n_cats))
+    np.add.at(weekly, week_of_day, daily)
+    week_starts = [date_from - timedelta(days=date_from.weekday()) + timedelta(weeks=w) for w in range(n_weeks)]
+
+    # Productive day = positive net XP
+    productive = daily_total > 0
+    run_starts, run_lens = run_lengths(productive)
+    longest = int(run_lens.max()) if len(run_lens) else 0
+    longest_end = date_from + timedelta(days=int(run_starts[run_lens.argmax()] + longest - 1)) if longest else None
+    current = 0
+    if len(run_lens):
+        last_run_end = run_starts[-1] + run_lens[-1] - 1
+        # Today may simply not be logged yet, so a run ending yesterday still counts
+        if last_run_end >= n_days - 2:
+            current = int(run_lens[-1])
+
+    # Heatmap: minutes per (weekday, hour) in local time
+    base = day_number(date_from) * SECONDS_PER_DAY
+    window = (day_idx >= warmup) & in_range
+    hours = hourly_minutes(local_starts[window], local_ends[window], base, n_days * 24)
+    hour_idx = np.arange(n_days * 24)
+    weekday = (date_from.weekday() + hour_idx // 24) % 7
+    heatmap = np.bincount(weekday * 24 + hour_idx % 24, weights=hours, minlength=7 * 24).reshape(7, 24)
+
+    dates = [(date_from + timedelta(days=i)).isoformat() for i in range(n_days)]
+    cats = categories
+    return {
+        "categories": cats,
+        "daily": {
+            "dates": dates,
+            "total": np.round(daily_total, 2).tolist(),
+            "by_category": {c: np.round(daily[:, i], 2).tolist() for i, c in enumerate(cats)}
+        },
+        "weekly": {
+            "week_start": [w.isoformat() for w in week_starts],
+            "total": np.round(weekly.sum(axis=1), 2).tolist(),
+            "by_category": {c: np.round(weekly[:, i], 2).tolist() for i, c in enumerate(cats)}
+        },
+        "rolling": {
+            "avg_7": np.round(avg_7, 2).tolist(),
+            "avg_30": np.round(avg_30, 2).tolist()
+        },
+        "streaks": {
+            "current": current,
+            "longest": longest,
+            "longest_end": longest_end.isoformat() if longest_end else None
+        },
+        "heatmap": {
+            "weekdays": WEEKDAYS,
+            "minutes": np.round(heatmap, 1).tolist()
+        }
+    }
+
+
+def parse_range(args, tz, default_days=90):
+    """Reads ?from=/?to= (YYYY-MM-DD, local to tz); defaults to the last `default_days` days."""
+    today = datetime.now(tz).date()
+    date_to = datetime.strptime(args["to"], "%Y-%m-%d").date() if args.get("to") else today
+    date_from = datetime.strptime(args["from"], "%Y-%m-%d").date() if args.get("from") \
+        else date_to - timedelta(days=default_days - 1)
+    if date_from > date_to:
+        raise ValueError("from must not be after to")
+    if (date_to - date_from).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"Range may span at most {MAX_RANGE_DAYS} days")
+    return date_from, date_to
+
+
+def resolve_timezone(name):
+    """pytz zone for an IANA name; raises ValueError for unknown zones."""
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Unknown timezone: {name}")
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+from app.utils.metrics import timed_upstream
+
+# Algorithms Supabase signs access tokens with. HS256 uses the project's
+# JWT secret, the asymmetric ones are verified against the published JWKS.
+SYMMETRIC_ALGORITHMS = ("HS256",)
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class TokenUser:
+    """Lightweight user built from verified token claims.
+
+    Exposes the same attributes the routes read from the GoTrue user object.
+    """
+
+    def __init__(self, claims):
+        self.id = claims["sub"]
+        self.email = claims.get("email")
+        self.role = claims.get("role")
+        self.claims = claims
+
+
+class TokenCache:
+    """Bounded LRU cache of verified users with a per-entry TTL.
+
+    Entries are keyed by a SHA-256 of the token so raw tokens never sit in memory
+    longer than the request, and never outlive the token's own `exp`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self.key_for(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, token, user, exp=None):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        key = self.key_for(token)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LocalVerificationUnavailable(Exception):
+    """Raised when a token cannot be checked locally and needs the remote fallback."""
+
+
+token_cache = TokenCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("TOKEN_CACHE_TTL", 300)),
+)
+
+_jwks_client = None
+_jwks_lock = threading.Lock()
+
+
+def get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None:
+        with _jwks_lock:
+            if _jwks_client is None:
+                supabase_url = os.environ.get("SUPABASE_URL", "").rstrip("/")
+                jwks_url = os.getenv("SUPABASE_JWKS_URL") or f"{supabase_url}/auth/v1/.well-known/jwks.json"
+                _jwks_client = jwt.PyJWKClient(
+                    jwks_url,
+                    cache_keys=True,
+                    lifespan=int(os.getenv("SUPABASE_JWKS_TTL", 600)),
+                )
+    return _jwks_client
+
+
+def decode_token_locally(token):
+    """
+    Verifies signature, `exp` and `aud` without calling GoTrue.
+    Raises jwt.InvalidTokenError for bad tokens and LocalVerificationUnavailable
+    when no key material is configured for the token's algorithm.
+    """
+    header = jwt.get_unverified_header(token)
+    alg = header.get("alg")
+    audience = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    options = {"require": ["exp", "sub"]}
+
+    if alg in SYMMETRIC_ALGORITHMS:
+        secret = os.getenv("SUPABASE_JWT_SECRET")
+        if not secret:
+            raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET not set")
+        key = secret
+    elif alg in ASYMMETRIC_ALGORITHMS:
+        try:
+            key = get_jwks_client().get_signing_key_from_jwt(token).key
+        except jwt.PyJWKClientError as e:
+            raise LocalVerificationUnavailable(str(e))
+    else:
+        raise LocalVerificationUnavailable(f"Unsupported token algorithm: {alg}")
+
+    return jwt.decode(token, key, algorithms=[alg], audience=audience, options=options)
+
+
+def verify_token_locally(token):
+    """
+    The user for a token from the cache or local verification, None if the
+    token is invalid; raises LocalVerificationUnavailable when only GoTrue can tell.
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    try:
+        claims = decode_token_locally(token)
+    except jwt.InvalidTokenError:
+        return None
+    user = TokenUser(claims)
+    token_cache.set(token, user, exp=claims["exp"])
+    return user
+
+
+def _remember_remote_user(token, user_response):
+    if not user_response or not user_response.user:
+        return None
+    exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    token_cache.set(token, user_response.user, exp=exp)
+    return user_response.user
+
+
+def verify_token(token, remote_client=None):
+    """
+    Returns the user for an access token, or None if it is invalid.
+    Order: cache -> local verification -> remote `get_user` fallback.
+    """
+    try:
+        return verify_token_locally(token)
+    except LocalVerificationUnavailable:
+        if remote_client is None:
+            raise
+
+    # Fallback: ask GoTrue (only reached when no key material is available)
+    with timed_upstream("gotrue", "user", "get_user"):
+        user_response = remote_client.auth.get_user(token)
+    return _remember_remote_user(token, user_response)
+
+
+async def verify_token_async(token, get_remote_auth):
+    """verify_token for the ASGI routes; `get_remote_auth` returns an async GoTrue client."""
+    try:
+        return verify_token_locally(token)
+    except LocalVerificationUnavailable:
+        pass
+
+    remote_auth = await get_remote_auth()
+    with timed_upstream("gotrue", "user", "get_user"):
+        user_response = await remote_auth.get_user(token)
+    return _remember_remote_user(token, user_response)
@@ -0,0 +1,581 @@
+"""
+Opt-in write-behind queue for activity, sleep and finance submissions
+(LIFEIO_WRITE_BEHIND=1, Supabase backend only).
+
+A validated write is appended to this process's journal (one fsynced JSON
+line) and acknowledged with 202 straight away. A background thread flushes
+each user's entries to Supabase in submission order; the entry key becomes
+the row id, so replaying an entry that already reached the database is
+harmless. List routes merge entries that have not been flushed yet, GET
+/api/sync flushes the user's entries before reading the delta, and the
+journals of crashed or restarted workers are adopted and replayed.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from app.repositories import STORAGE_BACKEND, repositories_for
+from app.utils.cache_utils import STATE_DIR, bump_version, get_version
+from app.utils.finance_index import record_finance_row
+from app.utils.realtime import listening, publish_changes
+from app.utils.sleep_analytics import record_sleep_log
+from app.utils.timeline import record_activities
+from app.utils.supabase_client import CircuitOpen, PoolExhausted
+
+WRITE_BEHIND = os.getenv("LIFEIO_WRITE_BEHIND", "").lower() in ("1", "true", "yes") \
+    and STORAGE_BACKEND == "supabase"
+
+JOURNAL_DIR = os.path.join(STATE_DIR, "journal")
+# Seconds the flusher waits after a submission so a burst goes out as one batch
+FLUSH_DELAY = float(os.getenv("LIFEIO_WRITE_BEHIND_DELAY", 0.05))
+MAX_BATCH = 500
+MAX_BACKOFF = 60
+ADOPT_INTERVAL = 10
+
+SORT_COLUMNS = {"activities": "start_time", "sleep": "sleep_time", "finance": "date"}
+SYNC_TABLES = {"activities": "activities", "sleep": "sleep_logs"}
+
+log = logging.getLogger(__name__)
+
+
+class TokenRejected(Exception):
+    """The stored access token no longer works; wait for the user to come back."""
+
+
+def utc_iso(dt):
+    dt = dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def parse_utc(value):
+    dt = datetime.fromisoformat(value)
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def classify(exc):
+    """"transient" (retry later), "auth" (needs a fresh token) or "permanent"."""
+    import httpx
+    from postgrest.exceptions import APIError
+    if isinstance(exc, (httpx.HTTPError, PoolExhausted, CircuitOpen, OSError)):
+        return "transient"
+    if isinstance(exc, APIError):
+        code = str(exc.code or "")
+        if code in ("PGRST301", "PGRST302", "401"):
+            return "auth"
+        # PostgREST always sets a code; errors without one come from a proxy in front of it.
+        # 23P01: an overlapping activity landed concurrently; log_activity replaces it on retry
+        if not code or code.startswith("PGRST00") or code[:2] in ("08", "40", "53", "57") or code == "23P01" \
+                or code == "429" or (code.isdigit() and len(code) == 3 and code >= "500"):
+            return "transient"
+    return "permanent"
+
+
+def read_journal(f):
+    """Entries of a journal file with no done marker, in submission order."""
+    pending = {}
+    f.seek(0)
+    for line in f:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # torn write from a crash
+        if "done" in record:
+            pending.pop(record["done"], None)
+        elif "key" in record:
+            pending[record["key"]] = record
+    return pending
+
+
+class Journal:
+    """Append-only JSON-lines file, flock-ed by the process that owns it."""
+
+    def __init__(self, directory):
+        # Locked under a temporary name so no other process mistakes it for an orphan
+        tmp_path = os.path.join(directory, f"{uuid.uuid4()}.tmp")
+        self.file = os.fdopen(os.open(tmp_path, os.O_CREAT | os.O_RDWR | os.O_APPEND, 0o600), "a+b")
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.path = tmp_path[:-4] + ".log"
+        os.replace(tmp_path, self.path)
+
+    def append(self, records):
+        self.file.write(b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in records))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def truncate(self):
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+
+def private_file(path, mode):
+    """Opens a text file only this user can read; the journal's neighbours hold user data too."""
+    flags = os.O_CREAT | os.O_WRONLY | (os.O_APPEND if mode == "a" else os.O_TRUNC)
+    return os.fdopen(os.open(path, flags, 0o600), mode)
+
+
+def pending_row(entry):
+    """The row a queued entry will become, flagged "pending"."""
+    row = entry["row"]
+    base = {"id": entry["key"], "user_id": entry["user_id"]}
+    if entry["kind"] == "activities":
+        minutes = (parse_utc(row["end_time"]) - parse_utc(row["start_time"])).total_seconds() / 60
+        # XP depends on the category multiplier, resolved when the entry is flushed
+        extra = {"duration_minutes": round(minutes), "xp_earned": None}
+    elif entry["kind"] == "sleep":
+        minutes = (parse_utc(row["wake_time"]) - parse_utc(row["sleep_time"])).total_seconds() / 60
+        extra = {"duration_minutes": round(minutes)}
+    else:
+        extra = {"net": round(row["income"] - row["expense"], 2)}
+    return {**base, **row, **extra, "created_at": entry["queued_at"], "pending": True}
+
+
+def write_activities(repos, user_id, batch):
+    row = batch[0]["row"]
+    return [repos.activities.log(user_id, row["category"], parse_utc(row["start_time"]),
+                                 parse_utc(row["end_time"]), row_id=batch[0]["key"])]
+
+
+def write_sleep(repos, user_id, batch):
+    return repos.sleep.insert_many(user_id, [{"id": entry["key"], **entry["row"]} for entry in batch])
+
+
+def write_finance(repos, user_id, batch):
+    # One row per date: the last submission wins, as with sequential upserts
+    latest = {entry["row"]["date"]: entry["row"] for entry in batch}
+    return repos.finance.upsert_many(user_id, list(latest.values()))
+
+
+# kind -> (writer, entries per batch); activities go one at a time because
+# each one may replace overlapping activities, including earlier queued ones
+WRITERS = {
+    "activities": (write_activities, 1),
+    "sleep": (write_sleep, MAX_BATCH),
+    "finance": (write_finance, MAX_BATCH),
+}
+
+
+class WriteBehindQueue:
+    def __init__(self, directory):
+        self.directory = directory
+        self.cancelled_dir = os.path.join(directory, "cancelled")
+        os.makedirs(self.cancelled_dir, mode=0o700, exist_ok=True)
+        self.journal = Journal(directory)
+        self.pending = {}      # key -> entry, in submission order
+        self.tokens = {}       # user_id -> freshest access token seen
+        self.backoff = {}      # user_id -> (failed attempts, monotonic time of next attempt)
+        self.needs_token = set()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # one flush at a time, background or on demand
+        self.wakeup = threading.Event()
+        self._foreign = {}     # journal path -> ((mtime, size), pending entries)
+        self._foreign_lock = threading.Lock()
+        self._adopted_at = 0
+        self.adopt_orphans()
+        self._drop_stale_tombstones()
+
+    def adopt_orphans(self):
+        """Moves entries from journals whose process is gone into ours."""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".log") or path == self.journal.path:
+                continue
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker's journal
+                if os.fstat(f.fileno()).st_nlink == 0:
+                    continue  # another process adopted it first
+                entries = list(read_journal(f).values())
+                if entries:
+                    # Ours is on disk before the orphan goes away
+                    with self.lock:
+                        self.journal.append(entries)
+                        merged = list(self.pending.values()) + entries
+                        merged.sort(key=lambda entry: entry["queued_at"])
+                        self.pending = {entry["key"]: entry for entry in merged}
+                    log.info("write-behind: adopted %d queued writes from %s", len(entries), name)
+                os.unlink(path)
+        self._adopted_at = time.monotonic()
+        if self.pending:
+            self.wakeup.set()
+
+    def submit(self, kind, user_id, token, row):
+        entry = {
+            "key": str(uuid.uuid4()),
+            "kind": kind,
+            "user_id": user_id,
+            "token": token,
+            "row": row,
+            "queued_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self.lock:
+            self.journal.append([entry])
+            self.pending[entry["key"]] = entry
+        self.tokens[user_id] = token
+        self.wakeup.set()
+        return entry
+
+    def mark_done(self, entries, **outcome):
+        keys = [entry["key"] for entry in entries]
+        with self.lock:
+            self.journal.append([{"done": key, **outcome} for key in keys])
+            for key in keys:
+                self.pending.pop(key, None)
+        for key in keys:
+            self._remove_tombstone(key)
+
+    def note_token(self, user_id, token):
+        if self.tokens.get(user_id) != token:
+            self.tokens[user_id] = token
+            if user_id in self.needs_token:
+                self.needs_token.discard(user_id)
+                self.wakeup.set()
+
+    def _tombstone(self, key):
+        return os.path.join(self.cancelled_dir, key)
+
+    def _remove_tombstone(self, key):
+        try:
+            os.unlink(self._tombstone(key))
+        except FileNotFoundError:
+            pass
+
+    def _drop_stale_tombstones(self):
+        cutoff = time.time() - 86400
+        for name in os.listdir(self.cancelled_dir):
+            path = os.path.join(self.cancelled_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def cancelled(self, keys):
+        return {key for key in keys if os.path.exists(self._tombstone(key))}
+
+    def cancel(self, user_id, key):
+        """
+        Cancels a queued write, whichever worker holds it. If the owner is
+        flushing it right now, it deletes the row again once written.
+        """
+        if not any(entry["key"] == key for entry in self.entries_for(user_id)):
+            return False
+        with private_file(self._tombstone(key), "w") as f:
+            f.write(user_id)
+        return True
+
+    def _foreign_entries(self):
+        """Pending entries in other workers' journals, re-read only when a file changes."""
+        with self._foreign_lock:
+            return self._read_foreign()
+
+    def _read_foreign(self):
+        entries = []
+        seen = set()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".log") or path == self.journal.path:
+                continue
+            try:
+                stat = os.stat(path)
+                cached = self._foreign.get(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if cached is None or cached[0] != signature:
+                    with open(path, "rb") as f:
+                        cached = (signature, read_journal(f))
+                    self._foreign[path] = cached
+            except FileNotFoundError:
+                continue
+            seen.add(path)
+            entries.extend(cached[1].values())
+        for path in set(self._foreign) - seen:
+            self._foreign.pop(path, None)
+        return entries
+
+    def entries_for(self, user_id, kind=None):
+        with self.lock:
+            own = list(self.pending.values())
+        entries = [
+            entry for entry in own + self._foreign_entries()
+            if entry["user_id"] == user_id and (kind is None or entry["kind"] == kind)
+        ]
+        gone = self.cancelled([entry["key"] for entry in entries])
+        entries = [entry for entry in entries if entry["key"] not in gone]
+        entries.sort(key=lambda entry: entry["queued_at"])
+        return entries
+
+    def start(self):
+        threading.Thread(target=self.run, name="write-behind", daemon=True).start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(1.0)
+            self.wakeup.clear()
+            time.sleep(FLUSH_DELAY)
+            try:
+                if time.monotonic() - self._adopted_at > ADOPT_INTERVAL:
+                    self.adopt_orphans()
+                self.flush()
+            except Exception:
+                log.exception("write-behind: flush failed")
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                by_user = {}
+                for entry in self.pending.values():
+                    by_user.setdefault(entry["user_id"], []).append(entry)
+
+            for user_id, entries in by_user.items():
+                if self.ready(user_id):
+                    self.try_flush_user(user_id, entries)
+
+            with self.lock:
+                if not self.pending:
+                    self.journal.truncate()
+
+    def flush_now(self, user_id):
+        """Flushes this process's queued writes of one user before returning."""
+        with self.flush_lock:
+            with self.lock:
+                entries = [entry for entry in self.pending.values() if entry["user_id"] == user_id]
+            if entries and self.ready(user_id):
+                self.try_flush_user(user_id, entries)
+
+    def ready(self, user_id):
+        not_before = self.backoff.get(user_id, (0, 0))[1]
+        return user_id not in self.needs_token and time.monotonic() >= not_before
+
+    def try_flush_user(self, user_id, entries):
+        try:
+            self.flush_user(user_id, entries)
+            self.backoff.pop(user_id, None)
+        except TokenRejected:
+            self.needs_token.add(user_id)
+        except Exception as e:
+            attempts = self.backoff.get(user_id, (0, 0))[0]
+            delay = min(MAX_BACKOFF, 0.5 * 2 ** attempts)
+            self.backoff[user_id] = (attempts + 1, time.monotonic() + delay)
+            log.warning("write-behind: flush for %s failed (%s), retrying in %.1fs", user_id, e, delay)
+
+    def flush_user(self, user_id, entries):
+        token = self.tokens.get(user_id) or entries[-1]["token"]
+        # Consecutive entries of one kind go out together; order across kinds is kept
+        runs = []
+        for entry in entries:
+            if runs and runs[-1][0] == entry["kind"] and len(runs[-1][1]) < WRITERS[entry["kind"]][1]:
+                runs[-1][1].append(entry)
+            else:
+                runs.append((entry["kind"], [entry]))
+        for kind, batch in runs:
+            self.flush_batch(user_id, token, kind, batch)
+
+    def flush_batch(self, user_id, token, kind, batch):
+        cancelled = self.cancelled([entry["key"] for entry in batch])
+        if cancelled:
+            self.mark_done([entry for entry in batch if entry["key"] in cancelled], cancelled=True)
+            batch = [entry for entry in batch if entry["key"] not in cancelled]
+            if not batch:
+                return
+
+        writer = WRITERS[kind][0]
+        prev_version = get_version(user_id, kind)
+        try:
+            with repositories_for(token) as repos:
+                rows = writer(repos, user_id, batch)
+                late = self.cancelled([entry["key"] for entry in batch])
+                if late:
+                    rows = self.delete_cancelled(repos, user_id, kind, batch, rows, late)
+        except Exception as e:
+            failure = classify(e)
+            if failure == "auth":
+                if self.tokens.get(user_id) == token:
+                    self.tokens.pop(user_id, None)
+                raise TokenRejected() from e
+            if failure == "transient":
+                raise
+            if len(batch) > 1:
+                # Find the entry the database rejects; the others still go through
+                for entry in batch:
+                    self.flush_batch(user_id, token, kind, [entry])
+                return
+            self.dead_letter(batch[0], e)
+            return
+
+        self.mark_done(batch)
+        version = bump_version(user_id, kind)
+        if kind == "activities":
+            record_activities(user_id, rows, prev_version, version)
+        for row in rows:
+            if kind == "sleep":
+                record_sleep_log(user_id, row, prev_version, version)
+            elif kind == "finance":
+                record_finance_row(user_id, row, prev_version, version)
+        if rows and listening(user_id):
+            with repositories_for(token) as repos:
+                publish_changes(repos, user_id, kind, row=rows[0] if kind == "sleep" and len(rows) == 1 else None)
+
+    def delete_cancelled(self, repos, user_id, kind, batch, rows, keys):
+        """Removes rows whose DELETE arrived while they were being written."""
+        if kind == "finance":
+            dates = {entry["row"]["date"] for entry in batch if entry["key"] in keys}
+            doomed = [row for row in rows if row["date"] in dates]
+        else:
+            doomed = [row for row in rows if row["id"] in keys]
+        table = getattr(repos, kind)
+        for row in doomed:
+            table.delete(user_id, row["id"])
+        return [row for row in rows if row not in doomed]
+
+    def dead_letter(self, entry, error):
+        log.error("write-behind: dropping %s %s: %s", entry["kind"], entry["key"], error)
+        record = {k: v for k, v in entry.items() if k != "token"}
+        with private_file(os.path.join(self.directory, "failed.ndjson"), "a") as f:
+            f.write(json.dumps({**record, "error": str(error)}) + "\n")
+        self.mark_done([entry], failed=True)
+        # The pending row disappears from list responses
+        bump_version(entry["user_id"], entry["kind"])
+
+
+_queue = None
+_queue_pid = None
+_queue_lock = threading.Lock()
+
+
+def init_write_behind():
+    """
+    This process's queue: opens its journal, replays orphaned entries and
+    starts the flusher on first call. Server entry points call it once a
+    worker process exists (see gunicorn.conf.py); until then the first
+    authenticated request does. A forked child never reuses its parent's.
+    """
+    global _queue, _queue_pid
+    if not WRITE_BEHIND:
+        return None
+    with _queue_lock:
+        if _queue is None or _queue_pid != os.getpid():
+            if _queue is not None:
+                # Inherited across fork(): let the parent's journal lock go with the parent
+                _queue.journal.file.close()
+            os.makedirs(JOURNAL_DIR, mode=0o700, exist_ok=True)
+            # Journals hold access tokens; tighten a directory an older version created
+            os.chmod(JOURNAL_DIR, 0o700)
+            _queue = WriteBehindQueue(JOURNAL_DIR)
+            _queue_pid = os.getpid()
+            _queue.start()
+    return _queue
+
+
+def enqueue(kind, user_id, token, row):
+    """Queues a validated write; returns the pending row for the 202 response."""
+    entry = init_write_behind().submit(kind, user_id, token, row)
+    bump_version(user_id, kind)
+    return pending_row(entry)
+
+
+def note_token(user_id, token):
+    """Called for each authenticated request so the flusher always has a current token."""
+    queue = init_write_behind()
+    if queue is not None:
+        queue.note_token(user_id, token)
+
+
+def cancel(user_id, key):
+    """True if `key` was a queued write of this user (now cancelled)."""
+    queue = init_write_behind()
+    return queue is not None and queue.cancel(user_id, key)
+
+
+def flush_pending(user_id):
+    """
+    Writes the user's entries queued in this process now (GET /api/sync reads
+    the database). Returns the ones still queued — held by another worker, or
+    waiting out a failure — as {table: [pending rows]}. Finance entries are
+    left out: the row they upsert keeps its own id, so a replica could not
+    match the pending row to it. They come in a later sync once written.
+    """
+    queue = init_write_behind()
+    if queue is None:
+        return {}
+    queue.flush_now(user_id)
+    pending = {}
+    for entry in queue.entries_for(user_id):
+        if entry["kind"] != "finance":
+            pending.setdefault(SYNC_TABLES[entry["kind"]], []).append(pending_row(entry))
+    return pending
+
+
+def in_window(value, id_, params, kind):
+    parse = (lambda v: v) if kind == "finance" else parse_utc
+    if params["from"] and value < parse(params["from"]):
+        return False
+    if params["to"] and value > parse(params["to"]):
+        return False
+    if params["cursor"]:
+        cursor_value, cursor_id = params["cursor"]
+        if (value, id_) >= (parse(cursor_value), cursor_id):
+            return False
+    return True
+
+
+def merge_pending(kind, user_id, rows, params):
+    """
+    Adds the user's queued writes to a list_page() result as they will look
+    once flushed: queued activities replace the ones they overlap, a queued
+    finance entry replaces that date's record. Returns rows newest first.
+    """
+    queue = init_write_behind()
+    if queue is None:
+        return rows
+    entries = queue.entries_for(user_id, kind)
+    if not entries:
+        return rows
+
+    sort_column = SORT_COLUMNS[kind]
+    pending = [pending_row(entry) for entry in entries]
+    if kind == "activities":
+        effective = []
+        for row in pending:
+            start, end = parse_utc(row["start_time"]), parse_utc(row["end_time"])
+            effective = [
+                older for older in effective
+                if not (parse_utc(older["start_time"]) < end and parse_utc(older["end_time"]) > start)
+            ]
+            effective.append(row)
+        pending = effective
+        spans = [(parse_utc(row["start_time"]), parse_utc(row["end_time"])) for row in pending]
+        rows = [
+            row for row in rows
+            if not row.get("end_time") or not any(
+                start < parse_utc(row["end_time"]) and end > parse_utc(row["start_time"]) for start, end in spans)
+        ]
+    elif kind == "finance":
+        pending = list({row["date"]: row for row in pending}.values())
+        dates = {row["date"] for row in pending}
+        rows = [row for row in rows if row.get("date") not in dates]
+
+    keys = {row["id"] for row in pending}
+    rows = [row for row in rows if row.get("id") not in keys]
+
+    sort_value = (lambda v: v) if kind == "finance" else parse_utc
+    try:
+        pending = [row for row in pending if in_window(sort_value(row[sort_column]), row["id"], params, kind)]
+    except ValueError:
+        return rows  # from/to the database would reject; leave the error to it
+    if params["fields"] != "*":
+        fields = params["fields"].split(",") + ["pending"]
+        pending = [{field: row[field] for field in fields if field in row} for row in pending]
+
+    merged = rows + pending
+    merged.sort(key=lambda row: (sort_value(str(row[sort_column])), str(row["id"])), reverse=True)
+    return merged
@@ -0,0 +1,10 @@
+"""
+ASGI entry point, next to the WSGI `main:app`:
+
+    uvicorn asgi:app --workers 2
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 2 asgi:app
+"""
+from main import app as wsgi_app, start_worker
+from app.asgi import create_asgi_app
+
+app = create_asgi_app(wsgi_app, on_start=start_worker)
@@ -0,0 +1,56 @@
+"""
+Serves the app for the benchmark harness. --mode wsgi runs main.create_app()
+on a thread-per-request WSGI server (the same concurrency model as the
+gunicorn gthread workers in the Dockerfile); --mode asgi runs asgi.py under
+uvicorn. Configuration comes from the environment, as in production.
+"""
+import argparse
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def serve_wsgi(host, port):
+    from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler, make_server
+    from main import create_app, start_worker
+
+    # Same backlog as the ASGI server so high-concurrency runs compare serving models, not SYN retries
+    ThreadedWSGIServer.request_queue_size = 2048
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server(host, port, create_app(), threaded=True, request_handler=QuietHandler)
+    start_worker()
+    print(f"listening http://{host}:{server.server_port}", flush=True)
+    server.serve_forever()
+
+
+def serve_asgi(host, port):
+    import uvicorn
+    from asgi import app
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.listen(2048)  # connections queue until uvicorn starts accepting
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False, backlog=2048))
+    print(f"listening http://{host}:{sock.getsockname()[1]}", flush=True)
+    server.run(sockets=[sock])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--mode", choices=("wsgi", "asgi"), default="wsgi")
+    args = parser.parse_args()
+
+    if args.mode == "asgi":
+        serve_asgi(args.host, args.port)
+    else:
+        serve_wsgi(args.host, args.port)
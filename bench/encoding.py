@@ -0,0 +1,98 @@
+"""
+Encoding benchmark for list payloads: encode time of Flask's stdlib JSON
+provider against the orjson one (app/utils/json_provider.py), and bytes per
+record of the plain and ?shape=columns bodies in every encoding
+app/utils/compression.py can negotiate, on synthetic activity histories.
+
+    python -m bench.encoding
+    python -m bench.encoding --volumes 1k,100k --runs 7 --out encoding_results.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.utils.compression import codecs, LEVELS
+from app.utils.json_provider import OrjsonProvider
+from app.utils.pagination import shape_rows
+from bench.fake_supabase import synthetic_rows
+from bench.run import parse_volume
+
+
+def activity_rows(count):
+    rows = []
+    for table, batch in synthetic_rows(count):
+        if table == "activities":
+            rows.extend(batch)
+    return rows
+
+
+def timed(fn, runs):
+    """Median ms of `runs` calls and the last result."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+
+def measure(rows, runs):
+    app = Flask(__name__)
+    providers = {"stdlib": DefaultJSONProvider(app), "orjson": OrjsonProvider(app)}
+    bodies = {"rows": rows, "columns": shape_rows(rows, {"shape": "columns"})}
+    report = {"records": len(rows), "encode_ms": {}, "bytes_per_record": {}, "compress_ms": {}}
+
+    with app.app_context():
+        for name, provider in providers.items():
+            report["encode_ms"][name] = {
+                shape: round(timed(lambda: provider.response(body).get_data(), runs)[0], 2)
+                for shape, body in bodies.items()
+            }
+        for shape, body in bodies.items():
+            data = providers["orjson"].response(body).get_data()
+            sizes = {"identity": len(data)}
+            for encoding, compress in codecs().items():
+                ms, compressed = timed(lambda: compress(data), runs)
+                sizes[encoding] = len(compressed)
+                report["compress_ms"].setdefault(encoding, {})[shape] = round(ms, 2)
+            report["bytes_per_record"][shape] = {k: round(v / len(rows), 1) for k, v in sizes.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", default="1k,10k,100k", help="comma-separated activity counts (k/m suffixes)")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per measurement (median is reported)")
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for volume in (parse_volume(v) for v in args.volumes.split(",")):
+        report = measure(activity_rows(volume), args.runs)
+        results.append(report)
+        encode, per_record = report["encode_ms"], report["bytes_per_record"]
+        print(f"\n{report['records']} activities")
+        print(f"  encode ms     rows: stdlib {encode['stdlib']['rows']:>9.2f}  orjson {encode['orjson']['rows']:>8.2f}"
+              f"   columns: stdlib {encode['stdlib']['columns']:>9.2f}  orjson {encode['orjson']['columns']:>8.2f}")
+        print(f"  {'bytes/record':<14}" + "".join(f"{encoding:>10}" for encoding in per_record["rows"]))
+        for shape, sizes in per_record.items():
+            print(f"  {shape:<14}" + "".join(f"{size:>10.1f}" for size in sizes.values()))
+        for encoding, by_shape in report["compress_ms"].items():
+            print(f"  {encoding} ms (level {LEVELS[encoding]}): rows {by_shape['rows']:.2f}, columns {by_shape['columns']:.2f}")
+
+    if args.out:
+        meta = {"timestamp": datetime.now(timezone.utc).isoformat(), "python": platform.python_version(),
+                "runs": args.runs}
+        with open(args.out, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
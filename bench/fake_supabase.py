@@ -0,0 +1,767 @@
+"""
+In-memory stand-in for Supabase's GoTrue and PostgREST HTTP APIs, for
+benchmarking the app offline.
+
+Implements the subset of PostgREST the app uses (filters, or/and trees, order,
+limit/offset, select projection, upsert on_conflict, the schema.sql RPCs) with
+injected latency/failures, and counts every upstream call it serves. Rows are
+kept per user, sorted by each table's natural key, so range filters and
+ordered pages are bisects rather than full scans even at a million rows.
+
+    python -m bench.fake_supabase --port 54321 --latency-ms 20 --seed-activities 100000
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import jwt
+
+JWT_SECRET = "bench-jwt-secret-bench-jwt-secret-0123"
+BENCH_USER_ID = "11111111-1111-1111-1111-111111111111"
+BENCH_EMAIL = "bench@lifeio.local"
+
+TIMESTAMP_COLUMNS = {"start_time", "end_time", "sleep_time", "wake_time", "created_at", "updated_at", "deleted_at"}
+NUMERIC_COLUMNS = {"xp_earned", "income", "expense", "net", "xp_multiplier", "duration_minutes", "quality", "xp", "minutes"}
+SORT_COLUMNS = {
+    "categories": "name",
+    "activities": "start_time",
+    "sleep_logs": "sleep_time",
+    "daily_finance": "date",
+    "user_xp_daily": "day",
+    "sync_tombstones": "deleted_at",
+}
+# Tables whose deletes leave a sync_tombstones row, as the schema.sql triggers do
+SYNC_TABLES = ("activities", "sleep_logs", "daily_finance")
+DEFAULT_MULTIPLIERS = {"Work": 1.2, "Study": 1.1, "Workout": 1.3, "Cooking": 1.0, "Wasted Time": -1.0}
+# Activities auto-stop at midnight, so nothing starting earlier than this can overlap
+MAX_ACTIVITY_SPAN = timedelta(days=2)
+ID_MAX = "\uffff"
+
+
+def parse_ts(value):
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def normalize_ts(value):
+    # Stored timestamps are canonical UTC text, so text order is time order
+    return None if value is None else parse_ts(value).astimezone(timezone.utc).isoformat()
+
+
+def target_value(column, raw):
+    if column in TIMESTAMP_COLUMNS:
+        return normalize_ts(raw)
+    if column in NUMERIC_COLUMNS:
+        return float(raw)
+    return str(raw)
+
+
+def row_value(column, value):
+    if value is None:
+        return None
+    return float(value) if column in NUMERIC_COLUMNS else str(value)
+
+
+def split_top(text):
+    """Split a PostgREST logic list on commas that are not nested in parens."""
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def compile_condition(column, expr):
+    negate = False
+    if expr.startswith("not."):
+        negate, expr = True, expr[4:]
+    op, _, raw = expr.partition(".")
+    if op == "in":
+        items = {unquote(v).strip('"') for v in raw.strip("()").split(",")} if raw.strip("()") else set()
+    elif op != "is":
+        target = target_value(column, unquote(raw).strip('"'))
+
+    def test(row):
+        value = row_value(column, row.get(column))
+        if op == "is":
+            result = value is None if raw == "null" else row.get(column) == (raw == "true")
+        elif op == "in":
+            result = value is not None and str(row.get(column)) in items
+        elif value is None:
+            result = False
+        elif op == "eq":
+            result = value == target
+        elif op == "neq":
+            result = value != target
+        elif op == "gt":
+            result = value > target
+        elif op == "gte":
+            result = value >= target
+        elif op == "lt":
+            result = value < target
+        elif op == "lte":
+            result = value <= target
+        else:
+            raise ValueError(f"unsupported operator {op}")
+        return not result if negate else result
+    return test
+
+
+def compile_logic(kind, body):
+    tests = []
+    for part in split_top(body):
+        match = re.match(r"^(and|or)\((.*)\)$", part)
+        if match:
+            tests.append(compile_logic(match.group(1), match.group(2)))
+        else:
+            column, _, expr = part.partition(".")
+            tests.append(compile_condition(column, expr))
+    if kind == "and":
+        return lambda row: all(t(row) for t in tests)
+    return lambda row: any(t(row) for t in tests)
+
+
+class Table:
+    """Rows grouped by user, each group sorted by (natural key, id)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.sort_column = SORT_COLUMNS[name]
+        self.rows = {}   # user_id -> rows
+        self.keys = {}   # user_id -> [(sort value, id)], parallel to rows
+        self.by_id = {}  # primary key index
+
+    def key(self, row):
+        return (str(row[self.sort_column]), row["id"])
+
+    def insert(self, row):
+        user = str(row["user_id"])
+        keys = self.keys.setdefault(user, [])
+        rows = self.rows.setdefault(user, [])
+        key = self.key(row)
+        i = bisect_left(keys, key)
+        keys.insert(i, key)
+        rows.insert(i, row)
+        self.by_id[row["id"]] = row
+
+    def extend_sorted(self, user, rows):
+        """Bulk load for seeding; rows must already be in key order."""
+        self.rows.setdefault(user, []).extend(rows)
+        self.keys.setdefault(user, []).extend(self.key(r) for r in rows)
+        self.by_id.update((r["id"], r) for r in rows)
+
+    def remove(self, rows):
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(str(row["user_id"]), {})[row["id"]] = row
+            self.by_id.pop(row["id"], None)
+        for user, removed in by_user.items():
+            keys, current = self.keys.get(user, []), self.rows.get(user, [])
+            if len(removed) <= 64:
+                for row in removed.values():
+                    i = bisect_left(keys, self.key(row))
+                    if i < len(keys) and keys[i][1] == row["id"]:
+                        del keys[i]
+                        del current[i]
+                continue
+            ids = set(removed)
+            kept = [r for r in self.rows.get(user, []) if r["id"] not in ids]
+            self.rows[user] = kept
+            self.keys[user] = [self.key(r) for r in kept]
+
+    def all_rows(self):
+        return sorted((r for rows in self.rows.values() for r in rows), key=self.key)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+
+class Store:
+    def __init__(self):
+        self.tables = {name: Table(name) for name in SORT_COLUMNS}
+        self.lock = threading.RLock()
+        self.calls = 0
+        self.calls_by_kind = {}
+        # (user, UTC day, category) -> xp, kept like the user_xp_daily trigger
+        self.xp_daily = {}
+
+    def record(self, kind):
+        with self.lock:
+            self.calls += 1
+            self.calls_by_kind[kind] = self.calls_by_kind.get(kind, 0) + 1
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls = 0
+            self.calls_by_kind = {}
+
+    def finish_row(self, table, row):
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        if table in SYNC_TABLES:
+            # touch_updated_at: the server clock wins over anything the client sent
+            row["updated_at"] = datetime.now(timezone.utc).isoformat()
+        for col in TIMESTAMP_COLUMNS:
+            if row.get(col) is not None:
+                row[col] = normalize_ts(row[col])
+        if table == "activities":
+            row["duration_minutes"] = round(
+                (parse_ts(row["end_time"]) - parse_ts(row["start_time"])).total_seconds() / 60
+            ) if row.get("end_time") else None
+        elif table == "sleep_logs":
+            row["duration_minutes"] = round((parse_ts(row["wake_time"]) - parse_ts(row["sleep_time"])).total_seconds() / 60)
+        elif table == "daily_finance":
+            row.setdefault("income", 0)
+            row.setdefault("expense", 0)
+            row["net"] = round(float(row["income"]) - float(row["expense"]), 2)
+        return row
+
+    def _rollup(self, row, sign):
+        key = (str(row["user_id"]), row["start_time"][:10], row["category"])
+        self.xp_daily[key] = self.xp_daily.get(key, 0.0) + sign * float(row.get("xp_earned") or 0)
+
+    def insert(self, table, row):
+        row = self.finish_row(table, row)
+        self.tables[table].insert(row)
+        if table == "activities":
+            self._rollup(row, 1)
+        if table in SYNC_TABLES:
+            buried = self.tables["sync_tombstones"].by_id.get(row["id"])
+            if buried is not None:
+                self.tables["sync_tombstones"].remove([buried])
+        return row
+
+    def remove(self, table, rows, bury=True):
+        self.tables[table].remove(rows)
+        if table == "activities":
+            for row in rows:
+                self._rollup(row, -1)
+        if bury and table in SYNC_TABLES and rows:
+            tombstones = self.tables["sync_tombstones"]
+            deleted_at = datetime.now(timezone.utc).isoformat()
+            tombstones.remove([tombstones.by_id[r["id"]] for r in rows if r["id"] in tombstones.by_id])
+            for row in rows:
+                tombstones.insert({"id": row["id"], "table_name": table, "row_id": row["id"],
+                                   "user_id": row["user_id"], "deleted_at": deleted_at})
+
+    def update(self, table, row, changes):
+        self.remove(table, [row], bury=False)
+        row.update(changes)
+        return self.insert(table, row)
+
+
+def parse_order(value):
+    order = []
+    for part in value.split(","):
+        bits = part.split(".")
+        order.append((bits[0], "desc" in bits[1:]))
+    return order
+
+
+_UNSET = object()
+
+
+def apply_query(table, params):
+    """Returns (rows, select) for a PostgREST GET/DELETE query string."""
+    user = None
+    filters = []
+    order = None
+    limit = offset = None
+    select = "*"
+    sort_column = table.sort_column
+    range_ops = []
+    by_id = _UNSET
+    for key, value in params:
+        if key == "select":
+            select = value
+        elif key == "order":
+            order = parse_order(value)
+        elif key == "limit":
+            limit = int(value)
+        elif key == "offset":
+            offset = int(value)
+        elif key in ("or", "and"):
+            filters.append(compile_logic(key, value[1:-1]))
+        elif key in ("columns", "on_conflict"):
+            continue
+        elif key == "user_id" and value.startswith("eq."):
+            user = unquote(value[3:])
+        elif key == "id" and value.startswith("eq."):
+            by_id = table.by_id.get(unquote(value[3:]))
+        elif key == sort_column and value.split(".")[0] in ("gt", "gte", "lt", "lte"):
+            op, _, raw = value.partition(".")
+            range_ops.append((op, target_value(sort_column, unquote(raw).strip('"'))))
+        elif key == "during" and value.startswith("ov.") and sort_column == "start_time":
+            # Computed [start_time, end_time) column: bound the start on the sorted
+            # rows (as the GiST probe would), then test the end
+            range_start, _, range_end = unquote(value[3:]).strip("[)").partition(",")
+            range_start = normalize_ts(range_start)
+            range_ops.append(("gte", (parse_ts(range_start) - MAX_ACTIVITY_SPAN).isoformat()))
+            range_ops.append(("lt", normalize_ts(range_end)))
+            filters.append(compile_condition("end_time", f"gt.{range_start}"))
+        else:
+            filters.append(compile_condition(key, value))
+
+    if by_id is not _UNSET:
+        # Primary key lookup
+        rows = [by_id] if by_id is not None and (user is None or str(by_id["user_id"]) == user) else []
+        keys = [table.key(r) for r in rows]
+    elif user is not None:
+        rows = table.rows.get(user, [])
+        keys = table.keys.get(user, [])
+    else:
+        rows = table.all_rows()
+        keys = [table.key(r) for r in rows]
+
+    # Range filters on the natural key become index bounds on the sorted rows
+    low, high = 0, len(rows)
+    for op, target in range_ops:
+        if op == "gte":
+            low = max(low, bisect_left(keys, (target,)))
+        elif op == "gt":
+            low = max(low, bisect_right(keys, (target, ID_MAX)))
+        elif op == "lt":
+            high = min(high, bisect_left(keys, (target,)))
+        elif op == "lte":
+            high = min(high, bisect_right(keys, (target, ID_MAX)))
+
+    indices = range(low, high)
+    natural = order is None or (
+        order[0] == (sort_column, order[0][1])
+        and all(o == ("id", order[0][1]) for o in order[1:2])
+        and len(order) <= 2
+    )
+    if natural:
+        # Already in order: walk the slice lazily and stop once the page is full
+        if order and order[0][1]:
+            indices = indices[::-1]
+        start = offset or 0
+        stop = None if limit is None else start + limit
+        if not filters:
+            return [rows[i] for i in indices[start:stop]], select
+        matches = (rows[i] for i in indices if all(f(rows[i]) for f in filters))
+        return list(islice(matches, start, stop)), select
+
+    result = [rows[i] for i in indices if all(f(rows[i]) for f in filters)]
+    for column, desc in reversed(order):
+        present = [r for r in result if r.get(column) is not None]
+        missing = [r for r in result if r.get(column) is None]
+        present.sort(key=lambda r: row_value(column, r[column]), reverse=desc)
+        result = present + missing
+    if offset:
+        result = result[offset:]
+    if limit is not None:
+        result = result[:limit]
+    return result, select
+
+
+def project(rows, select):
+    if select in ("*", ""):
+        return [dict(r) for r in rows]
+    cols = [c.strip() for c in select.split(",")]
+    return [{c: r.get(c) for c in cols} for r in rows]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, Nagle plus delayed
+    # ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+    store = None
+    latency = 0.0
+    error_rate = 0.0
+    stall_rate = 0.0    # share of calls that take stall_ms instead (tail latency)
+    stall_ms = 0.0
+    rpc_handlers = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._raw_body = self.rfile.read(length) if length else b""
+
+    def _body(self):
+        return json.loads(self._raw_body) if self._raw_body else None
+
+    def _send(self, status, payload=None, headers=None):
+        body = b"" if payload is None else json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _claims(self):
+        auth = self.headers.get("Authorization", "")
+        token = auth[7:] if auth.startswith("Bearer ") else ""
+        try:
+            return jwt.decode(token, JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+        except jwt.InvalidTokenError:
+            return None
+
+    def _dispatch(self, method):
+        # Always drain the body, or a keep-alive connection desyncs
+        self._read_body()
+        parts = urlsplit(self.path)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        path = parts.path
+
+        if path.startswith("/__bench/"):
+            return self._bench(method, path)
+        if self.stall_rate and random.random() < self.stall_rate:
+            time.sleep(self.stall_ms / 1000)
+        elif self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.store.record("error")
+            return self._send(503, {"message": "injected failure"})
+
+        if path.startswith("/auth/v1/"):
+            return self._auth(method, path)
+        if not path.startswith("/rest/v1/"):
+            return self._send(404, {"message": "not found"})
+
+        name = path[len("/rest/v1/"):]
+        claims = self._claims()
+        if name.startswith("rpc/"):
+            self.store.record("rpc")
+            handler = self.rpc_handlers.get(name[4:])
+            if handler is None:
+                return self._send(404, {"message": f"function {name[4:]} not found"})
+            return self._send(200, handler(self.store, claims, self._body() or {}))
+
+        if name not in self.store.tables:
+            return self._send(404, {"message": f"relation {name} does not exist"})
+        table = self.store.tables[name]
+        prefer = self.headers.get("Prefer", "")
+        with self.store.lock:
+            if method == "GET":
+                self.store.record("select")
+                result, select = apply_query(table, params)
+                return self._send(200, project(result, select))
+            if method == "POST":
+                body = self._body()
+                payload = body if isinstance(body, list) else [body]
+                upsert = "resolution=" in prefer
+                ignore = "resolution=ignore-duplicates" in prefer
+                self.store.record("upsert" if upsert else "insert")
+                conflict = dict(params).get("on_conflict")
+                out = []
+                for item in payload:
+                    item = dict(item)
+                    if upsert and conflict:
+                        keys = conflict.split(",")
+                        candidates = table.rows.get(str(item.get("user_id")), [])
+                        existing = next((r for r in candidates if all(str(r.get(k)) == str(item.get(k)) for k in keys)), None)
+                        if existing is not None:
+                            # ON CONFLICT DO NOTHING returns only the rows it inserted
+                            if not ignore:
+                                out.append(dict(self.store.update(name, existing, item)))
+                            continue
+                    out.append(dict(self.store.insert(name, item)))
+                return self._send(201, out if "return=representation" in prefer else None)
+            if method == "DELETE":
+                self.store.record("delete")
+                result, _ = apply_query(table, params)
+                self.store.remove(name, result)
+                return self._send(200, [dict(r) for r in result] if "return=representation" in prefer else None)
+            if method == "PATCH":
+                self.store.record("update")
+                body = self._body()
+                result, _ = apply_query(table, params)
+                updated = [dict(self.store.update(name, r, body)) for r in result]
+                return self._send(200, updated)
+        return self._send(405, {"message": "method not allowed"})
+
+    def _bench(self, method, path):
+        # Control endpoints for the harness; never counted as upstream calls
+        if path == "/__bench/stats":
+            with self.store.lock:
+                return self._send(200, {
+                    "calls": self.store.calls,
+                    "by_kind": dict(self.store.calls_by_kind),
+                    "rows": {name: len(t) for name, t in self.store.tables.items()},
+                })
+        if path == "/__bench/reset" and method == "POST":
+            self.store.reset_counters()
+            return self._send(200, {"calls": 0})
+        if path == "/__bench/faults" and method == "POST":
+            # Same knobs as the command line, for every later call: {"error_rate": 1} is an outage
+            cls = type(self)
+            for name, value in (self._body() or {}).items():
+                if name == "latency_ms":
+                    cls.latency = float(value) / 1000
+                elif name in ("error_rate", "stall_rate", "stall_ms"):
+                    setattr(cls, name, float(value))
+            return self._send(200, {"latency_ms": cls.latency * 1000, "error_rate": cls.error_rate,
+                                    "stall_rate": cls.stall_rate, "stall_ms": cls.stall_ms})
+        return self._send(404, {"message": "not found"})
+
+    def _auth(self, method, path):
+        self.store.record("auth")
+        if path == "/auth/v1/user":
+            claims = self._claims()
+            if not claims:
+                return self._send(401, {"message": "invalid JWT"})
+            return self._send(200, user_payload(claims["sub"], claims.get("email")))
+        if path == "/auth/v1/token":
+            body = self._body() or {}
+            email = body.get("email", "")
+            user_id = BENCH_USER_ID if email == BENCH_EMAIL else str(uuid.uuid5(uuid.NAMESPACE_DNS, email))
+            return self._send(200, {
+                "access_token": mint_token(user_id, email), "token_type": "bearer", "expires_in": 3600,
+                "expires_at": int(time.time()) + 3600, "refresh_token": "refresh",
+                "user": user_payload(user_id, email),
+            })
+        return self._send(404, {"message": "not found"})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_HEAD(self):
+        self._dispatch("GET")
+
+
+def rpc_get_xp_summary(store, claims, params):
+    today = params.get("p_today") or datetime.now(timezone.utc).date().isoformat()
+    month = today[:8] + "01"
+    user = claims["sub"] if claims else None
+    total = monthly = today_xp = 0.0
+    skills = {}
+    with store.lock:
+        for (owner, day, category), xp in store.xp_daily.items():
+            if owner != user:
+                continue
+            total += xp
+            monthly += xp if day >= month else 0
+            today_xp += xp if day == today else 0
+            skills[category] = skills.get(category, 0) + xp
+    return {"total": total, "monthly": monthly, "today": today_xp, "skills": skills}
+
+
+def rpc_log_activity(store, claims, params):
+    user_id = claims["sub"]
+    start = normalize_ts(params["p_start_time"])
+    end = normalize_ts(params["p_end_time"])
+    with store.lock:
+        categories = store.tables["categories"]
+        cat = next((c for c in categories.rows.get(user_id, []) if c["name"] == params["p_category"]), None)
+        if cat is None:
+            cat = store.insert("categories", {
+                "user_id": user_id, "name": params["p_category"],
+                "xp_multiplier": DEFAULT_MULTIPLIERS.get(params["p_category"], 1.0),
+            })
+        activities = store.tables["activities"]
+        rows = activities.rows.get(user_id, [])
+        keys = activities.keys.get(user_id, [])
+        earliest = (parse_ts(start) - MAX_ACTIVITY_SPAN).isoformat()
+        lo, hi = bisect_left(keys, (earliest,)), bisect_left(keys, (end,))
+        overlapping = [r for r in rows[lo:hi] if r.get("end_time") and r["end_time"] > start]
+        store.remove("activities", overlapping)
+        minutes = (parse_ts(end) - parse_ts(start)).total_seconds() / 60
+        row = store.insert("activities", {
+            "id": params.get("p_id") or str(uuid.uuid4()),
+            "user_id": user_id, "category": params["p_category"], "start_time": start, "end_time": end,
+            "xp_earned": round(minutes * float(cat["xp_multiplier"]), 2),
+        })
+        return dict(row)
+
+
+def rpc_import_activities(store, claims, params):
+    user_id = claims["sub"]
+    with store.lock:
+        activities = store.tables["activities"]
+        rows = activities.rows.get(user_id, [])
+        keys = activities.keys.get(user_id, [])
+        replaced = {}
+        for span in params["p_spans"]:
+            start, end = normalize_ts(span["start_time"]), normalize_ts(span["end_time"])
+            earliest = (parse_ts(start) - MAX_ACTIVITY_SPAN).isoformat()
+            lo, hi = bisect_left(keys, (earliest,)), bisect_left(keys, (end,))
+            for r in rows[lo:hi]:
+                if r.get("end_time") and r["end_time"] > start:
+                    replaced[r["id"]] = r
+        if not params.get("p_dry_run"):
+            store.remove("activities", list(replaced.values()))
+            for row in params["p_rows"]:
+                store.insert("activities", {
+                    "id": str(uuid.uuid4()), "user_id": user_id, "category": row["category"],
+                    "start_time": normalize_ts(row["start_time"]), "end_time": normalize_ts(row["end_time"]),
+                    "xp_earned": row["xp_earned"],
+                })
+        return [{"id": row_id} for row_id in replaced]
+
+
+def rpc_check_user_xp_daily(store, claims, params):
+    return []
+
+
+def rpc_backfill_user_xp_daily(store, claims, params):
+    with store.lock:
+        return sum(1 for key in store.xp_daily if key[0] == claims["sub"])
+
+
+DEFAULT_RPCS = {
+    "log_activity": rpc_log_activity,
+    "import_activities": rpc_import_activities,
+    "get_xp_summary": rpc_get_xp_summary,
+    "check_user_xp_daily": rpc_check_user_xp_daily,
+    "backfill_user_xp_daily": rpc_backfill_user_xp_daily,
+}
+
+
+def user_payload(user_id, email):
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": user_id, "aud": "authenticated", "role": "authenticated", "email": email,
+        "app_metadata": {}, "user_metadata": {}, "created_at": now, "updated_at": now,
+    }
+
+
+def mint_token(user_id, email=None, ttl=3600):
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": user_id, "email": email, "aud": "authenticated", "role": "authenticated", "iat": now, "exp": now + ttl},
+        JWT_SECRET, algorithm="HS256",
+    )
+
+
+def synthetic_rows(activities, user_id=BENCH_USER_ID, now=None, seed=0):
+    """
+    Deterministic history ending yesterday: `activities` activities at 16 per
+    day (30 minutes every 90), plus one sleep log and one finance row per day.
+    Yields (table, rows) with rows already in key order.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    per_day = 16
+    days = max(1, -(-activities // per_day))
+    first = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    created = now.isoformat()
+    categories = list(DEFAULT_MULTIPLIERS)
+
+    yield "categories", [{
+        "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": user_id, "name": name,
+        "xp_multiplier": m, "is_default": True, "created_at": created,
+    } for name, m in sorted(DEFAULT_MULTIPLIERS.items())]
+
+    batch = []
+    for i in range(activities):
+        start = first + timedelta(minutes=90 * i)
+        end = start + timedelta(minutes=30)
+        category = categories[rng.randrange(len(categories) - 1)]
+        batch.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": user_id, "category": category,
+            "start_time": start.isoformat(), "end_time": end.isoformat(), "duration_minutes": 30,
+            "xp_earned": round(30 * DEFAULT_MULTIPLIERS[category], 2), "created_at": created,
+            "updated_at": created,
+        })
+        if len(batch) == 10000:
+            yield "activities", batch
+            batch = []
+    if batch:
+        yield "activities", batch
+
+    sleep, finance = [], []
+    for d in range(days):
+        night = first + timedelta(days=d, hours=22, minutes=rng.randrange(-60, 90))
+        wake = night + timedelta(minutes=rng.randrange(330, 540))
+        sleep.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": user_id,
+            "sleep_time": night.isoformat(), "wake_time": wake.isoformat(),
+            "duration_minutes": round((wake - night).total_seconds() / 60),
+            "quality": rng.randint(1, 5), "created_at": created,
+            "updated_at": created,
+        })
+        income, expense = round(rng.uniform(0, 300), 2), round(rng.uniform(0, 200), 2)
+        finance.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": user_id,
+            "date": (first + timedelta(days=d)).date().isoformat(),
+            "income": income, "expense": expense, "net": round(income - expense, 2), "created_at": created,
+            "updated_at": created,
+        })
+    yield "sleep_logs", sleep
+    yield "daily_finance", finance
+
+
+def seed(store, activities, user_id=BENCH_USER_ID):
+    with store.lock:
+        for table, rows in synthetic_rows(activities, user_id):
+            store.tables[table].extend_sorted(user_id, rows)
+            if table == "activities":
+                for row in rows:
+                    store._rollup(row, 1)
+
+
+class BenchHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 resets connections when hundreds of clients connect at once
+    request_queue_size = 2048
+
+
+def start_server(host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, rpc_handlers=None, store=None,
+                 stall_rate=0.0, stall_ms=0.0):
+    store = store or Store()
+    handler = type("BoundHandler", (Handler,), {
+        "store": store, "latency": latency, "error_rate": error_rate,
+        "stall_rate": stall_rate, "stall_ms": stall_ms,
+        "rpc_handlers": {**DEFAULT_RPCS, **(rpc_handlers or {})},
+    })
+    server = BenchHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Supabase (GoTrue + PostgREST) for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--stall-rate", type=float, default=0, help="share of calls delayed by --stall-ms")
+    parser.add_argument("--stall-ms", type=float, default=0)
+    parser.add_argument("--seed-activities", type=int, default=0)
+    args = parser.parse_args()
+
+    store = Store()
+    if args.seed_activities:
+        seed(store, args.seed_activities)
+    server, _ = start_server(args.host, args.port, args.latency_ms / 1000, args.error_rate, store=store,
+                             stall_rate=args.stall_rate, stall_ms=args.stall_ms)
+    # The harness reads this line to find the port
+    print(f"listening http://{args.host}:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
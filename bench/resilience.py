@@ -0,0 +1,186 @@
+"""
+Resilience benchmark: the app against the Supabase stand-in with injected
+latency, errors, stalls and an outage, once with the resilience layer
+(app/utils/resilience.py) as configured and once with it switched off:
+
+    python -m bench.resilience
+    python -m bench.resilience --only coalesce,outage --out resilience_results.json
+
+coalesce  identical uncached summary reads from many tabs at once: upstream calls per request
+errors    a share of PostgREST calls answer 503: requests that still succeed
+tail      a share of calls stall: p50/p99 with and without a hedged second request
+outage    PostgREST fails every call: how fast requests fail, then how soon they recover
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+
+from bench.fake_supabase import BENCH_EMAIL, BENCH_USER_ID, JWT_SECRET, mint_token
+from bench.run import Client, percentile, reset_upstream, start_process, upstream_stats
+
+# The resilience layer with everything off, as before it existed
+BASELINE = {"SUPABASE_SINGLE_FLIGHT": "false", "SUPABASE_RETRIES": "0", "SUPABASE_HEDGE_MS": "0",
+            "SUPABASE_BREAKER_FAILURES": "0"}
+
+
+def set_faults(fake, **faults):
+    conn = http.client.HTTPConnection(*fake)
+    conn.request("POST", "/__bench/faults", json.dumps(faults), {"Content-Type": "application/json"})
+    conn.getresponse().read()
+
+
+def drive(app, token, paths, concurrency):
+    """GETs every path with `concurrency` clients; returns (statuses, latencies in ms)."""
+    statuses, latencies = [], []
+    counter = iter(range(len(paths)))
+    lock = threading.Lock()
+
+    def worker():
+        client = Client(*app, token)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            status, _, _ = client.request("GET", paths[i])
+            with lock:
+                statuses.append(status)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses, sorted(latencies)
+
+
+def summarize(statuses, latencies):
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        "requests": len(statuses),
+        "ok": round(statuses.count(200) / len(statuses), 3),
+        "statuses": counts,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+def coalesce(app, fake, token, args):
+    set_faults(fake, latency_ms=100)
+    reset_upstream(fake)
+    rounds = []
+    for _ in range(args.rounds):
+        # Every round is a burst of identical reads, like a dashboard open in many tabs
+        rounds.append(drive(app, token, ["/api/stats/summary"] * args.concurrency, args.concurrency))
+    statuses = [s for r in rounds for s in r[0]]
+    result = summarize(statuses, sorted(ms for r in rounds for ms in r[1]))
+    result["upstream_calls_per_request"] = round(upstream_stats(fake)["calls"] / len(statuses), 2)
+    return result
+
+
+def errors(app, fake, token, args):
+    set_faults(fake, latency_ms=5, error_rate=args.error_rate)
+    # Distinct queries, so coalescing plays no part
+    paths = [f"/api/activities?limit={20 + i % 80}" for i in range(args.requests)]
+    return summarize(*drive(app, token, paths, args.concurrency))
+
+
+def tail(app, fake, token, args):
+    set_faults(fake, latency_ms=10, stall_rate=args.stall_rate, stall_ms=args.stall_ms)
+    paths = [f"/api/activities?limit={20 + i % 80}" for i in range(args.requests)]
+    return summarize(*drive(app, token, paths, args.concurrency))
+
+
+def outage(app, fake, token, args):
+    set_faults(fake, latency_ms=5, error_rate=1)
+    paths = [f"/api/activities?limit={20 + i % 80}" for i in range(args.requests)]
+    result = summarize(*drive(app, token, paths, args.concurrency))
+    reset_upstream(fake)
+    drive(app, token, paths[:20], 1)
+    result["upstream_calls_per_request_during_outage"] = round(upstream_stats(fake)["calls"] / 20, 2)
+
+    set_faults(fake, error_rate=0)
+    started = time.perf_counter()
+    client = Client(*app, token)
+    while client.request("GET", "/api/activities?limit=10")[0] != 200:
+        time.sleep(0.05)
+    result["recovered_after_s"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+CASES = {"coalesce": coalesce, "errors": errors, "tail": tail, "outage": outage}
+
+
+def run_case(name, resilient, args):
+    fake_proc, fake_host, fake_port = start_process(["-m", "bench.fake_supabase", "--port", "0",
+                                                     "--seed-activities", str(args.activities)])
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://{fake_host}:{fake_port}",
+        "SUPABASE_KEY": mint_token("anon", ttl=86400),
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "ADMIN_EMAIL": BENCH_EMAIL,
+        "LIFEIO_STATE_DIR": tempfile.mkdtemp(prefix="lifeio-bench-"),
+        "STATS_CACHE_SIZE": "0",
+        "SUPABASE_POOL_SIZE": str(args.concurrency),
+        "SUPABASE_BREAKER_COOLDOWN": str(args.cooldown),
+        "SUPABASE_HEDGE_MS": str(args.hedge_ms),
+        "FLASK_DEBUG": "False",
+    }
+    if not resilient:
+        env.update(BASELINE)
+    app_proc = None
+    try:
+        app_proc, app_host, app_port = start_process(
+            ["-m", "bench.app_server", "--port", "0", "--mode", args.server], env=env)
+        token = mint_token(BENCH_USER_ID, BENCH_EMAIL, ttl=86400)
+        # Fills the connection pool and finishes lazy imports before anything is timed
+        drive((app_host, app_port), token, ["/api/activities?limit=10"] * args.concurrency * 4, args.concurrency)
+        return CASES[name]((app_host, app_port), (fake_host, fake_port), token, args)
+    finally:
+        for proc in (app_proc, fake_proc):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", type=lambda s: s.split(","), default=list(CASES), help="comma-separated cases")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi")
+    parser.add_argument("--activities", type=int, default=2000, help="seeded history")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=20, help="bursts in the coalesce case")
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall-ms", type=float, default=1000)
+    parser.add_argument("--hedge-ms", type=float, default=100, help="SUPABASE_HEDGE_MS for the resilient runs")
+    parser.add_argument("--cooldown", type=float, default=2, help="SUPABASE_BREAKER_COOLDOWN")
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.only:
+        report[name] = {mode: run_case(name, mode == "resilient", args) for mode in ("baseline", "resilient")}
+        for mode, result in report[name].items():
+            extra = {k: v for k, v in result.items() if k not in ("requests", "ok", "statuses", "p50_ms", "p99_ms")}
+            print(f"{name:<9}{mode:<10} ok {result['ok']:>6.1%}  p50 {result['p50_ms']:>8.1f} ms  "
+                  f"p99 {result['p99_ms']:>8.1f} ms  {result['statuses']}  {extra or ''}", flush=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+Endpoint benchmark: starts the fake Supabase (bench/fake_supabase.py) seeded
+with N activities, starts create_app() against it, drives every route with
+concurrent keep-alive clients and reports p50/p95/p99 latency, throughput,
+upstream calls per request and peak RSS as JSON.
+
+    python -m bench.run --volumes 1k,100k,1m --latency-ms 20 --concurrency 8 --out bench.json
+
+Upstream calls are counted by the stand-in, so N+1 query patterns show up
+as calls/request growing with data volume.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench.fake_supabase import BENCH_EMAIL, BENCH_USER_ID, JWT_SECRET, mint_token, synthetic_rows
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOLUME_SUFFIXES = {"k": 1000, "m": 1000000}
+
+
+def parse_volume(text):
+    text = text.strip().lower()
+    if text[-1] in VOLUME_SUFFIXES:
+        return int(float(text[:-1]) * VOLUME_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb(pid):
+    """VmHWM (peak resident set) of a child process; Linux only."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def start_process(args, env=None, timeout=600):
+    """Starts a child that prints "listening http://host:port" once ready."""
+    proc = subprocess.Popen(
+        [sys.executable, *args], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        line = proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"{args[1]} exited with {proc.wait()}")
+        if line.startswith("listening "):
+            # Keep draining: a child logging to a full pipe (e.g. error tracebacks) would block
+            threading.Thread(target=proc.stdout.read, daemon=True).start()
+            host, port = line.split("//", 1)[1].strip().rsplit(":", 1)
+            return proc, host, int(port)
+    proc.kill()
+    raise RuntimeError(f"{args[1]} did not start within {timeout}s")
+
+
+def seed_sqlite(path, activities):
+    from app.repositories.sqlite_repo import SQLiteDatabase
+    db = SQLiteDatabase(path)
+    with db.transaction() as conn:
+        for table, rows in synthetic_rows(activities):
+            # Generated columns are computed by SQLite itself
+            columns = [c for c in rows[0] if c not in ("duration_minutes", "net")]
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(row[c] for c in columns) for row in rows]
+            )
+
+
+class Client:
+    def __init__(self, host, port, token):
+        self.host, self.port = host, port
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = {**self.headers, **(headers or {})}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=300)
+            try:
+                self.conn.request(method, path, payload, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, response.headers, data
+            except (http.client.HTTPException, ConnectionError):
+                # The server may close an idle keep-alive connection; retry once
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+
+class Scenario:
+    def __init__(self, name, method, path, body=None, expect=(200,), requests=None, headers=None):
+        self.name = name
+        self.method = method
+        self.path = path          # str or callable(i, ctx)
+        self.body = body          # None, value or callable(i, ctx)
+        self.expect = expect
+        self.requests = requests  # overrides --requests (e.g. for heavy exports)
+        self.headers = headers    # None, dict or callable(ctx)
+
+    def build(self, i, ctx):
+        path = self.path(i, ctx) if callable(self.path) else self.path
+        body = self.body(i, ctx) if callable(self.body) else self.body
+        headers = self.headers(ctx) if callable(self.headers) else self.headers
+        return path, body, headers
+
+
+def future_slot(i, minutes=30):
+    # Far from the seeded history, one slot per request, never crossing midnight
+    day = datetime(2100, 1, 1, tzinfo=timezone.utc) + timedelta(days=i // 20)
+    start = day + timedelta(minutes=60 * (i % 20))
+    return start, start + timedelta(minutes=minutes)
+
+
+def activity_body(i, ctx):
+    start, end = future_slot(i)
+    return {"category": "Work", "start_time": start.isoformat(), "end_time": end.isoformat()}
+
+
+def bulk_body(i, ctx):
+    base = 100000 + i * 200
+    return [activity_body(base + k, ctx) for k in range(200)]
+
+
+def sleep_body(i, ctx):
+    night = datetime(2100, 1, 1, 22, tzinfo=timezone.utc) + timedelta(days=i)
+    return {"sleep_time": night.isoformat(), "wake_time": (night + timedelta(hours=7)).isoformat(), "quality": i % 5 + 1}
+
+
+def finance_body(i, ctx):
+    return {"date": (datetime(2100, 1, 1) + timedelta(days=i)).date().isoformat(), "income": 100, "expense": 42.5}
+
+
+def take_id(kind):
+    def path(i, ctx):
+        ids = ctx["created"][kind]
+        return f"/api/{kind}/{ids[i % len(ids)]}" if ids else f"/api/{kind}/00000000-0000-0000-0000-000000000000"
+    return path
+
+
+def scenarios(export_requests):
+    # Reads first (caches warm after the first request), then writes, which
+    # invalidate caches, then deletes of the rows the writes created
+    return [
+        Scenario("health", "GET", "/api/health"),
+        Scenario("page_login", "GET", "/"),
+        Scenario("page_dashboard", "GET", "/dashboard"),
+        Scenario("auth_me", "GET", "/api/auth/me"),
+        Scenario("auth_login", "POST", "/api/auth/login", {"email": BENCH_EMAIL, "password": "bench"}),
+        Scenario("auth_logout", "POST", "/api/auth/logout"),
+        Scenario("activities_list", "GET", "/api/activities?limit=100"),
+        Scenario("activities_list_page2", "GET", lambda i, ctx: ctx["activities_page2"]),
+        Scenario("sleep_list", "GET", "/api/sleep?limit=100"),
+        Scenario("finance_list", "GET", "/api/finance?limit=100"),
+        Scenario("stats_summary", "GET", "/api/stats/summary"),
+        Scenario("stats_skills", "GET", "/api/stats/skills"),
+        Scenario("stats_finance", "GET", "/api/stats/finance"),
+        Scenario("stats_finance_monthly", "GET", lambda i, ctx: f"/api/stats/finance?granularity=month&from={ctx['year_ago']}"),
+        Scenario("stats_timeseries", "GET", "/api/stats/timeseries?tz=Europe/Berlin"),
+        Scenario("sleep_analytics", "GET", "/api/sleep/analytics"),
+        Scenario("dashboard", "GET", "/api/dashboard"),
+        Scenario("dashboard_revalidate", "GET", "/api/dashboard", expect=(304,),
+                 headers=lambda ctx: {"If-None-Match": ctx["dashboard_etag"]}),
+        Scenario("sync_first_page", "GET", "/api/sync?shape=columns"),
+        Scenario("rollup_check", "GET", "/api/stats/rollup/check"),
+        Scenario("export_ndjson", "GET", "/api/export?format=ndjson", requests=export_requests),
+        Scenario("export_csv_gzip", "GET", "/api/export?format=csv&gzip=1", requests=export_requests),
+        Scenario("activities_create", "POST", "/api/activities", activity_body, expect=(201,)),
+        Scenario("activities_bulk", "POST", "/api/activities/bulk", bulk_body, expect=(201,), requests=export_requests),
+        Scenario("sleep_create", "POST", "/api/sleep", sleep_body, expect=(201,)),
+        Scenario("finance_upsert", "POST", "/api/finance", finance_body, expect=(201,)),
+        Scenario("dashboard_after_writes", "GET", "/api/dashboard"),
+        Scenario("rollup_backfill", "POST", "/api/stats/rollup/backfill", requests=export_requests),
+        Scenario("activities_delete", "DELETE", take_id("activities")),
+        Scenario("sleep_delete", "DELETE", take_id("sleep")),
+        Scenario("finance_delete", "DELETE", take_id("finance")),
+    ]
+
+
+CREATED_KIND = {"activities_create": "activities", "sleep_create": "sleep", "finance_upsert": "finance"}
+
+
+def upstream_stats(fake):
+    conn = http.client.HTTPConnection(*fake)
+    conn.request("GET", "/__bench/stats")
+    return json.loads(conn.getresponse().read())
+
+
+def reset_upstream(fake):
+    conn = http.client.HTTPConnection(*fake)
+    conn.request("POST", "/__bench/reset")
+    conn.getresponse().read()
+
+
+def run_scenario(scenario, app, fake, token, ctx, requests, concurrency):
+    reset_upstream(fake)
+    latencies = []
+    errors = []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    created = ctx["created"].get(CREATED_KIND.get(scenario.name))
+
+    def worker():
+        client = Client(*app, token)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            path, body, headers = scenario.build(i, ctx)
+            started = time.perf_counter()
+            try:
+                status, _, data = client.request(scenario.method, path, body, headers)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status not in scenario.expect:
+                    errors.append(f"{status} {data[:200]!r}")
+                elif created is not None:
+                    created.append(json.loads(data)["id"])
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(min(concurrency, requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    upstream = upstream_stats(fake)
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "name": scenario.name,
+        "method": scenario.method,
+        "path": scenario.path if isinstance(scenario.path, str) else None,
+        "requests": requests,
+        "concurrency": min(concurrency, requests),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "p50_ms": round(percentile(ms, 50), 2) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 2) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 2) if ms else None,
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "upstream_calls_per_request": round(upstream["calls"] / requests, 2),
+        "upstream_by_kind": upstream["by_kind"],
+    }
+
+
+def prepare_context(app, token):
+    client = Client(*app, token)
+    ctx = {
+        "created": {"activities": [], "sleep": [], "finance": []},
+        "year_ago": (datetime.now(timezone.utc) - timedelta(days=365)).date().isoformat(),
+    }
+    _, headers, _ = client.request("GET", "/api/activities?limit=100")
+    cursor = headers.get("X-Next-Cursor")
+    ctx["activities_page2"] = f"/api/activities?limit=100&cursor={cursor}" if cursor else "/api/activities?limit=100"
+    _, headers, _ = client.request("GET", "/api/dashboard")
+    ctx["dashboard_etag"] = headers.get("ETag", "")
+    return ctx
+
+
+def run_volume(volume, args):
+    state_dir = tempfile.mkdtemp(prefix="lifeio-bench-")
+    seed_fake = volume if args.storage == "supabase" else 0
+    fake_proc, fake_host, fake_port = start_process([
+        "-m", "bench.fake_supabase", "--port", "0", "--latency-ms", str(args.latency_ms),
+        "--seed-activities", str(seed_fake),
+    ])
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://{fake_host}:{fake_port}",
+        "SUPABASE_KEY": mint_token("anon", ttl=86400),
+        "ADMIN_EMAIL": BENCH_EMAIL,
+        "LIFEIO_STATE_DIR": state_dir,
+        "LIFEIO_STORAGE": args.storage,
+        "LIFEIO_SQLITE_PATH": os.path.join(state_dir, "lifeio.db"),
+        "FLASK_DEBUG": "False",
+    }
+    if args.stats_cache_size is not None:
+        env["STATS_CACHE_SIZE"] = str(args.stats_cache_size)
+    if args.remote_auth:
+        env.pop("SUPABASE_JWT_SECRET", None)
+    else:
+        env["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    if args.storage == "sqlite":
+        seed_sqlite(env["LIFEIO_SQLITE_PATH"], volume)
+
+    app_proc = None
+    try:
+        app_proc, app_host, app_port = start_process(
+            ["-m", "bench.app_server", "--port", "0", "--mode", args.server], env=env
+        )
+        app, fake = (app_host, app_port), (fake_host, fake_port)
+        token = mint_token(BENCH_USER_ID, BENCH_EMAIL, ttl=86400)
+        ctx = prepare_context(app, token)
+
+        routes = []
+        for scenario in scenarios(args.export_requests):
+            if args.only and scenario.name not in args.only:
+                continue
+            requests = scenario.requests or args.requests
+            result = run_scenario(scenario, app, fake, token, ctx, requests, args.concurrency)
+            routes.append(result)
+            print(f"  {volume:>8} {result['name']:<24} p50 {result['p50_ms']:>9} ms  p99 {result['p99_ms']:>9} ms  "
+                  f"{result['throughput_rps']:>7} req/s  {result['upstream_calls_per_request']:>6} up/req  "
+                  f"{result['errors']} err", flush=True)
+        return {
+            "activities": volume,
+            "storage": args.storage,
+            "peak_rss_mb": peak_rss_mb(app_proc.pid),
+            "stand_in_peak_rss_mb": peak_rss_mb(fake_proc.pid),
+            "routes": routes,
+        }
+    finally:
+        for proc in (app_proc, fake_proc):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LifeIO endpoint benchmark")
+    parser.add_argument("--volumes", default="1k,100k,1m", help="comma-separated activity counts (k/m suffixes)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="injected upstream latency per call")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--export-requests", type=int, default=4, help="requests for export/bulk/backfill routes")
+    parser.add_argument("--storage", choices=("supabase", "sqlite"), default="supabase")
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi", help="serve main:app or asgi:app")
+    parser.add_argument("--remote-auth", action="store_true", help="verify tokens via GoTrue instead of locally")
+    parser.add_argument("--stats-cache-size", type=int, help="STATS_CACHE_SIZE for the app (0 = every request goes upstream)")
+    parser.add_argument("--only", type=lambda s: set(s.split(",")), help="comma-separated scenario names")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args()
+
+    results = []
+    for volume in [parse_volume(v) for v in args.volumes.split(",")]:
+        print(f"volume {volume} ({args.server}, {args.storage}, {args.latency_ms} ms upstream latency)", flush=True)
+        results.append(run_volume(volume, args))
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "latency_ms": args.latency_ms,
+            "concurrency": args.concurrency,
+            "requests_per_route": args.requests,
+            "storage": args.storage,
+            "server": args.server,
+            "remote_auth": args.remote_auth,
+            "stats_cache_size": args.stats_cache_size,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
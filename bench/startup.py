@@ -0,0 +1,104 @@
+"""
+Cold-start report: how long a fresh interpreter takes to import main and
+build the app, and which packages that time goes to (from
+`python -X importtime`). Also times the Supabase client libraries, which
+the app only imports on first use (or in a --preload master).
+
+    python bench/startup.py                  # report
+    python bench/startup.py --budget-ms 400  # exit 1 if the median boot is over budget (CI)
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT = """
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.app
+built = time.perf_counter()
+print(f"{(imported - started) * 1000:.1f} {(built - imported) * 1000:.1f}")
+"""
+
+DEFERRED = """
+import time
+started = time.perf_counter()
+from app.utils.supabase_client import import_client_libraries
+import_client_libraries()
+print(f"{(time.perf_counter() - started) * 1000:.1f}")
+"""
+
+
+def boot_env():
+    env = dict(os.environ)
+    # create_app() only checks that these are set; nothing connects at boot
+    env.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+    env.setdefault("SUPABASE_KEY", "startup-report")
+    return env
+
+
+def run(code, importtime=False):
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(args, cwd=ROOT, env=boot_env(), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"startup run failed:\n{result.stderr[-2000:]}")
+    return result.stdout.split(), result.stderr
+
+
+def import_breakdown(stderr):
+    """Self time in ms per top-level package."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us.split(":")[1]) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def time_boot(runs):
+    """(import ms, create_app ms) for each of `runs` fresh interpreters."""
+    timings = []
+    for _ in range(runs):
+        (imported, built), _ = run(BOOT)
+        timings.append((float(imported), float(built)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--budget-ms", type=float, help="fail if the median import + create_app exceeds this")
+    args = parser.parse_args()
+
+    timings = time_boot(args.runs)
+    imports, builds = [i for i, _ in timings], [b for _, b in timings]
+    boot = statistics.median(i + b for i, b in timings)
+    deferred = statistics.median(float(run(DEFERRED)[0][0]) for _ in range(args.runs))
+    _, stderr = run(BOOT, importtime=True)
+
+    print(f"import main        {statistics.median(imports):7.1f} ms")
+    print(f"create_app()       {statistics.median(builds):7.1f} ms")
+    print(f"boot total         {boot:7.1f} ms  (median of {args.runs})")
+    print(f"deferred clients   {deferred:7.1f} ms  (supabase/postgrest, first use or --preload master)")
+    print()
+    print("self time by package (one -X importtime run):")
+    for package, ms in import_breakdown(stderr)[:args.top]:
+        print(f"  {package:<24}{ms:7.1f} ms")
+
+    if args.budget_ms is not None:
+        if boot > args.budget_ms:
+            print(f"\nFAIL: boot {boot:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+            sys.exit(1)
+        print(f"\nOK: boot {boot:.1f} ms within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
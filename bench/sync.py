@@ -0,0 +1,142 @@
+"""
+Delta sync benchmark: bytes on the wire (gzip) for a dashboard kept as an
+IndexedDB replica through GET /api/sync (app/utils/sync.py), on the first
+visit and on repeat visits after a few writes, next to the summary-only
+/api/dashboard and the full activity history a plain client cache would
+refetch:
+
+    python -m bench.sync
+    python -m bench.sync --volumes 1k,100k --writes 0,10,100 --out sync_results.json
+"""
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from bench.fake_supabase import BENCH_EMAIL, BENCH_USER_ID, JWT_SECRET, mint_token
+from bench.run import Client, activity_body, finance_body, parse_volume, start_process
+
+# Short, so a repeat visit does not re-read the seconds-old writes just made
+OVERLAP_SECONDS = 1
+
+
+def get(client, path):
+    status, headers, data = client.request("GET", path, headers={"Accept-Encoding": "gzip"})
+    body = gzip.decompress(data) if headers.get("Content-Encoding") == "gzip" else data
+    return status, len(data), json.loads(body) if status == 200 else None
+
+
+def visit(client, cursor):
+    """Syncs until caught up; returns (cursor, bytes, requests, rows received)."""
+    sent = requests = rows = 0
+    while True:
+        path = "/api/sync?shape=columns" + (f"&since={cursor}" if cursor else "")
+        status, size, body = get(client, path)
+        assert status == 200, (status, path)
+        sent += size
+        requests += 1
+        rows += sum(len(t["rows"]) for t in body["changes"].values())
+        rows += sum(len(ids) for ids in body["deleted"].values())
+        cursor = body["cursor"]
+        if not body["more"]:
+            return cursor, sent, requests, rows
+
+
+def history_bytes(client):
+    """What refetching every activity costs: the keyset pages of /api/activities."""
+    sent, cursor = 0, None
+    while True:
+        path = "/api/activities?limit=1000&shape=columns" + (f"&cursor={cursor}" if cursor else "")
+        status, headers, data = client.request("GET", path, headers={"Accept-Encoding": "gzip"})
+        assert status == 200, status
+        sent += len(data)
+        cursor = headers.get("X-Next-Cursor")
+        if not cursor:
+            return sent
+
+
+def run_volume(volume, args):
+    fake_proc, fake_host, fake_port = start_process(["-m", "bench.fake_supabase", "--port", "0",
+                                                     "--seed-activities", str(volume)])
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://{fake_host}:{fake_port}",
+        "SUPABASE_KEY": mint_token("anon", ttl=86400),
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "ADMIN_EMAIL": BENCH_EMAIL,
+        "LIFEIO_STATE_DIR": tempfile.mkdtemp(prefix="lifeio-bench-"),
+        "LIFEIO_SYNC_OVERLAP": str(OVERLAP_SECONDS),
+        "FLASK_DEBUG": "False",
+    }
+    app_proc = None
+    try:
+        app_proc, app_host, app_port = start_process(["-m", "bench.app_server", "--port", "0"], env=env)
+        client = Client(app_host, app_port, mint_token(BENCH_USER_ID, BENCH_EMAIL, ttl=86400))
+        report = {
+            "activities": volume,
+            "dashboard_bytes": get(client, "/api/dashboard")[1],
+            "history_bytes": history_bytes(client),
+        }
+
+        # Seeded rows are only just written; let them age past the overlap like a real history
+        time.sleep(OVERLAP_SECONDS * 1.5)
+        started = time.perf_counter()
+        cursor, sent, requests, rows = visit(client, None)
+        report["first_visit"] = {"bytes": sent, "requests": requests, "rows": rows,
+                                 "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        report["repeat_visits"] = []
+        written = 0
+        for writes in args.writes:
+            time.sleep(OVERLAP_SECONDS * 1.5)
+            for i in range(writes):
+                # Mostly activities, some finance upserts, one delete per ten
+                if i % 10 == 9:
+                    status, _, data = client.request("POST", "/api/activities", activity_body(written + i, None))
+                    client.request("DELETE", f"/api/activities/{json.loads(data)['id']}")
+                elif i % 4 == 3:
+                    client.request("POST", "/api/finance", finance_body(written + i, None))
+                else:
+                    client.request("POST", "/api/activities", activity_body(written + i, None))
+            written += writes
+            time.sleep(OVERLAP_SECONDS * 1.5)
+            cursor, sent, requests, rows = visit(client, cursor)
+            report["repeat_visits"].append({"writes": writes, "bytes": sent, "requests": requests, "rows": rows})
+        return report
+    finally:
+        for proc in (app_proc, fake_proc):
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", default="1k,10k,100k", help="comma-separated activity counts (k/m suffixes)")
+    parser.add_argument("--writes", type=lambda s: [int(w) for w in s.split(",")], default=[0, 10, 100],
+                        help="writes before each repeat visit")
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for volume in (parse_volume(v) for v in args.volumes.split(",")):
+        report = run_volume(volume, args)
+        results.append(report)
+        first = report["first_visit"]
+        print(f"{volume:>8} activities  /api/dashboard {report['dashboard_bytes']:>6} B  "
+              f"full history {report['history_bytes']:>9} B  first sync {first['bytes']:>9} B "
+              f"in {first['requests']} requests ({first['ms']} ms)", flush=True)
+        for repeat in report["repeat_visits"]:
+            print(f"{'':>8} repeat visit after {repeat['writes']:>4} writes: {repeat['bytes']:>7} B, "
+                  f"{repeat['rows']} rows, {repeat['requests']} request(s)", flush=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Timeline benchmark: the per-user interval index (app/utils/timeline.py)
+against a brute-force scan of the same activities. First a randomized
+cross-check — random histories, random overlapping adds and deletes, then
+random overlap, "what was I doing at T" and gap queries compared with the
+scan — then query times at growing history sizes:
+
+    python -m bench.timeline
+    python -m bench.timeline --volumes 1k,100k --seeds 50 --out timeline_results.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.utils.timeline import Timeline
+from bench.run import parse_volume
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+CATEGORIES = ["Work", "Study", "Workout", "Cooking", "Wasted Time"]
+
+
+def history(rng, count, start=EPOCH):
+    """`count` back-to-back-ish activities: 5 min to 3 h each, up to 4 h apart."""
+    rows = []
+    cursor = start
+    for i in range(count):
+        cursor += timedelta(minutes=rng.choice((0, 0, rng.randint(1, 240))))
+        end = cursor + timedelta(minutes=rng.randint(5, 180))
+        rows.append(row(f"a{i}", rng.choice(CATEGORIES), cursor, end))
+        cursor = end
+    return rows
+
+
+def row(row_id, category, start, end):
+    return {"id": row_id, "category": category, "start_time": start.isoformat(),
+            "end_time": end.isoformat(), "xp_earned": 1.0}
+
+
+class Scan:
+    """The same questions answered by looking at every activity."""
+
+    def __init__(self, rows):
+        self.spans = {r["id"]: (datetime.fromisoformat(r["start_time"]), datetime.fromisoformat(r["end_time"]))
+                      for r in rows}
+
+    def add(self, r):
+        start, end = datetime.fromisoformat(r["start_time"]), datetime.fromisoformat(r["end_time"])
+        self.spans = {k: (s, e) for k, (s, e) in self.spans.items() if k != r["id"] and not (s < end and e > start)}
+        self.spans[r["id"]] = (start, end)
+
+    def remove(self, row_id):
+        self.spans.pop(row_id, None)
+
+    def overlapping(self, start, end):
+        return sorted(k for k, (s, e) in self.spans.items() if s < end and e > start)
+
+    def at(self, point):
+        return next((k for k, (s, e) in self.spans.items() if s <= point < e), None)
+
+    def untracked(self, start, end):
+        # Minute-by-minute is slow but obviously right
+        free = []
+        t = start
+        while t < end:
+            if self.at(t) is None:
+                free.append(t)
+            t += timedelta(minutes=1)
+        return free
+
+
+def gap_minutes(gaps):
+    """Gap list -> the set of minute starts it covers (same shape as Scan.untracked)."""
+    minutes = []
+    for gap in gaps:
+        t, end = datetime.fromisoformat(gap["start"]), datetime.fromisoformat(gap["end"])
+        while t < end:
+            minutes.append(t)
+            t += timedelta(minutes=1)
+    return minutes
+
+
+def random_window(rng, first, last, max_hours=48):
+    start = first + timedelta(minutes=rng.randint(-120, int((last - first).total_seconds() // 60)))
+    return start, start + timedelta(minutes=rng.randint(1, max_hours * 60))
+
+
+def cross_check(seed, size, operations, queries):
+    """Returns the number of comparisons made; raises AssertionError on the first mismatch."""
+    rng = random.Random(seed)
+    rows = history(rng, size)
+    timeline, scan = Timeline(0), Scan(rows)
+    timeline.load([rows])
+    first, last = EPOCH, datetime.fromisoformat(rows[-1]["end_time"]) if rows else EPOCH
+    checks = 0
+    for op in range(operations):
+        if rng.random() < 0.7 or not scan.spans:
+            start, end = random_window(rng, first, last, max_hours=6)
+            r = row(f"n{seed}-{op}", rng.choice(CATEGORIES), start, end)
+            timeline.add(r)
+            scan.add(r)
+        else:
+            victim = rng.choice(sorted(scan.spans))
+            timeline.remove(victim)
+            scan.remove(victim)
+        assert len(timeline) == len(scan.spans), (seed, op, "size")
+
+        for _ in range(queries):
+            start, end = random_window(rng, first, last)
+            got = timeline.window(start, end)
+            assert sorted(a["id"] for a in got["activities"]) == scan.overlapping(start, end), (seed, op, "overlap")
+            assert gap_minutes(got["gaps"]) == scan.untracked(start, end), (seed, op, "gaps")
+            point = start + timedelta(seconds=rng.randint(0, int((end - start).total_seconds())))
+            current = timeline.at(point)
+            assert (current["id"] if current else None) == scan.at(point), (seed, op, "at")
+            checks += 3
+    return checks
+
+
+def timed(fn, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def measure(count, queries, runs):
+    rng = random.Random(count)
+    rows = history(rng, count)
+    timeline, scan = Timeline(0), Scan(rows)
+    load_ms = timed(lambda: Timeline(0).load([rows]), 1)
+    timeline.load([rows])
+    last = datetime.fromisoformat(rows[-1]["end_time"])
+    windows = [random_window(rng, EPOCH, last, max_hours=24) for _ in range(queries)]
+    points = [start for start, _ in windows]
+
+    def scan_gaps():
+        # What a query-per-request implementation does: fetch the window, sort, sweep
+        for start, end in windows:
+            spans = sorted(scan.spans[k] for k in scan.overlapping(start, end))
+            cursor = start
+            for s, e in spans:
+                cursor = max(cursor, e)
+
+    return {
+        "activities": count,
+        "load_ms": round(load_ms, 1),
+        "per_query_us": {
+            "window_index": round(timed(lambda: [timeline.window(s, e) for s, e in windows], runs) * 1000 / queries, 2),
+            "window_scan": round(timed(scan_gaps, runs) * 1000 / queries, 2),
+            "at_index": round(timed(lambda: [timeline.at(p) for p in points], runs) * 1000 / queries, 2),
+            "at_scan": round(timed(lambda: [scan.at(p) for p in points], runs) * 1000 / queries, 2),
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", default="1k,10k,100k", help="comma-separated activity counts (k/m suffixes)")
+    parser.add_argument("--seeds", type=int, default=30, help="random histories in the cross-check")
+    parser.add_argument("--operations", type=int, default=40, help="adds/deletes per history")
+    parser.add_argument("--queries", type=int, default=200, help="timed queries per volume")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per measurement (median is reported)")
+    parser.add_argument("--out", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    checks = sum(cross_check(seed, seed * 7 % 60, args.operations, 3) for seed in range(args.seeds))
+    print(f"cross-check: {args.seeds} histories, {checks} comparisons against the scan, all equal")
+
+    results = []
+    for volume in (parse_volume(v) for v in args.volumes.split(",")):
+        report = measure(volume, args.queries, args.runs)
+        results.append(report)
+        q = report["per_query_us"]
+        print(f"{report['activities']:>8} activities  load {report['load_ms']:>8.1f} ms  "
+              f"window {q['window_index']:>8.2f} us vs scan {q['window_scan']:>10.2f} us  "
+              f"at {q['at_index']:>6.2f} us vs scan {q['at_scan']:>10.2f} us")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "cross_check_comparisons": checks, "results": results}, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
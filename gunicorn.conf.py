@@ -0,0 +1,20 @@
+"""
+gunicorn settings, read from the working directory (see Dockerfile).
+
+The app is imported once in the master, together with the Supabase client
+libraries it otherwise loads on first use, so forked workers share those
+pages and boot in milliseconds instead of re-importing everything. Anything
+per-process (connections, threads, the write-behind journal) starts after
+the fork.
+"""
+preload_app = True
+
+
+def when_ready(server):
+    from app.utils.supabase_client import import_client_libraries
+    import_client_libraries()
+
+
+def post_fork(server, worker):
+    from main import start_worker
+    start_worker()
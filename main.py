@@ -2,6 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
+import threading
 
 # Load environment variables
 load_dotenv()
@@ -13,12 +14,21 @@ def create_app():
     static_dir = os.path.join(base_dir, 'app', 'static')
     
     app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
+
+    # orjson for jsonify() and the async routes (JSON_PROVIDER=stdlib to opt out)
+    from app.utils.json_provider import init_json
+    init_json(app)
+
+    # Fail at boot, not on the first request; the clients themselves are created lazily
+    from app.utils.supabase_client import check_settings
+    check_settings()
     
     # Configuration
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-key-123')
     
     # Extensions
-    CORS(app)
+    # Pagination cursors travel in response headers
+    CORS(app, expose_headers=["X-Next-Cursor", "Link"])
 
     # Blueprints
     from app.routes.base_routes import base_bp
@@ -29,6 +39,9 @@ def create_app():
     from app.routes.sleep_routes import sleep_bp
     from app.routes.finance_routes import finance_bp
     from app.routes.stats_routes import stats_bp
+    from app.routes.export_routes import export_bp
+    from app.routes.realtime_routes import realtime_bp
+    from app.routes.sync_routes import sync_bp
     
     app.register_blueprint(base_bp)
     app.register_blueprint(auth_bp)
@@ -36,20 +49,66 @@ def create_app():
     app.register_blueprint(sleep_bp)
     app.register_blueprint(finance_bp)
     app.register_blueprint(stats_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(realtime_bp)
+    app.register_blueprint(sync_bp)
 
+    # Return pooled Supabase connections at the end of every request
+    from app.utils.supabase_client import release_supabase_client, init_upstream_errors
+    app.teardown_appcontext(release_supabase_client)
+    # 503 + Retry-After when the pool or the circuit breaker refuses a call
+    init_upstream_errors(app)
 
+    # Per-route latency and upstream call metrics (/api/metrics)
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
 
+    # Hashed, precompressed static files when built (python -m app.utils.assets)
+    from app.utils.assets import init_assets
+    init_assets(app)
 
-
+    # zstd/brotli/gzip for JSON bodies over COMPRESS_MIN_BYTES, per Accept-Encoding
+    from app.utils.compression import init_compression
+    init_compression(app)
 
     return app
 
-app = create_app()
+
+def start_worker():
+    """
+    Per-process background work (write-behind journal replay and flushing).
+    Called by each server process once it exists, never at import, so a
+    --preload master does not start threads or lock files for its workers.
+    """
+    from app.utils.write_behind import init_write_behind
+    init_write_behind()
+
+    # Load the client libraries off the request path (a no-op under --preload)
+    from app.utils.supabase_client import import_client_libraries
+    threading.Thread(target=import_client_libraries, name="client-import", daemon=True).start()
+
+
+_app = None
+
+
+def __getattr__(name):
+    # `main:app` is built on first access rather than at import, so tools that
+    # only need create_app() (bench/app_server.py) do not build it twice
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
-    app.run(
+    debug = os.getenv('FLASK_DEBUG', 'True') == 'True'
+    # Under the debug reloader only the child process serves requests
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN'):
+        start_worker()
+    create_app().run(
         host='0.0.0.0',
         port=int(os.getenv('PORT', 5000)),
-        debug=os.getenv('FLASK_DEBUG', 'True') == 'True'
+        debug=debug
     )
-
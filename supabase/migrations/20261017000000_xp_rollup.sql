@@ -0,0 +1,100 @@
+-- The daily XP rollup (user_xp_daily), the trigger that maintains it and
+-- get_xp_summary(), for databases created from an earlier schema.sql (fresh
+-- installs get all of this from schema.sql). Idempotent: safe to run again.
+-- The last step rebuilds every user's rollup from raw activities; activity
+-- writes wait while it runs (about 5s per million activities), so apply it
+-- off-peak.
+-- One row per user/day/category, so lifetime, monthly, today and per-skill
+-- figures never have to scan the raw activity history.
+CREATE TABLE IF NOT EXISTS public.user_xp_daily (
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    category TEXT NOT NULL,
+    xp DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, category)
+);
+
+ALTER TABLE public.user_xp_daily ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Users can read their own XP rollup" ON public.user_xp_daily;
+CREATE POLICY "Users can read their own XP rollup" ON public.user_xp_daily
+    FOR SELECT USING (auth.uid() = user_id);
+
+-- Days are bucketed in UTC, matching the dates the backend queries with.
+CREATE OR REPLACE FUNCTION public.apply_xp_rollup(
+    p_user_id UUID, p_start TIMESTAMP WITH TIME ZONE, p_category TEXT, p_xp DECIMAL, p_minutes INTEGER
+)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO public.user_xp_daily (user_id, day, category, xp, minutes)
+    VALUES (p_user_id, (p_start AT TIME ZONE 'UTC')::date, p_category, COALESCE(p_xp, 0), COALESCE(p_minutes, 0))
+    ON CONFLICT (user_id, day, category) DO UPDATE
+    SET xp = user_xp_daily.xp + EXCLUDED.xp,
+        minutes = user_xp_daily.minutes + EXCLUDED.minutes;
+
+    -- Drop buckets emptied by deletes so the rollup stays O(active days)
+    DELETE FROM public.user_xp_daily
+    WHERE user_id = p_user_id
+      AND day = (p_start AT TIME ZONE 'UTC')::date
+      AND category = p_category
+      AND xp = 0 AND minutes = 0;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION public.handle_activity_xp_rollup()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.apply_xp_rollup(OLD.user_id, OLD.start_time, OLD.category, -OLD.xp_earned, -OLD.duration_minutes);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.apply_xp_rollup(NEW.user_id, NEW.start_time, NEW.category, NEW.xp_earned, NEW.duration_minutes);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS on_activity_xp_rollup ON public.activities;
+CREATE TRIGGER on_activity_xp_rollup
+AFTER INSERT OR UPDATE OR DELETE ON public.activities
+FOR EACH ROW EXECUTE FUNCTION public.handle_activity_xp_rollup();
+
+-- Only the trigger writes the rollup; through the API this would let a caller
+-- change any user's XP
+REVOKE EXECUTE ON FUNCTION public.apply_xp_rollup(UUID, TIMESTAMP WITH TIME ZONE, TEXT, DECIMAL, INTEGER)
+    FROM PUBLIC, anon, authenticated;
+
+-- Lifetime, monthly, today and per-category XP for the calling user in one call
+CREATE OR REPLACE FUNCTION public.get_xp_summary(p_today DATE DEFAULT (NOW() AT TIME ZONE 'UTC')::date)
+RETURNS jsonb AS $$
+    SELECT jsonb_build_object(
+        'total', COALESCE(SUM(xp), 0),
+        'monthly', COALESCE(SUM(xp) FILTER (WHERE day >= date_trunc('month', p_today)::date), 0),
+        'today', COALESCE(SUM(xp) FILTER (WHERE day = p_today), 0),
+        'skills', COALESCE((
+            SELECT jsonb_object_agg(category, total)
+            FROM (
+                SELECT category, SUM(xp) AS total
+                FROM public.user_xp_daily
+                WHERE user_id = auth.uid()
+                GROUP BY category
+            ) per_category
+        ), '{}'::jsonb)
+    )
+    FROM public.user_xp_daily
+    WHERE user_id = auth.uid();
+$$ LANGUAGE sql STABLE;
+
+-- Every user's rollup from their raw activities. Writes are held off until it
+-- commits, so none is both in the rebuild and applied again by the trigger.
+DO $$
+BEGIN
+    LOCK TABLE public.activities IN SHARE MODE;
+    DELETE FROM public.user_xp_daily;
+    INSERT INTO public.user_xp_daily (user_id, day, category, xp, minutes)
+    SELECT user_id, (start_time AT TIME ZONE 'UTC')::date, category,
+           COALESCE(SUM(xp_earned), 0), COALESCE(SUM(duration_minutes), 0)
+    FROM public.activities
+    GROUP BY 1, 2, 3;
+END $$;
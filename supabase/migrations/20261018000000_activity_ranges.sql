@@ -0,0 +1,109 @@
+-- Secondary indexes, the activity `during` range and the no-overlap
+-- exclusion constraint, for databases created from an earlier schema.sql
+-- (fresh installs get all of this from schema.sql). Idempotent: safe to run
+-- again. The index builds block writes to these tables while they run
+-- (about 15s per million activities), so apply it off-peak.
+-- Benchmark: python bench/explain.py --dsn postgresql://...
+-- Every list, window and overlap query filters on user_id and a time column.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Keyset pages and date windows: WHERE user_id = ? [AND time >= ?] ORDER BY time, id
+CREATE INDEX IF NOT EXISTS activities_user_start_idx ON public.activities (user_id, start_time, id);
+CREATE INDEX IF NOT EXISTS sleep_logs_user_sleep_idx ON public.sleep_logs (user_id, sleep_time, id);
+-- daily_finance (user_id, date) is already indexed by its UNIQUE constraint.
+
+-- The [start_time, end_time) range an activity covers (empty while end_time
+-- is unset, so an open activity overlaps nothing). A computed column rather
+-- than a stored one: PostgREST filters on it (`during=ov.[a,b)`) but leaves it
+-- out of `select *`, and the planner inlines it, so it matches the index below.
+CREATE OR REPLACE FUNCTION public.during(public.activities)
+RETURNS tstzrange AS $$
+    SELECT tstzrange($1.start_time, COALESCE($1.end_time, $1.start_time), '[)')
+$$ LANGUAGE sql IMMUTABLE;
+
+-- A user's activities never overlap ("new one overrides"), and overlap lookups
+-- are probes of the constraint's GiST index instead of scans of the history.
+-- Databases that already hold overlapping rows get the index without the
+-- constraint; re-run this after cleaning them up.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'activities_no_overlap') THEN
+        RETURN;
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM (
+            SELECT start_time, end_time, MAX(end_time) OVER (
+                PARTITION BY user_id ORDER BY start_time, id
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            ) AS previous_end
+            FROM public.activities
+        ) ordered
+        WHERE end_time IS NOT NULL AND start_time < previous_end
+    ) THEN
+        RAISE WARNING 'activities has overlapping rows; creating activities_user_during_idx without the exclusion constraint';
+        CREATE INDEX IF NOT EXISTS activities_user_during_idx ON public.activities
+            USING gist (user_id, tstzrange(start_time, COALESCE(end_time, start_time), '[)'));
+    ELSE
+        DROP INDEX IF EXISTS public.activities_user_during_idx;
+        ALTER TABLE public.activities ADD CONSTRAINT activities_no_overlap EXCLUDE USING gist (
+            user_id WITH =, tstzrange(start_time, COALESCE(end_time, start_time), '[)') WITH &&
+        );
+    END IF;
+END $$;
+
+-- log_activity: overlap delete through the range index, serialized per user
+DROP FUNCTION IF EXISTS public.log_activity(TEXT, TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+CREATE OR REPLACE FUNCTION public.log_activity(
+    p_category TEXT,
+    p_start_time TIMESTAMP WITH TIME ZONE,
+    p_end_time TIMESTAMP WITH TIME ZONE,
+    p_id UUID DEFAULT NULL
+)
+RETURNS jsonb AS $$
+DECLARE
+    v_user_id UUID := auth.uid();
+    v_multiplier DECIMAL(3, 2);
+    v_activity public.activities;
+BEGIN
+    IF v_user_id IS NULL THEN
+        RAISE EXCEPTION 'Not authenticated';
+    END IF;
+
+    SELECT xp_multiplier INTO v_multiplier
+    FROM public.categories
+    WHERE user_id = v_user_id AND name = p_category;
+
+    -- Failsafe: create the category with its default multiplier if missing
+    IF v_multiplier IS NULL THEN
+        v_multiplier := CASE p_category
+            WHEN 'Work' THEN 1.2
+            WHEN 'Study' THEN 1.1
+            WHEN 'Workout' THEN 1.3
+            WHEN 'Cooking' THEN 1.0
+            WHEN 'Wasted Time' THEN -1.0
+            ELSE 1.0
+        END;
+        INSERT INTO public.categories (user_id, name, xp_multiplier)
+        VALUES (v_user_id, p_category, v_multiplier)
+        ON CONFLICT (user_id, name) DO NOTHING;
+    END IF;
+
+    -- One log_activity at a time per user, so two overlapping submissions
+    -- replace each other instead of tripping activities_no_overlap
+    PERFORM pg_advisory_xact_lock(hashtextextended('log_activity:' || v_user_id::text, 0));
+
+    DELETE FROM public.activities a
+    WHERE a.user_id = v_user_id
+      AND a.during && tstzrange(p_start_time, p_end_time, '[)');
+
+    -- 1 minute = 1 base XP, scaled by the category multiplier
+    INSERT INTO public.activities (id, user_id, category, start_time, end_time, xp_earned)
+    VALUES (
+        COALESCE(p_id, gen_random_uuid()), v_user_id, p_category, p_start_time, p_end_time,
+        EXTRACT(EPOCH FROM (p_end_time - p_start_time)) / 60 * v_multiplier
+    )
+    RETURNING * INTO v_activity;
+
+    RETURN to_jsonb(v_activity);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,78 @@
+-- Locks the XP rollup RPCs to signed-in callers, for databases created from
+-- an earlier schema.sql (fresh installs get this from schema.sql).
+-- Idempotent: safe to run again. Before this an anon key call ran with a NULL
+-- auth.uid(), which the functions took to mean every user.
+
+-- Rebuild the rollup from raw activities (one user, or everyone for service_role)
+CREATE OR REPLACE FUNCTION public.backfill_user_xp_daily(p_user_id UUID DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    IF auth.role() IS DISTINCT FROM 'service_role' THEN
+        -- Otherwise a NULL p_user_id would reach every user's rows
+        IF auth.uid() IS NULL THEN
+            RAISE EXCEPTION 'Not authenticated';
+        END IF;
+        p_user_id := auth.uid();
+    END IF;
+
+    DELETE FROM public.user_xp_daily
+    WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+    INSERT INTO public.user_xp_daily (user_id, day, category, xp, minutes)
+    SELECT user_id, (start_time AT TIME ZONE 'UTC')::date, category,
+           COALESCE(SUM(xp_earned), 0), COALESCE(SUM(duration_minutes), 0)
+    FROM public.activities
+    WHERE p_user_id IS NULL OR user_id = p_user_id
+    GROUP BY 1, 2, 3;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Days/categories where the rollup disagrees with raw activity sums
+CREATE OR REPLACE FUNCTION public.check_user_xp_daily(p_user_id UUID DEFAULT NULL)
+RETURNS TABLE (
+    user_id UUID, day DATE, category TEXT,
+    rollup_xp DECIMAL, raw_xp DECIMAL, rollup_minutes BIGINT, raw_minutes BIGINT
+) AS $$
+#variable_conflict use_column
+BEGIN
+    IF auth.role() IS DISTINCT FROM 'service_role' THEN
+        -- Otherwise a NULL p_user_id would reach every user's rows
+        IF auth.uid() IS NULL THEN
+            RAISE EXCEPTION 'Not authenticated';
+        END IF;
+        p_user_id := auth.uid();
+    END IF;
+
+    RETURN QUERY
+    WITH raw AS (
+        SELECT a.user_id, (a.start_time AT TIME ZONE 'UTC')::date AS day, a.category,
+               COALESCE(SUM(a.xp_earned), 0) AS xp, COALESCE(SUM(a.duration_minutes), 0) AS minutes
+        FROM public.activities a
+        WHERE p_user_id IS NULL OR a.user_id = p_user_id
+        GROUP BY 1, 2, 3
+    ), rolled AS (
+        SELECT r.user_id, r.day, r.category, r.xp, r.minutes::BIGINT AS minutes
+        FROM public.user_xp_daily r
+        WHERE (p_user_id IS NULL OR r.user_id = p_user_id)
+          AND (r.xp <> 0 OR r.minutes <> 0)
+    )
+    SELECT COALESCE(rolled.user_id, raw.user_id), COALESCE(rolled.day, raw.day),
+           COALESCE(rolled.category, raw.category),
+           COALESCE(rolled.xp, 0), COALESCE(raw.xp, 0),
+           COALESCE(rolled.minutes, 0), COALESCE(raw.minutes, 0)::BIGINT
+    FROM rolled
+    FULL OUTER JOIN raw
+        ON raw.user_id = rolled.user_id AND raw.day = rolled.day AND raw.category = rolled.category
+    WHERE COALESCE(rolled.xp, 0) <> COALESCE(raw.xp, 0)
+       OR COALESCE(rolled.minutes, 0) <> COALESCE(raw.minutes, 0);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Signed-in users rebuild and check their own rollup; anon has no business here
+REVOKE EXECUTE ON FUNCTION public.backfill_user_xp_daily(UUID), public.check_user_xp_daily(UUID) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION public.backfill_user_xp_daily(UUID), public.check_user_xp_daily(UUID) TO authenticated, service_role;
@@ -0,0 +1,51 @@
+-- The bulk import RPC (POST /api/activities/bulk), for databases created from
+-- an earlier schema.sql (fresh installs get it from schema.sql). Idempotent:
+-- safe to run again.
+-- Bulk import (POST /api/activities/bulk): deletes the activities overlapping
+-- any of p_spans and inserts p_rows in one transaction, so a failed import
+-- leaves the old activities in place. Returns the replaced ids; p_dry_run only
+-- reports them. Runs as the caller, under the same RLS as the table API.
+CREATE OR REPLACE FUNCTION public.import_activities(
+    p_spans jsonb,
+    p_rows jsonb,
+    p_dry_run BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (id UUID) AS $$
+#variable_conflict use_column
+DECLARE
+    v_user_id UUID := auth.uid();
+BEGIN
+    IF v_user_id IS NULL THEN
+        RAISE EXCEPTION 'Not authenticated';
+    END IF;
+
+    IF p_dry_run THEN
+        RETURN QUERY
+        SELECT DISTINCT a.id
+        FROM public.activities a
+        JOIN jsonb_to_recordset(p_spans) AS s(start_time TIMESTAMP WITH TIME ZONE, end_time TIMESTAMP WITH TIME ZONE)
+            ON a.during && tstzrange(s.start_time, s.end_time, '[)')
+        WHERE a.user_id = v_user_id;
+        RETURN;
+    END IF;
+
+    -- Serialized with log_activity, which would otherwise trip activities_no_overlap
+    PERFORM pg_advisory_xact_lock(hashtextextended('log_activity:' || v_user_id::text, 0));
+
+    RETURN QUERY
+    WITH replaced AS (
+        DELETE FROM public.activities a
+        USING jsonb_to_recordset(p_spans) AS s(start_time TIMESTAMP WITH TIME ZONE, end_time TIMESTAMP WITH TIME ZONE)
+        WHERE a.user_id = v_user_id
+          AND a.during && tstzrange(s.start_time, s.end_time, '[)')
+        RETURNING a.id
+    )
+    SELECT replaced.id FROM replaced;
+
+    INSERT INTO public.activities (user_id, category, start_time, end_time, xp_earned)
+    SELECT v_user_id, r.category, r.start_time, r.end_time, r.xp_earned
+    FROM jsonb_to_recordset(p_rows) AS r(
+        category TEXT, start_time TIMESTAMP WITH TIME ZONE, end_time TIMESTAMP WITH TIME ZONE, xp_earned DECIMAL(10, 2)
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,8 @@
+// Rebuild app/static/css/tailwind.css after adding or removing classes in the
+// templates or JS (only classes found here end up in the stylesheet):
+//   npx tailwindcss@3 -c tailwind.config.js -o app/static/css/tailwind.css --minify
+module.exports = {
+  content: ["./app/templates/**/*.html", "./app/static/js/**/*.js"],
+  theme: { extend: {} },
+  plugins: [],
+};
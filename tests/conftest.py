@@ -0,0 +1,68 @@
+"""
+Shared fixtures. The app runs against bench/fake_supabase.py in this
+process; settings are read at import time, so they are set here, before any
+test imports app.*. Each test gets a user of its own, which keeps the
+per-user caches and rows of one test out of the next.
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+from bench.fake_supabase import JWT_SECRET, mint_token, start_server
+
+ADMIN_EMAIL = "admin@lifeio.test"
+
+server, store = start_server()
+os.environ.update({
+    "SUPABASE_URL": f"http://127.0.0.1:{server.server_port}",
+    "SUPABASE_KEY": mint_token("anon", ttl=86400),
+    "SUPABASE_JWT_SECRET": JWT_SECRET,
+    "ADMIN_EMAIL": ADMIN_EMAIL,
+    "LIFEIO_STATE_DIR": tempfile.mkdtemp(prefix="lifeio-tests-"),
+    "FLASK_DEBUG": "False",
+})
+
+
+class Api:
+    """app.test_client() signed in as one user."""
+
+    def __init__(self, client, user_id, token):
+        self.client = client
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def get(self, path, headers=None):
+        return self.client.get(path, headers={**self.headers, **(headers or {})})
+
+    def post(self, path, body):
+        return self.client.post(path, json=body, headers=self.headers)
+
+    def delete(self, path):
+        return self.client.delete(path, headers=self.headers)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app
+    return app
+
+
+@pytest.fixture
+def fake_store():
+    return store
+
+
+@pytest.fixture
+def new_api(app):
+    """Signs in a fresh user per call."""
+    def sign_in():
+        user_id = str(uuid.uuid4())
+        return Api(app.test_client(), user_id, mint_token(user_id, f"{user_id}@lifeio.test"))
+    return sign_in
+
+
+@pytest.fixture
+def api(new_api):
+    return new_api()
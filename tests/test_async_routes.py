@@ -0,0 +1,28 @@
+import pytest
+from starlette.testclient import TestClient
+
+from app.asgi import create_asgi_app
+from bench.fake_supabase import mint_token
+
+
+@pytest.fixture
+def asgi(app):
+    with TestClient(create_asgi_app(app)) as client:
+        yield client
+
+
+def test_async_routes_hand_the_token_to_the_write_behind_queue(asgi, api, monkeypatch):
+    seen = []
+    monkeypatch.setattr("app.routes.async_routes.note_token", lambda user_id, token: seen.append((user_id, token)))
+    fresh = mint_token(api.user_id, f"{api.user_id}@lifeio.test", ttl=7200)
+
+    res = asgi.get("/api/stats/summary", headers={"Authorization": f"Bearer {fresh}"})
+    assert res.status_code == 200
+    assert seen == [(api.user_id, fresh)]
+
+
+def test_rejected_tokens_are_not_handed_on(asgi, monkeypatch):
+    seen = []
+    monkeypatch.setattr("app.routes.async_routes.note_token", lambda user_id, token: seen.append(user_id))
+    assert asgi.get("/api/stats/summary", headers={"Authorization": "Bearer nonsense"}).status_code == 401
+    assert seen == []
@@ -0,0 +1,73 @@
+import uuid
+
+
+def log(api, start, end, category="Work"):
+    res = api.post("/api/activities", {"category": category, "start_time": start, "end_time": end})
+    assert res.status_code == 201
+    return res.get_json()["id"]
+
+
+def test_bulk_import_replaces_overlaps_and_overrides_within_upload(api):
+    old = log(api, "2026-10-10T09:00:00+00:00", "2026-10-10T10:00:00+00:00")
+    kept = log(api, "2026-10-11T09:00:00+00:00", "2026-10-11T10:00:00+00:00")
+    entries = [
+        {"category": "Study", "start_time": "2026-10-10T09:30:00Z", "end_time": "2026-10-10T11:00:00Z"},
+        {"category": "Coding", "start_time": "2026-10-10T10:30:00Z", "end_time": "2026-10-10T12:00:00Z"},
+        {"category": "Work"},
+    ]
+
+    res = api.post("/api/activities/bulk?dry_run=1", entries)
+    assert res.status_code == 200
+    assert res.get_json()["replaced_existing"] == [old]
+
+    res = api.post("/api/activities/bulk", entries)
+    assert res.status_code == 201
+    body = res.get_json()
+    assert body["replaced_existing"] == [old]
+    assert body["overridden_in_upload"] == [{"index": 0, "replaced_by": 1}]
+    assert [s["index"] for s in body["skipped"]] == [2]
+
+    rows = api.get("/api/activities").get_json()
+    assert sorted((r["category"], r["start_time"]) for r in rows) == [
+        ("Coding", "2026-10-10T10:30:00+00:00"),
+        ("Work", "2026-10-11T09:00:00+00:00"),
+    ]
+    assert kept in {r["id"] for r in rows}
+
+
+def test_bulk_import_replaces_activities_the_timeline_has_not_seen(api, fake_store):
+    # Load this worker's timeline index, then write behind its back, as
+    # another worker would
+    log(api, "2026-10-10T07:00:00+00:00", "2026-10-10T08:00:00+00:00")
+    assert api.get("/api/timeline?from=2026-10-10&to=2026-10-10&tz=UTC").status_code == 200
+    elsewhere = str(uuid.uuid4())
+    with fake_store.lock:
+        fake_store.insert("activities", {
+            "id": elsewhere, "user_id": api.user_id, "category": "Work",
+            "start_time": "2026-10-10T09:00:00+00:00", "end_time": "2026-10-10T10:00:00+00:00", "xp_earned": 72,
+        })
+
+    res = api.post("/api/activities/bulk", [
+        {"category": "Study", "start_time": "2026-10-10T09:30:00Z", "end_time": "2026-10-10T10:30:00Z"},
+    ])
+    assert res.status_code == 201
+    assert res.get_json()["replaced_existing"] == [elsewhere]
+    starts = sorted(r["start_time"] for r in api.get("/api/activities").get_json())
+    assert starts == ["2026-10-10T07:00:00+00:00", "2026-10-10T09:30:00+00:00"]
+
+
+def test_failed_bulk_import_reports_rows_and_writes_nothing(api, monkeypatch):
+    from postgrest.exceptions import APIError
+    from app.repositories.supabase_repo import SupabaseActivities
+
+    def conflict(self, user_id, spans, rows, dry_run=False):
+        raise APIError({"code": "23P01", "message": "conflicting key value violates exclusion constraint"})
+
+    monkeypatch.setattr(SupabaseActivities, "import_many", conflict)
+    res = api.post("/api/activities/bulk", [
+        {"category": "Study", "start_time": "2026-10-10T09:30:00Z", "end_time": "2026-10-10T10:30:00Z"},
+        {"category": "Study", "start_time": "2026-10-11T09:30:00Z", "end_time": "2026-10-11T10:30:00Z"},
+    ])
+    assert res.status_code == 409
+    assert res.get_json()["failed"] == [0, 1]
+    assert api.get("/api/activities").get_json() == []
@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.utils import cache_utils
+
+
+def at(monkeypatch, instant):
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return instant if tz is None else instant.astimezone(tz)
+    monkeypatch.setattr(cache_utils, "datetime", Clock)
+
+
+@pytest.mark.parametrize("path", [
+    "/api/timeline?tz=Asia/Tokyo",
+    "/api/stats/timeseries?tz=Asia/Tokyo",
+])
+def test_etag_changes_at_local_midnight(api, monkeypatch, path):
+    # 23:30 and 00:30 in Tokyo, the same UTC day
+    at(monkeypatch, datetime(2026, 10, 18, 14, 30, tzinfo=timezone.utc))
+    before = api.get(path)
+    assert before.status_code == 200
+    assert api.get(path, headers={"If-None-Match": before.headers["ETag"]}).status_code == 304
+
+    at(monkeypatch, datetime(2026, 10, 18, 15, 30, tzinfo=timezone.utc))
+    after = api.get(path, headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+
+
+def test_utc_routes_keep_their_etag_until_utc_midnight(api, monkeypatch):
+    at(monkeypatch, datetime(2026, 10, 18, 14, 30, tzinfo=timezone.utc))
+    before = api.get("/api/stats/summary")
+    at(monkeypatch, datetime(2026, 10, 18, 23, 59, tzinfo=timezone.utc))
+    assert api.get("/api/stats/summary", headers={"If-None-Match": before.headers["ETag"]}).status_code == 304
+    at(monkeypatch, datetime(2026, 10, 19, 0, 1, tzinfo=timezone.utc))
+    assert api.get("/api/stats/summary", headers={"If-None-Match": before.headers["ETag"]}).status_code == 200
+
+
+def test_unknown_timezone_is_still_a_400(api):
+    assert api.get("/api/timeline?tz=Mars/Olympus").status_code == 400
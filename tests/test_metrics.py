@@ -0,0 +1,15 @@
+def test_metrics_are_off_without_a_token(app, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert app.test_client().get("/api/metrics").status_code == 404
+
+
+def test_metrics_require_the_token(app, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-secret")
+    client = app.test_client()
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer scrépe"}).status_code == 401
+
+    res = client.get("/api/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert res.status_code == 200
+    assert res.mimetype == "text/plain"
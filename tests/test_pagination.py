@@ -0,0 +1,74 @@
+import base64
+import json
+import uuid
+
+import pytest
+
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def raw_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("sort_value", ["2026-10-10T09:00:00+00:00", "2026-10-10T09:00:00.123456Z", "2026-10-10"])
+def test_cursor_round_trip(sort_value):
+    row_id = str(uuid.uuid4())
+    assert decode_cursor(encode_cursor(sort_value, row_id)) == (sort_value, row_id)
+
+
+@pytest.mark.parametrize("cursor", [
+    "WyJ4IiwieSJd",     # ["x", "y"]
+    raw_cursor("2026-10-10T09:00:00+00:00", "y"),
+    raw_cursor("x", str(uuid.uuid4())),
+    raw_cursor("2026-10-10T09:00:00+00:00", 'a",user_id.neq.0'),
+    raw_cursor('2026-10-10",id.gt."0', str(uuid.uuid4())),
+    raw_cursor(1, str(uuid.uuid4())),
+    raw_cursor("2026-10-10"),
+    "not base64!",
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("path", ["/api/activities", "/api/sleep", "/api/finance"])
+def test_malformed_cursor_is_a_400(api, path):
+    res = api.get(f"{path}?cursor=WyJ4IiwieSJd")
+    assert res.status_code == 400
+    assert res.get_json() == {"error": "Invalid cursor"}
+
+
+@pytest.mark.parametrize("query", ["from=garbage", "to=x", "from=2026-10-10&to=2026-13-01", "to=2026-10-10T25:00"])
+@pytest.mark.parametrize("path", ["/api/activities", "/api/sleep", "/api/finance"])
+def test_malformed_bounds_are_a_400(api, path, query):
+    res = api.get(f"{path}?{query}")
+    assert res.status_code == 400
+    assert "ISO 8601" in res.get_json()["error"]
+
+
+def test_bounds_filter_the_list(api):
+    for day in (1, 2, 3):
+        api.post("/api/activities", {"category": "Work", "start_time": f"2026-10-0{day}T09:00:00Z",
+                                     "end_time": f"2026-10-0{day}T10:00:00Z"})
+    res = api.get("/api/activities?from=2026-10-02&to=2026-10-02T23:59:59Z")
+    assert res.status_code == 200
+    assert [row["start_time"][:10] for row in res.get_json()] == ["2026-10-02"]
+
+
+def test_cursor_pages_through_activities(api):
+    for day in range(1, 6):
+        res = api.post("/api/activities", {"category": "Work", "start_time": f"2026-10-0{day}T09:00:00+00:00",
+                                           "end_time": f"2026-10-0{day}T10:00:00+00:00"})
+        assert res.status_code == 201
+
+    seen, path = [], "/api/activities?limit=2"
+    while True:
+        res = api.get(path)
+        assert res.status_code == 200
+        seen += [row["start_time"][:10] for row in res.get_json()]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        path = f"/api/activities?limit=2&cursor={cursor}"
+    assert seen == [f"2026-10-0{day}" for day in range(5, 0, -1)]
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.utils import resilience
+from app.utils.supabase_client import CircuitOpen
+from bench.fake_supabase import mint_token, start_server
+
+
+class Upstream:
+    """An httpx.MockTransport handler that counts calls and answers with `reply`."""
+
+    def __init__(self, reply=None, delay=0.0):
+        self.reply = reply or (lambda request: httpx.Response(200, json=[{"id": 1}]))
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            self.calls.append((request.method, request.url.path))
+        time.sleep(self.delay)
+        return self.reply(request)
+
+    def client(self, host):
+        transport = resilience.ResilientTransport(httpx.MockTransport(self))
+        return httpx.Client(transport=transport, base_url=f"http://{host}")
+
+
+def status(code):
+    return lambda request: httpx.Response(code, json={"message": "unavailable"})
+
+
+def timeout(request):
+    raise httpx.ReadTimeout("no answer", request=request)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRIES", 2)
+    monkeypatch.setattr(resilience, "RETRY_BASE", 0.001)
+    monkeypatch.setattr(resilience, "HEDGE_AFTER", 0)
+    monkeypatch.setattr(resilience, "_breakers", {})
+
+
+def test_identical_concurrent_gets_make_one_upstream_call():
+    upstream = Upstream(delay=0.2)
+    client = upstream.client("coalesce.test")
+    start = threading.Barrier(8)
+    results = []
+
+    def get():
+        start.wait()
+        res = client.get("/rest/v1/activities?select=*")
+        results.append((res.status_code, res.json(), res.extensions.get("lifeio_coalesced", False)))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(upstream.calls) == 1
+    assert [r[:2] for r in results] == [(200, [{"id": 1}])] * 8
+    assert sum(r[2] for r in results) == 7
+
+    # Once answered, the next read goes upstream again
+    client.get("/rest/v1/activities?select=*")
+    assert len(upstream.calls) == 2
+
+
+def test_identical_concurrent_async_gets_make_one_upstream_call():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.path)
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json=[])
+
+    async def main():
+        transport = resilience.AsyncResilientTransport(httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport, base_url="http://coalesce-async.test") as client:
+            return await asyncio.gather(*[client.get("/rest/v1/sleep_logs") for _ in range(8)])
+
+    responses = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(res.status_code == 200 for res in responses)
+
+
+def test_reads_are_retried_and_writes_are_not():
+    resilience._breakers["http://retry.test"] = resilience.CircuitBreaker("http://retry.test", failures=0)
+    upstream = Upstream(status(503))
+    client = upstream.client("retry.test")
+    assert client.get("/rest/v1/activities").status_code == 503
+    assert client.post("/rest/v1/rpc/get_xp_summary", json={}).status_code == 503
+    assert len(upstream.calls) == 2 * (resilience.RETRIES + 1)
+
+    upstream.calls.clear()
+    assert client.post("/rest/v1/activities", json={}).status_code == 503
+    assert client.post("/rest/v1/rpc/log_activity", json={}).status_code == 503
+    assert len(upstream.calls) == 2
+
+    upstream.calls.clear()
+    upstream.reply = timeout
+    with pytest.raises(httpx.ReadTimeout):
+        client.post("/rest/v1/rpc/import_activities", json={})
+    assert len(upstream.calls) == 1
+
+
+def test_writes_are_never_hedged(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_AFTER", 0.02)
+    upstream = Upstream(delay=0.15)
+    client = upstream.client("hedge.test")
+    assert client.post("/rest/v1/activities", json={}).status_code == 200
+    assert len(upstream.calls) == 1
+
+    upstream.calls.clear()
+    assert client.get("/rest/v1/activities").status_code == 200
+    assert len(upstream.calls) == 2
+
+
+def test_breaker_opens_after_failures_and_half_opens_after_cooldown(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRIES", 0)
+    host = "breaker.test"
+    breaker = resilience.CircuitBreaker(f"http://{host}", failures=3, cooldown=0.2)
+    resilience._breakers[f"http://{host}"] = breaker
+    upstream = Upstream(status(503))
+    client = upstream.client(host)
+
+    for _ in range(3):
+        assert client.get("/rest/v1/activities").status_code == 503
+    with pytest.raises(CircuitOpen) as refused:
+        client.get("/rest/v1/activities")
+    assert refused.value.retry_after >= 0.1
+    assert len(upstream.calls) == 3
+
+    # After the cooldown one probe goes through; a failed probe reopens at once
+    time.sleep(0.25)
+    assert client.get("/rest/v1/activities").status_code == 503
+    assert len(upstream.calls) == 4
+    with pytest.raises(CircuitOpen):
+        client.get("/rest/v1/activities")
+
+    # A successful probe closes it again
+    time.sleep(0.25)
+    upstream.reply = lambda request: httpx.Response(200, json=[])
+    assert client.get("/rest/v1/activities").status_code == 200
+    assert client.get("/rest/v1/sleep_logs").status_code == 200
+    assert len(upstream.calls) == 6
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = resilience.CircuitBreaker("http://probe.test", failures=1, cooldown=0.05)
+    breaker.record(False)
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    time.sleep(0.06)
+    breaker.allow()
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record(True)
+    breaker.allow()
+
+
+# Through real sockets: the Supabase stand-in with faults injected over its control endpoint
+
+@pytest.fixture
+def fake():
+    server, store = start_server()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    control = httpx.Client(base_url=base_url)
+
+    def set_faults(**faults):
+        control.post("/__bench/faults", json=faults).raise_for_status()
+
+    token = mint_token("00000000-0000-4000-8000-00000000fa17")
+    client = httpx.Client(transport=resilience.ResilientTransport(httpx.HTTPTransport()), base_url=base_url,
+                          headers={"Authorization": f"Bearer {token}"})
+    yield client, store, set_faults
+    client.close()
+    control.close()
+    server.shutdown()
+
+
+def test_injected_errors_are_retried_until_the_fault_clears(fake):
+    client, store, set_faults = fake
+    set_faults(error_rate=1)
+    assert client.get("/rest/v1/activities").status_code == 503
+    assert store.calls_by_kind == {"error": resilience.RETRIES + 1}
+    # A write that reached the server is not sent again
+    assert client.post("/rest/v1/activities", json={}).status_code == 503
+    assert store.calls_by_kind == {"error": resilience.RETRIES + 2}
+
+    set_faults(error_rate=0)
+    assert client.get("/rest/v1/activities").status_code == 200
+
+
+def test_slow_reads_time_out_per_attempt(fake, monkeypatch):
+    client, store, set_faults = fake
+    monkeypatch.setattr(resilience, "READ_TIMEOUT", 0.1)
+    set_faults(latency_ms=400)
+    started = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        client.get("/rest/v1/activities")
+    # Each attempt gives up at the read timeout instead of waiting out the latency
+    assert time.monotonic() - started < (resilience.RETRIES + 1) * 0.4
+
+
+def test_hedge_answers_a_stalled_read(fake, monkeypatch):
+    client, store, set_faults = fake
+    monkeypatch.setattr(resilience, "HEDGE_AFTER", 0.1)
+    set_faults(latency_ms=1000)
+    threading.Timer(0.05, lambda: set_faults(latency_ms=0)).start()
+
+    started = time.monotonic()
+    assert client.get("/rest/v1/activities").status_code == 200
+    # The first copy is still sleeping; the hedge sent at 100 ms answered
+    assert time.monotonic() - started < 0.5
+    assert store.calls_by_kind["select"] >= 1
+
+
+def test_breaker_opens_on_an_outage_and_closes_once_it_ends(fake, monkeypatch):
+    client, store, set_faults = fake
+    monkeypatch.setattr(resilience, "RETRIES", 0)
+    host = str(client.base_url).rstrip("/")
+    resilience._breakers[host] = resilience.CircuitBreaker(host, failures=3, cooldown=0.2)
+
+    set_faults(error_rate=1)
+    for _ in range(3):
+        assert client.get("/rest/v1/activities").status_code == 503
+    with pytest.raises(CircuitOpen):
+        client.get("/rest/v1/sleep_logs")
+    assert store.calls_by_kind == {"error": 3}
+
+    set_faults(error_rate=0)
+    time.sleep(0.25)
+    assert client.get("/rest/v1/activities").status_code == 200
+    assert client.get("/rest/v1/sleep_logs").status_code == 200
@@ -0,0 +1,48 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from bench.startup import time_boot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLIENT_LIBRARIES = ("supabase", "postgrest", "gotrue", "httpx")
+# Median import + create_app() in a fresh interpreter (bench/startup.py --budget-ms)
+STARTUP_BUDGET_MS = float(os.getenv("LIFEIO_STARTUP_BUDGET_MS", 1500))
+
+CHECK = """
+import json, sys
+heavy = %r
+loaded = lambda: sorted(m for m in heavy if m in sys.modules)
+import main
+report = {"import": loaded(), "built_at_import": main._app is not None}
+app = main.app
+report.update(build=loaded(), same=main.app is app, routes=len(list(app.url_map.iter_rules())))
+print(json.dumps(report))
+"""
+
+
+def boot():
+    # A fresh interpreter: this one already imported everything for the other tests
+    env = {**os.environ, "SUPABASE_URL": "http://127.0.0.1:9", "SUPABASE_KEY": "startup-test"}
+    result = subprocess.run([sys.executable, "-c", CHECK % (CLIENT_LIBRARIES + ("numpy",),)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_main_is_lazy():
+    report = boot()
+    assert report["import"] == []
+    assert report["built_at_import"] is False
+    # Building the app still leaves the client libraries for first use
+    assert not set(report["build"]) & set(CLIENT_LIBRARIES)
+    assert report["same"] is True
+    assert report["routes"] > 20
+
+
+def test_boot_is_within_budget():
+    boot = statistics.median(imported + built for imported, built in time_boot(3))
+    assert boot <= STARTUP_BUDGET_MS, f"boot took {boot:.0f} ms, budget {STARTUP_BUDGET_MS:.0f} ms"
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from app.routes import activity_routes, finance_routes, sleep_routes
+from app.utils import write_behind
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    for module in (write_behind, activity_routes, sleep_routes, finance_routes):
+        monkeypatch.setattr(module, "WRITE_BEHIND", True)
+    # Keep the background flusher out of the way: only /api/sync flushes here
+    monkeypatch.setattr(write_behind, "FLUSH_DELAY", 3600)
+    monkeypatch.setattr(write_behind, "_queue", None)
+    return write_behind.init_write_behind()
+
+
+def write_one_of_each(api):
+    activity = api.post("/api/activities", {"category": "Work", "start_time": "2026-10-17T09:00:00+00:00",
+                                            "end_time": "2026-10-17T10:00:00+00:00"})
+    sleep = api.post("/api/sleep", {"sleep_time": "2026-10-16T23:00:00+00:00",
+                                    "wake_time": "2026-10-17T07:00:00+00:00", "quality": 4})
+    finance = api.post("/api/finance", {"date": "2026-10-17", "income": 10, "expense": 4})
+    assert [res.status_code for res in (activity, sleep, finance)] == [202, 202, 202]
+    return {"activities": activity.get_json()["id"], "sleep_logs": sleep.get_json()["id"]}
+
+
+def test_sync_flushes_queued_writes_first(api, queue):
+    first = api.get("/api/sync").get_json()
+    ids = write_one_of_each(api)
+    assert len(queue.entries_for(api.user_id)) == 3
+
+    body = api.get(f"/api/sync?since={first['cursor']}").get_json()
+    assert queue.entries_for(api.user_id) == []
+    for table, row_id in ids.items():
+        rows = body["changes"][table]
+        assert [row["id"] for row in rows] == [row_id]
+        assert "pending" not in rows[0]
+    assert body["changes"]["activities"][0]["xp_earned"] is not None
+    # The upsert keeps the finance row's own id
+    assert [(row["date"], row["net"]) for row in body["changes"]["daily_finance"]] == [("2026-10-17", 6)]
+
+
+def test_writes_that_stay_queued_come_as_pending_rows(api, queue):
+    first = api.get("/api/sync").get_json()
+    # The flush is backing off after a failure
+    queue.backoff[api.user_id] = (1, time.monotonic() + 3600)
+    ids = write_one_of_each(api)
+
+    body = api.get(f"/api/sync?since={first['cursor']}").get_json()
+    for table, row_id in ids.items():
+        rows = body["changes"][table]
+        assert [(row["id"], row["pending"]) for row in rows] == [(row_id, True)]
+        assert "user_id" not in rows[0]
+    assert body["changes"]["daily_finance"] == []
+
+    # Until they reach the database they come again; afterwards as plain rows
+    again = api.get(f"/api/sync?since={body['cursor']}").get_json()
+    assert again["changes"]["activities"][0]["pending"] is True
+    queue.backoff.pop(api.user_id)
+    flushed = api.get(f"/api/sync?since={again['cursor']}").get_json()
+    for table, row_id in ids.items():
+        assert [(row["id"], row.get("pending")) for row in flushed["changes"][table]] == [(row_id, None)]
+    assert len(flushed["changes"]["daily_finance"]) == 1
+
+
+def test_sync_is_never_answered_from_an_etag(api, queue):
+    first = api.get("/api/sync")
+    assert "ETag" not in first.headers
+    ids = write_one_of_each(api)
+
+    res = api.get(f"/api/sync?since={first.get_json()['cursor']}", headers={"If-None-Match": "*"})
+    assert res.status_code == 200
+    assert [row["id"] for row in res.get_json()["changes"]["activities"]] == [ids["activities"]]
+    assert queue.entries_for(api.user_id) == []
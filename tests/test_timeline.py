@@ -0,0 +1,175 @@
+"""
+Property tests for IntervalSet, Timeline and the midnight split, each checked
+against a naive model: a plain list of intervals scanned in full, and a walk
+over every quarter hour (every zone's offset is a multiple of 15 minutes).
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytz
+from hypothesis import given, settings, strategies as st
+
+from app.utils.activity_utils import IntervalSet, activity_segments, split_at_midnight
+from app.utils.timeline import Timeline
+
+
+class NaiveIntervals:
+    def __init__(self):
+        self.intervals = []     # (start, end, item), any order
+
+    def add(self, start, end, item):
+        displaced = [i for i in self.intervals if i[0] < end and i[1] > start]
+        self.intervals = [i for i in self.intervals if i not in displaced] + [(start, end, item)]
+        return [i[2] for i in sorted(displaced)]
+
+    def discard(self, start):
+        found = [i for i in self.intervals if i[0] == start]
+        self.intervals = [i for i in self.intervals if i[0] != start]
+        return found[0][2] if found else None
+
+    def overlapping(self, start, end):
+        return [i[2] for i in sorted(self.intervals) if i[0] < end and i[1] > start]
+
+    def at(self, point):
+        return next((i[2] for i in self.intervals if i[0] <= point < i[1]), None)
+
+    def gaps(self, start, end):
+        covered = [any(i[0] <= p < i[1] for i in self.intervals) for p in range(start, end)]
+        gaps, run = [], None
+        for p, hit in zip(range(start, end), covered):
+            if not hit and run is None:
+                run = p
+            if hit and run is not None:
+                gaps.append((run, p))
+                run = None
+        if run is not None:
+            gaps.append((run, end))
+        return gaps
+
+
+def spans(horizon, longest):
+    return st.tuples(st.integers(0, horizon), st.integers(1, longest)).map(lambda s: (s[0], s[0] + s[1]))
+
+
+OPS = ("add", "discard", "overlapping", "at", "gaps")
+operations = st.lists(st.tuples(st.sampled_from(OPS), spans(500, 40), st.integers(1, 120)), max_size=80)
+
+
+@given(operations)
+def test_interval_set_matches_naive_model(ops):
+    fast, naive = IntervalSet(), NaiveIntervals()
+    for n, (op, (start, end), width) in enumerate(ops):
+        if op == "add":
+            assert fast.add(start, end, n) == naive.add(start, end, n)
+        elif op == "discard":
+            # Mostly a start that exists, sometimes one that does not
+            if naive.intervals and width % 5:
+                start = naive.intervals[width % len(naive.intervals)][0]
+            assert fast.discard(start) == naive.discard(start)
+        elif op == "overlapping":
+            assert fast.overlapping(start, end) == naive.overlapping(start, end)
+        elif op == "at":
+            assert fast.at(start) == naive.at(start)
+        else:
+            assert fast.gaps(start, start + width) == naive.gaps(start, start + width)
+        assert fast.starts == sorted(fast.starts) and fast.ends == sorted(fast.ends)
+        assert len(fast) == len(naive.intervals)
+
+
+BASE = datetime(2026, 10, 10, tzinfo=timezone.utc)
+
+
+def instant(minute):
+    return BASE + timedelta(minutes=minute)
+
+
+def row(n, start, end):
+    return {"id": f"a{n}", "category": "Work", "xp_earned": 1,
+            "start_time": instant(start).isoformat(), "end_time": instant(end).isoformat()}
+
+
+TIMELINE_OPS = ("add", "remove", "overlapping", "at", "window")
+
+
+@given(st.lists(spans(2000, 90), max_size=30),
+       st.lists(st.tuples(st.sampled_from(TIMELINE_OPS), spans(2000, 90), st.integers(1, 300)), max_size=60))
+def test_timeline_matches_naive_model(history, ops):
+    timeline, naive = Timeline(version=0), NaiveIntervals()
+    ids = []
+
+    # Part of the history comes from load(), in table order and in pages, the rest from writes
+    loaded = []
+    for n, (start, end) in enumerate(history):
+        if naive.overlapping(start, end):
+            continue
+        naive.add(start, end, f"a{n}")
+        loaded.append((start, end, n))
+        ids.append(f"a{n}")
+    loaded.sort()
+    timeline.load([[row(n, s, e) for s, e, n in loaded[i:i + 7]] for i in range(0, len(loaded), 7)])
+
+    for n, (op, (start, end), width) in enumerate(ops, start=100):
+        if op == "add":
+            timeline.add(row(n, start, end))
+            naive.add(start, end, f"a{n}")
+            ids.append(f"a{n}")
+        elif op == "remove" and ids:
+            row_id = ids[width % len(ids)]
+            timeline.remove(row_id)
+            naive.intervals = [i for i in naive.intervals if i[2] != row_id]
+        elif op == "overlapping":
+            got = [a["id"] for a in timeline.overlapping(instant(start), instant(end))]
+            assert got == naive.overlapping(start, end)
+        elif op == "at":
+            got = timeline.at(instant(start))
+            assert (got and got["id"]) == naive.at(start)
+        elif op == "window":
+            end = start + width
+            window = timeline.window(instant(start), instant(end))
+            gaps = naive.gaps(start, end)
+            assert [(g["start"], g["end"]) for g in window["gaps"]] == \
+                [(instant(s).isoformat(), instant(e).isoformat()) for s, e in gaps]
+            untracked = sum(e - s for s, e in gaps)
+            assert window["untracked_minutes"] == untracked
+            assert window["tracked_minutes"] == (end - start) - untracked
+        assert len(timeline) == len(naive.intervals) == len(timeline.starts)
+
+
+# Spring-forward and fall-back days, including a 30-minute shift (Lord Howe)
+# and transitions at midnight itself, where that local midnight never happens
+DST_DAYS = [
+    ("Europe/Berlin", datetime(2026, 3, 29)), ("Europe/Berlin", datetime(2026, 10, 25)),
+    ("America/New_York", datetime(2026, 3, 8)), ("America/New_York", datetime(2026, 11, 1)),
+    ("Australia/Lord_Howe", datetime(2026, 4, 5)), ("Australia/Lord_Howe", datetime(2026, 10, 4)),
+    ("America/Sao_Paulo", datetime(2018, 11, 4)), ("America/Santiago", datetime(2026, 9, 6)),
+    ("Asia/Beirut", datetime(2026, 3, 29)),
+]
+QUARTER = timedelta(minutes=15)
+
+
+def naive_day_starts(start, end, tz):
+    """Every instant in (start, end) on the quarter-hour grid whose local date differs from the one before."""
+    starts, t = [], start + QUARTER
+    while t < end:
+        if t.astimezone(tz).date() != (t - QUARTER).astimezone(tz).date():
+            starts.append(t)
+        t += QUARTER
+    return starts
+
+
+@settings(max_examples=300)
+@given(st.sampled_from(DST_DAYS), st.integers(-4 * 48, 4 * 48), st.integers(1, 4 * 72))
+def test_midnight_split_matches_naive_model_across_dst(zone_day, offset, quarters):
+    zone, day = zone_day
+    tz = pytz.timezone(zone)
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + QUARTER * offset
+    end = start + QUARTER * quarters
+    segments = split_at_midnight(start, end, tz)
+    assert segments[0][0] == start and segments[-1][1] == end
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+    assert all(s < e for s, e in segments)
+    assert [s for s, _ in segments[1:]] == naive_day_starts(start, end, tz)
+
+    # Without an end, the activity stops where the next local day starts
+    open_ended = activity_segments(start, None, tz)
+    assert len(open_ended) == 1 and open_ended[0][0] == start
+    assert open_ended[0][1] == naive_day_starts(start, start + timedelta(days=2), tz)[0]
@@ -0,0 +1,107 @@
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.utils import token_utils
+
+JWT_SECRET = "test-project-jwt-secret-at-least-32-bytes"
+
+
+@pytest.fixture(autouse=True)
+def project_secret(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", JWT_SECRET)
+    monkeypatch.delenv("SUPABASE_JWT_AUDIENCE", raising=False)
+    token_utils.token_cache.clear()
+    yield
+    token_utils.token_cache.clear()
+
+
+def claims(**overrides):
+    now = int(time.time())
+    return {"sub": str(uuid.uuid4()), "email": "someone@lifeio.test", "aud": "authenticated",
+            "role": "authenticated", "iat": now, "exp": now + 3600, **overrides}
+
+
+def mint_token(user_id, email=None):
+    return jwt.encode(claims(sub=user_id, email=email), JWT_SECRET, algorithm="HS256")
+
+
+def remote_returning(user=None):
+    remote = mock.Mock()
+    remote.auth.get_user.return_value = SimpleNamespace(user=user)
+    return remote
+
+
+def test_valid_hs256_token_never_calls_gotrue():
+    token = mint_token("5b0f3c9e-0000-4000-8000-000000000001", "someone@lifeio.test")
+    remote = remote_returning()
+    user = token_utils.verify_token(token, remote_client=remote)
+    assert user.id == "5b0f3c9e-0000-4000-8000-000000000001"
+    assert user.email == "someone@lifeio.test"
+    remote.auth.get_user.assert_not_called()
+
+
+def test_cache_hit_skips_verification(monkeypatch):
+    token = mint_token(str(uuid.uuid4()))
+    decode = mock.Mock(wraps=token_utils.decode_token_locally)
+    monkeypatch.setattr(token_utils, "decode_token_locally", decode)
+    first = token_utils.verify_token(token)
+    second = token_utils.verify_token(token)
+    assert second is first
+    assert decode.call_count == 1
+
+
+def test_cache_entry_never_outlives_the_token():
+    cache = token_utils.TokenCache(maxsize=2, ttl=300)
+    cache.set("expired", object(), exp=time.time() - 1)
+    assert cache.get("expired") is None
+    for token in ("a", "b", "c"):
+        cache.set(token, token)
+    assert cache.get("a") is None and cache.get("c") == "c"
+
+
+@pytest.mark.parametrize("token", [
+    jwt.encode(claims(exp=int(time.time()) - 60), JWT_SECRET, algorithm="HS256"),
+    jwt.encode(claims(aud="someone-else"), JWT_SECRET, algorithm="HS256"),
+    jwt.encode(claims(), "not-the-project-secret-but-long-enough-for-hs256", algorithm="HS256"),
+], ids=["expired", "wrong-aud", "bad-signature"])
+def test_rejected_tokens_never_reach_gotrue(token):
+    remote = remote_returning(SimpleNamespace(id="someone", email=None))
+    assert token_utils.verify_token(token, remote_client=remote) is None
+    remote.auth.get_user.assert_not_called()
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    """A JWKS publishing one RSA key, kid "current"; returns that key."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    published = jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key(), as_dict=True)
+    client = jwt.PyJWKClient("http://jwks.invalid/jwks.json", cache_keys=False)
+    client.fetch_data = lambda: {"keys": [{**published, "kid": "current", "alg": "RS256", "use": "sig"}]}
+    monkeypatch.setattr(token_utils, "get_jwks_client", lambda: client)
+    return key
+
+
+def test_known_kid_is_verified_against_jwks(jwks):
+    token = jwt.encode(claims(sub="5b0f3c9e-0000-4000-8000-000000000002"), jwks,
+                       algorithm="RS256", headers={"kid": "current"})
+    remote = remote_returning()
+    assert token_utils.verify_token(token, remote_client=remote).id == "5b0f3c9e-0000-4000-8000-000000000002"
+    remote.auth.get_user.assert_not_called()
+
+
+def test_unknown_kid_falls_back_to_gotrue(jwks):
+    rotated = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    token = jwt.encode(claims(), rotated, algorithm="RS256", headers={"kid": "rotated"})
+    gotrue_user = SimpleNamespace(id="5b0f3c9e-0000-4000-8000-000000000003", email="someone@lifeio.test")
+    remote = remote_returning(gotrue_user)
+    assert token_utils.verify_token(token, remote_client=remote) is gotrue_user
+    remote.auth.get_user.assert_called_once_with(token)
+    # Remembered, so the next request does not ask again
+    assert token_utils.verify_token(token, remote_client=remote) is gotrue_user
+    assert remote.auth.get_user.call_count == 1
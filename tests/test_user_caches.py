@@ -0,0 +1,39 @@
+import pytest
+
+from app.utils import finance_index, sleep_analytics, timeline
+
+
+@pytest.fixture
+def small_caches(monkeypatch):
+    for module, name in ((timeline, "_timelines"), (finance_index, "_indexes"), (sleep_analytics, "_aggregates")):
+        cache = getattr(module, name)
+        monkeypatch.setattr(cache, "maxsize", 2)
+        cache.clear()
+    yield
+    for cache in (timeline._timelines, finance_index._indexes, sleep_analytics._aggregates):
+        cache.clear()
+
+
+def test_per_user_caches_keep_only_recent_users(new_api, small_caches):
+    users = []
+    for _ in range(4):
+        api = new_api()
+        users.append(api.user_id)
+        for path in ("/api/timeline?tz=UTC", "/api/stats/finance", "/api/sleep/analytics?tz=UTC"):
+            assert api.get(path).status_code == 200
+
+    for cache in (timeline._timelines, finance_index._indexes, sleep_analytics._aggregates):
+        assert len(cache._entries) == 2
+        assert list(cache._entries) == users[2:]
+
+
+def test_sleep_aggregate_follows_the_requested_timezone(api, small_caches):
+    res = api.post("/api/sleep", {"sleep_time": "2026-10-10T22:00:00+00:00",
+                                  "wake_time": "2026-10-11T06:00:00+00:00", "quality": 4})
+    assert res.status_code == 201
+    utc = api.get("/api/sleep/analytics?tz=UTC").get_json()
+    tokyo = api.get("/api/sleep/analytics?tz=Asia/Tokyo").get_json()
+    assert utc != tokyo
+    assert list(sleep_analytics._aggregates._entries) == [api.user_id]
+    assert sleep_analytics._aggregates.get(api.user_id).tz.zone == "Asia/Tokyo"
+    assert api.get("/api/sleep/analytics?tz=UTC").get_json() == utc
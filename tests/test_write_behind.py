@@ -0,0 +1,155 @@
+import json
+import os
+import stat
+import uuid
+
+import pytest
+from postgrest.exceptions import APIError
+
+from app.utils import write_behind
+from bench.fake_supabase import mint_token
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    path = tmp_path / "journal"
+    path.mkdir(mode=0o700)
+    return str(path)
+
+
+@pytest.fixture
+def user():
+    user_id = str(uuid.uuid4())
+    return user_id, mint_token(user_id, f"{user_id}@lifeio.test")
+
+
+def crash(queue):
+    """The worker dies: its journal stays on disk and its lock goes with it."""
+    queue.journal.file.close()
+
+
+def rows_of(store, table, user_id):
+    return store.tables[table].rows.get(user_id, [])
+
+
+def activity(day, hour=9):
+    return {"category": "Work", "start_time": f"2026-10-{day:02d}T{hour:02d}:00:00+00:00",
+            "end_time": f"2026-10-{day:02d}T{hour + 1:02d}:00:00+00:00"}
+
+
+def sleep(day, quality=4):
+    return {"sleep_time": f"2026-10-{day - 1:02d}T23:00:00+00:00", "wake_time": f"2026-10-{day:02d}T07:00:00+00:00",
+            "quality": quality}
+
+
+def test_journal_is_private(journal_dir, user):
+    queue = write_behind.WriteBehindQueue(journal_dir)
+    queue.submit("sleep", *user, sleep(10))
+    assert stat.S_IMODE(os.stat(queue.journal.path).st_mode) == 0o600
+    with open(queue.journal.path) as f:
+        assert user[1] in f.read()
+
+
+def test_replay_after_a_crash_writes_each_entry_once(journal_dir, user, fake_store, monkeypatch):
+    user_id, token = user
+    queue = write_behind.WriteBehindQueue(journal_dir)
+    written = [
+        queue.submit("activities", user_id, token, activity(10)),
+        queue.submit("sleep", user_id, token, sleep(10)),
+        queue.submit("finance", user_id, token, {"date": "2026-10-10", "income": 10.0, "expense": 4.0}),
+    ]
+    # Written to the database, but the worker dies before recording it
+    monkeypatch.setattr(queue, "mark_done", lambda entries, **outcome: None)
+    queue.flush()
+    unflushed = queue.submit("sleep", user_id, token, sleep(11))
+    crash(queue)
+    monkeypatch.undo()
+
+    restarted = write_behind.WriteBehindQueue(journal_dir)
+    assert list(restarted.pending) == [entry["key"] for entry in written + [unflushed]]
+    restarted.flush()
+    assert restarted.pending == {}
+
+    assert [row["id"] for row in rows_of(fake_store, "activities", user_id)] == [written[0]["key"]]
+    assert sorted(row["id"] for row in rows_of(fake_store, "sleep_logs", user_id)) == \
+        sorted([written[1]["key"], unflushed["key"]])
+    assert [row["net"] for row in rows_of(fake_store, "daily_finance", user_id)] == [6.0]
+    # Nothing left for the next restart either
+    crash(restarted)
+    assert write_behind.WriteBehindQueue(journal_dir).pending == {}
+
+
+def test_a_live_workers_journal_is_read_but_not_adopted(journal_dir, user):
+    user_id, token = user
+    other = write_behind.WriteBehindQueue(journal_dir)
+    entry = other.submit("sleep", user_id, token, sleep(12))
+
+    ours = write_behind.WriteBehindQueue(journal_dir)
+    assert ours.pending == {}
+    assert [e["key"] for e in ours.entries_for(user_id)] == [entry["key"]]
+    assert os.path.exists(other.journal.path)
+
+    crash(other)
+    ours.adopt_orphans()
+    assert list(ours.pending) == [entry["key"]]
+    assert not os.path.exists(other.journal.path)
+    # Adopted entries are in our journal before the orphan is removed
+    with open(ours.journal.path, "rb") as f:
+        assert list(write_behind.read_journal(f)) == [entry["key"]]
+
+
+def test_cancel_before_the_flush_writes_nothing(journal_dir, user, fake_store):
+    user_id, token = user
+    queue = write_behind.WriteBehindQueue(journal_dir)
+    doomed = queue.submit("activities", user_id, token, activity(13))
+    kept = queue.submit("activities", user_id, token, activity(13, hour=14))
+
+    assert queue.cancel(user_id, doomed["key"]) is True
+    assert stat.S_IMODE(os.stat(queue._tombstone(doomed["key"])).st_mode) == 0o600
+    assert queue.cancel(str(uuid.uuid4()), kept["key"]) is False
+    assert [e["key"] for e in queue.entries_for(user_id)] == [kept["key"]]
+
+    queue.flush()
+    assert [row["id"] for row in rows_of(fake_store, "activities", user_id)] == [kept["key"]]
+    assert queue.pending == {}
+    assert os.listdir(queue.cancelled_dir) == []
+
+
+def test_permanent_errors_are_dead_lettered_and_the_rest_written(journal_dir, user, fake_store, monkeypatch):
+    user_id, token = user
+    write_sleep = write_behind.write_sleep
+
+    def rejecting(repos, user_id, batch):
+        if any(entry["row"]["quality"] == 99 for entry in batch):
+            raise APIError({"code": "23514", "message": "new row violates check constraint"})
+        return write_sleep(repos, user_id, batch)
+    monkeypatch.setitem(write_behind.WRITERS, "sleep", (rejecting, write_behind.MAX_BATCH))
+
+    queue = write_behind.WriteBehindQueue(journal_dir)
+    good = queue.submit("sleep", user_id, token, sleep(14))
+    bad = queue.submit("sleep", user_id, token, sleep(15, quality=99))
+    queue.flush()
+
+    assert queue.pending == {}
+    assert [row["id"] for row in rows_of(fake_store, "sleep_logs", user_id)] == [good["key"]]
+    failed_path = os.path.join(journal_dir, "failed.ndjson")
+    assert stat.S_IMODE(os.stat(failed_path).st_mode) == 0o600
+    with open(failed_path) as f:
+        failed = [json.loads(line) for line in f]
+    assert [(record["key"], "check constraint" in record["error"]) for record in failed] == [(bad["key"], True)]
+    assert "token" not in failed[0]
+
+
+def test_transient_errors_back_off_and_keep_the_entry(journal_dir, user, monkeypatch):
+    user_id, token = user
+
+    def unreachable(repos, user_id, batch):
+        raise OSError("connection refused")
+    monkeypatch.setitem(write_behind.WRITERS, "sleep", (unreachable, write_behind.MAX_BATCH))
+
+    queue = write_behind.WriteBehindQueue(journal_dir)
+    entry = queue.submit("sleep", user_id, token, sleep(16))
+    queue.flush()
+    assert list(queue.pending) == [entry["key"]]
+    assert queue.backoff[user_id][0] == 1
+    assert not os.path.exists(os.path.join(journal_dir, "failed.ndjson"))